@@ -1,7 +1,13 @@
 import argparse
 import os
 
-from analyzer.analyzer import process_single_file,process_batch
+from analyzer.analyzer import process_single_file, process_batch, triage_batch
+from analyzer.pipeline import process_single_pipeline, process_batch_pipeline
+from analyzer.report import REPORT_FORMATS, missing_dependency
+from ontology.condition.handler import ConditionHandler
+from ontology.data.handler import DataHandler
+from ontology.entity.handler import EntityHandler
+from ontology.profiler import PatternProfiler
 
 
 def example_usage_single():
@@ -25,7 +31,10 @@ def parse_args():
         description="Process JSONL files and generate YAML reports.",
         epilog="Examples:\n"
                "  python analyzer.py --single --jsonl path/to/file.jsonl --output path/to/output.yaml --policy path/to/content.html\n"
-               "  python analyzer.py --batch --jsonl path/to/jsonl_dir --output path/to/yaml_dir --policy path/to/content_dir"
+               "  python analyzer.py --batch --jsonl path/to/jsonl_dir --output path/to/yaml_dir --policy path/to/content_dir\n"
+               "  python analyzer.py --batch --workers 8 --summary batch.csv --jsonl path/to/jsonl_dir --output path/to/yaml_dir --policy path/to/content_dir\n"
+               "  python analyzer.py --batch --post --jsonl path/to/jsonl_dir --output path/to/yaml_dir --policy path/to/content_dir\n"
+               "  python analyzer.py --batch --triage 1 --summary triage.csv --jsonl path/to/jsonl_dir --output path/to/yaml_dir --policy path/to/content_dir"
     )
 
     # Mode selection
@@ -38,12 +47,47 @@ def parse_args():
     parser.add_argument('--output', required=True, help='Path to the output YAML file or directory')
     parser.add_argument('--policy', required=True, help='Path to the policy file or directory')
     parser.add_argument('--name',  help='Policy name for the report')
+    parser.add_argument('--profile-patterns', metavar='CSV',
+                        help='Profile every ontology regex during the run and write per-pattern costs to this CSV')
+    parser.add_argument('--workers', type=int, default=1, metavar='N',
+                        help='Batch mode: analyze the policies in N worker processes')
+    parser.add_argument('--summary', metavar='CSV',
+                        help='Batch mode: write the per-policy timings and errors to this CSV')
+    parser.add_argument('--format', choices=REPORT_FORMATS, default='yaml',
+                        help='Report format; json, jsonl (.ndjson) and parquet (tuples, evidence and pairs tables) '
+                             'replace the extension of the output path. The post stage reads yaml reports')
+    parser.add_argument('--sidecar', action='store_true',
+                        help='Also write every report as a binary sidecar, which the post stage reads instead of the YAML')
+    parser.add_argument('--post', action='store_true',
+                        help='Also run the post stage in memory and only write the post_* report, '
+                             'as post_launcher.py would on the report')
+    parser.add_argument('--db', metavar='SQLITE',
+                        help='Also add every report to this SQLite result store, see query_launcher.py')
+    parser.add_argument('--triage', type=int, metavar='K',
+                        help='Batch mode: only look for the first K contradictions of every policy, '
+                             'exact entity and data matches first, without writing reports')
 
     return parser.parse_args()
 
 
 def run_from_args():
     args = parse_args()
+    if not args.profile_patterns:
+        run(args)
+        return
+    if args.workers > 1:
+        print("Warning: --profile-patterns only profiles the current process, running with --workers 1")
+        args.workers = 1
+    profiler = PatternProfiler(EntityHandler, DataHandler, ConditionHandler).install()
+    try:
+        run(args)
+    finally:
+        profiler.uninstall()
+        profiler.to_csv(args.profile_patterns)
+        print(profiler.report())
+
+
+def run(args):
     jsonl_path, yaml_path, policy_content_path = args.jsonl, args.output, args.policy
     if not os.path.exists(jsonl_path):
         print(f"Error: The specified JSONL path '{jsonl_path}' does not exist.")
@@ -51,6 +95,9 @@ def run_from_args():
     if not os.path.exists(policy_content_path):
         print(f"Error: The specified policy path '{policy_content_path}' does not exist.")
         return
+    if missing_dependency(args.format):
+        print(f"Error: {missing_dependency(args.format)}")
+        return
     if args.single:
         # Validate that all paths are files for single mode
         if not all([os.path.isfile(args.jsonl), os.path.isfile(args.output) or args.output.endswith('.yaml'),
@@ -58,7 +105,9 @@ def run_from_args():
             print("Error: For single mode, --jsonl, --output, and --policy should be files")
             return
         name = args.name if args.name else os.path.basename(args.jsonl)[:-len('.jsonl')]
-        process_single_file(args.jsonl, args.output, args.policy, name)
+        process = process_single_pipeline if args.post else process_single_file
+        stats = process(args.jsonl, args.output, args.policy, name, args.format, args.sidecar, args.db)
+        print(stats.report())
     elif args.batch:
         # Check if paths are directories or files to determine actual mode
         jsonl_is_dir = os.path.isdir(args.jsonl)
@@ -69,8 +118,14 @@ def run_from_args():
             print("Error: For batch mode, --jsonl, --output, and --policy should be directories")
             return
 
-        process_batch(args.jsonl, args.output, args.policy,
-                      filter_func=lambda x: x.endswith('.jsonl') and 'analysis' in x)
+        if args.triage:
+            triage_batch(args.jsonl, filter_func=lambda x: x.endswith('.jsonl') and 'analysis' in x,
+                         limit=args.triage, workers=args.workers, summary_path=args.summary)
+            return
+        process = process_batch_pipeline if args.post else process_batch
+        process(args.jsonl, args.output, args.policy,
+                filter_func=lambda x: x.endswith('.jsonl') and 'analysis' in x,
+                workers=args.workers, summary_path=args.summary, fmt=args.format, sidecar=args.sidecar, db=args.db)
     else:
         print("Error: You must specify either --single or --batch mode")
         return
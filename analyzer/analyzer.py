@@ -1,48 +1,67 @@
+import contextlib
+import csv
+import io
 import json
 import os.path
 import re
 import sys
 import time
+import traceback
 from collections import defaultdict
-from typing import Optional, Callable
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Optional, Callable, Iterable, Iterator, Sequence
 
-import yaml
 from bs4 import BeautifulSoup
 
 from config import *
-from contradiction.rule import apply_rule
-from node import CollectionNode, CollectionNodeWithContext
+from contradiction.engine import CONTRADICTION, RuleStats
+from contradiction.incremental import PairStore, pair_store_path
+from contradiction.rule import apply_rule, iter_pairs
+from node import CollectionNode, CollectionNodeWithContext, SentenceTable
 from ontology.condition.condition import Condition
+from ontology.condition.condition_set import ConditionSet
 from ontology.condition.handler import ConditionHandler
 from ontology.data.handler import DataHandler
 from ontology.entity.handler import EntityHandler
+from ontology.snapshot import export_snapshots, install_snapshots
+from analyzer.report import build_report, write_report, report_path, write_sidecar
+from analyzer.result_store import add_to_store, ResultStore
 from util.structured.judge_negation import has_negation
 
+try:
+    from orjson import loads as _json_loads
+except ImportError:
+    _json_loads = json.loads
+
+
+THIRD_PARTY_MERGE = ConditionSet.of({Condition.THIRD_PARTY_SERVICE, Condition.DATA_SHARING})
+USER_ACTION_MERGE = ConditionSet.of({Condition.INPUT, Condition.CONSENT, Condition.SPECIFIC_OPERATION})
+AUDIENCE_SPECIFIC = ConditionSet.of({Condition.CHILDREN, Condition.REGION})
+
 
 def normalize_condition(best_entry: dict) -> dict:
     """
     Normalize the condition by merging subconditions for third party and user action.
     """
-    conds: set[Condition] = ConditionHandler.recognize_as_lower_Condition(best_entry['condition'].lower())
+    conds = ConditionSet.recognize(best_entry['condition'].lower())
     if Condition.NO_COND in conds and len(conds) > 1:
-        conds.remove(Condition.NO_COND)
+        conds = conds - ConditionSet.of({Condition.NO_COND})
 
     # Merge third party service and data sharing to third party
-    if Condition.THIRD_PARTY_SERVICE in conds or Condition.DATA_SHARING in conds:
-        conds = conds - {Condition.THIRD_PARTY_SERVICE, Condition.DATA_SHARING}
-        conds.add(Condition.THIRD_PARTY)
+    if conds & THIRD_PARTY_MERGE:
+        conds = (conds - THIRD_PARTY_MERGE) | ConditionSet.of({Condition.THIRD_PARTY})
 
     # Merge user action and input, consent, specific operation to user action
-    if Condition.INPUT in conds or Condition.CONSENT in conds or Condition.SPECIFIC_OPERATION in conds:
-        conds = conds - {Condition.INPUT, Condition.CONSENT, Condition.SPECIFIC_OPERATION}
-        conds.add(Condition.USER_ACTION)
+    if conds & USER_ACTION_MERGE:
+        conds = (conds - USER_ACTION_MERGE) | ConditionSet.of({Condition.USER_ACTION})
 
-    if Condition.SPECIFIC_AUDIENCE in conds and (Condition.CHILDREN in conds or Condition.REGION in conds):
-        conds.remove(Condition.SPECIFIC_AUDIENCE)
+    if Condition.SPECIFIC_AUDIENCE in conds and conds & AUDIENCE_SPECIFIC:
+        conds = conds - ConditionSet.of({Condition.SPECIFIC_AUDIENCE})
     # Note: MANAGEMENT condition has been removed from the new ontology
     # Security and retention conditions are now handled separately
 
-    new_conds_str = ' and '.join(map(lambda x: x.value, conds))
+    new_conds_str = conds.join()
     if not new_conds_str:
         new_conds_str = 'any condition'
     if new_conds_str != best_entry['condition']:
@@ -56,35 +75,35 @@ def get_final_condition(conditions: list[str]) -> str:
     Merge multiple conditions into a single condition string.
     """
     no_cond = Condition.NO_COND.value
-    conditions = ConditionHandler.recognize_as_lower_Condition(' '.join(conditions))
+    conditions = ConditionSet.recognize(' '.join(conditions))
     if not conditions:
         return no_cond
-    if len(conditions) == 1:
-        return list(conditions)[0].value
-    return ' and '.join(map(lambda x: x.value, conditions))
+    return conditions.join()
+
+
+def reduce_group(group: list[CollectionNodeWithContext]) -> CollectionNodeWithContext:
+    """
+    Merge the conditions of the tuples of one (entity, verb, data, sentence) group into its first tuple.
+    """
+    if len(group) > 1:
+        conditions = [n.condition.value if isinstance(n.condition, Condition) else str(n.condition) for n in group]
+        final_condition = get_final_condition(conditions)
+        base_node = group[0]
+        base_node.condition = final_condition
+        return base_node
+    return group[0]
 
 
 def reduce_nodes(nodes: list[CollectionNodeWithContext]) -> list[CollectionNodeWithContext]:
     """
     Reduce nodes by grouping and merging conditions.
     """
-    filtered = []
     grouped = defaultdict(list)
     for n in nodes:
         key = (n.entity, n.verb, n.data, n.sentence)
         grouped[key].append(n)
 
-    for key, group in grouped.items():
-        if len(group) > 1:
-            conditions = [n.condition.value if isinstance(n.condition, Condition) else str(n.condition) for n in group]
-            final_condition = get_final_condition(conditions)
-            base_node = group[0]
-            base_node.condition = final_condition
-            filtered.append(base_node)
-        else:
-            filtered.append(group[0])
-
-    return filtered
+    return [reduce_group(group) for group in grouped.values()]
 
 
 def filter_negation_nodes(nodes: list[CollectionNodeWithContext]) -> list[CollectionNodeWithContext]:
@@ -103,18 +122,51 @@ def filter_negation_nodes(nodes: list[CollectionNodeWithContext]) -> list[Collec
 
 
 class Evidence:
-    __slots__ = ['sentence', 'context', 'candidateEntity', 'candidateVerb', 'candidateData', 'candidateCondition',
-                 'sentenceIntegrity']
-
-    def __init__(self, sentence, context, candidateEntityStr: str, candidateVerb, candidateDataStr: str,
-                 candidateConditionStr: str):
-        self.sentence = sentence
-        self.context = context
-        self.candidateEntity = candidateEntityStr
+    """
+    A tuple occurrence behind a merged node. The sentence and context are ids in the SentenceTable of the policy and
+    the candidate strings "{a,b}" are only rendered when the report reads them.
+    """
+    __slots__ = ['sentences', 'sentence_id', 'context_id', 'candidateEntities', 'candidateVerb', 'candidateDataItems',
+                 'candidateConditions']
+
+    def __init__(self, sentences: SentenceTable, sentence_id: int, context_id: int, candidateEntities: Sequence[str],
+                 candidateVerb, candidateDataItems: Sequence[str], candidateConditions: Sequence[str]):
+        self.sentences = sentences
+        self.sentence_id = sentence_id
+        self.context_id = context_id
+        self.candidateEntities = candidateEntities
         self.candidateVerb = candidateVerb
-        self.candidateData = candidateDataStr
-        self.candidateCondition = candidateConditionStr
-        self.sentenceIntegrity = (sentence == context)
+        self.candidateDataItems = candidateDataItems
+        self.candidateConditions = candidateConditions
+
+    @classmethod
+    def of(cls, node: CollectionNodeWithContext) -> 'Evidence':
+        return cls(node.sentences, node.sentence_id, node.context_id, node.candidateEntity, node.candidateVerb,
+                   node.candidateData, node.candidateCondition)
+
+    @property
+    def sentence(self) -> str:
+        return self.sentences[self.sentence_id]
+
+    @property
+    def context(self) -> str:
+        return self.sentences[self.context_id]
+
+    @property
+    def candidateEntity(self) -> str:
+        return "{" + ",".join(self.candidateEntities) + "}"
+
+    @property
+    def candidateData(self) -> str:
+        return "{" + ",".join(self.candidateDataItems) + "}"
+
+    @property
+    def candidateCondition(self) -> str:
+        return "{" + ",".join(self.candidateConditions) + "}"
+
+    @property
+    def sentenceIntegrity(self) -> bool:
+        return self.sentence_id == self.context_id
 
     def __str__(self):
         return f"Evidence(sentence='{self.sentence}', context='{self.context}', candidateEntity='{self.candidateEntity}', " \
@@ -137,24 +189,17 @@ def choose_best_node_between_group_nodes(group: list[CollectionNode]):
             return [n for n in group if 'any condition' in n.condition][0]
 
         for node in valid_nodes:
-            recognise = ConditionHandler.recognize_as_lower_Condition(node.condition)
-            for cond in recognise:
-                if ConditionHandler.is_lower(cond, Condition.CHILDREN):
-                    votes[Condition.CHILDREN] += 1
-                elif ConditionHandler.is_lower(cond, Condition.REGION):
-                    votes[Condition.REGION] += 1
-                elif ConditionHandler.is_lower(cond, Condition.USER_ACTION):
-                    votes[Condition.USER_ACTION] += 1
-                elif ConditionHandler.is_lower(cond, Condition.THIRD_PARTY):
-                    votes[Condition.THIRD_PARTY] += 1
-                elif ConditionHandler.is_lower(cond, Condition.SECURITY):
-                    votes[Condition.SECURITY] += 1
-                elif ConditionHandler.is_lower(cond, Condition.RETENTION):
-                    votes[Condition.RETENTION] += 1
+            # every recognized condition votes for the first key it is lower than
+            remaining = ConditionSet.recognize(node.condition)
+            for key in votes:
+                voted = remaining.lower_than(key)
+                votes[key] += len(voted)
+                remaining = remaining - voted
 
         new_base_node = CollectionNodeWithContext(group[0].entity, group[0].verb, group[0].data, group[0].condition,
                                                   group[0].candidateEntity, group[0].candidateVerb, group[0].candidateData,
-                                                  group[0].candidateCondition, group[0].sentence, group[0].context)
+                                                  group[0].candidateCondition, group[0].sentence, group[0].context,
+                                                  sentences=group[0].sentences)
         new_condition = []
         for key in votes:
             if votes[key] > 0.33 * len(valid_nodes):
@@ -174,147 +219,133 @@ def choose_best_node_between_group_nodes(group: list[CollectionNode]):
         return group[0]
 
 
+def merge_group(group: list[CollectionNodeWithContext]) -> CollectionNode:
+    """
+    The CollectionNode of one (entity, verb, data) group, with the evidence of all its tuples.
+    """
+    base_node = choose_best_node_between_group_nodes(group)
+    contexts = [Evidence.of(n) for n in group]
+    return CollectionNode(
+        entity=base_node.entity,
+        verb=base_node.verb,
+        data=base_node.data,
+        condition=base_node.condition,
+        text=base_node.text,
+        contexts=contexts
+    )
+
+
 def merge_node(nodes: list[CollectionNodeWithContext]) -> list[CollectionNode]:
     """
     Merge nodes by grouping and creating CollectionNode objects.
     """
-    filtered = []
     grouped = defaultdict(list)
     for n in nodes:
         key = (n.entity, n.verb, n.data)
         grouped[key].append(n)
 
-    for key, group in grouped.items():
-        base_node = choose_best_node_between_group_nodes(group)
-        contexts = []
-        for n in group:
-            ctx = Evidence(
-                sentence=n.sentence,
-                context=n.context,
-                candidateEntityStr="{" + ",".join(n.candidateEntity) + "}",
-                candidateVerb=n.candidateVerb,
-                candidateDataStr="{" + ",".join(n.candidateData) + "}",
-                candidateConditionStr="{" + ",".join(n.candidateCondition) + "}",
-            )
-            contexts.append(ctx)
-        collection_node = CollectionNode(
-            entity=base_node.entity,
-            verb=base_node.verb,
-            data=base_node.data,
-            condition=base_node.condition,
-            text=base_node.text,
-            contexts=contexts
-        )
-        filtered.append(collection_node)
-
-    return filtered
+    return [merge_group(group) for group in grouped.values()]
 
 
 def generate_yaml_report(name: str, output_yaml_path: str, contradictions: list[tuple[CollectionNode, CollectionNode]],
                          narrowing: list[tuple[CollectionNode, CollectionNode]], pos_nodes: list[CollectionNode],
-                         neg_nodes: list[CollectionNode], policy_content: str):
-    entities = list(set([node.entity.strip() for node in pos_nodes + neg_nodes]))
-    data_items = list(set([node.data.strip() for node in pos_nodes + neg_nodes]))
-    conditions = list(set([node.condition.strip() for node in pos_nodes + neg_nodes]))
-    contradiction_pair_num = len(contradictions)
-    narrowing_pair_num = len(narrowing)
-    policy_length = len(policy_content)
-
-    nodes_info: list[dict] = []
-    tuples: set[str] = set()
-    for node in pos_nodes + neg_nodes:
-        evidence_list = []
-        for idx, ctx in enumerate(node.extra.get('contexts', [])):
-            context_dict = {
-                'evidenceId': (idx + 1),
-                'sentence': ctx.sentence,
-                'candidateEntity': ctx.candidateEntity,
-                'candidateData': ctx.candidateData,
-                'candidateCondition': ctx.candidateCondition,
-            }
-            if ctx.context != ctx.sentence:
-                context_dict['context'] = ctx.context
-                context_dict['sentenceIntegrity'] = False
-            else:
-                context_dict['sentenceIntegrity'] = True
-            evidence_list.append(context_dict)
-            tuples.add(node.pretty_print())
-        node_dict = {
-            'tuple': node.pretty_print(),
-            'entity': node.entity.strip(),
-            'verb': node.verb.strip(),
-            'data': node.data.strip(),
-            'condition': node.condition.strip(),
-            'evidence': evidence_list,
-        }
-        nodes_info.append(node_dict)
-
-    contradiction_pairs = [f"{pair[0].pretty_print()} vs {pair[1].pretty_print()}" for pair in contradictions]
-    narrowing_pairs = [f"{pair[0].pretty_print()} vs {pair[1].pretty_print()}" for pair in narrowing]
-
-    contexts_info = []
-    for node in pos_nodes + neg_nodes:
-        for ctx in node.extra.get('contexts', []):
-            context_dict = {
-                'sentence': ctx.sentence,
-                'context': ctx.context,
-                'candidateEntity': ctx.candidateEntity,
-                'candidateVerb': ctx.candidateVerb,
-                'candidateData': ctx.candidateData,
-                'candidateCondition': ctx.candidateCondition,
-            }
-            contexts_info.append(context_dict)
-
-    data = {
-        'tuples': sorted(list(tuples)),
-        'basicInfo': {
-            'name': name,
-            'policyLength': policy_length,
-            'tupleNum': len(tuples),
-            'entityNum': len(entities),
-            'entities': entities,
-
-            'dataItemNum': len(data_items),
-            'dataItems': data_items,
-
-            'conditionNum': len(conditions),
-            'occuredConditions': conditions,
-
-            'contradictionPairNum': contradiction_pair_num,
-            'narrowingPairNum': narrowing_pair_num,
-            'collectionTupleNum': len(pos_nodes),
-            'negationTupleNum': len(neg_nodes),
-        },
-
-        'nodes': sorted(nodes_info, key=lambda x: str(x)),
-        'contradictionPairs': sorted(contradiction_pairs, key=lambda x: str(x)),
-        'narrowingPairs': sorted(narrowing_pairs, key=lambda x: str(x)),
+                         neg_nodes: list[CollectionNode], policy_content: str, fmt: str = 'yaml'):
+    """
+    Write the report of a policy to output_yaml_path in fmt, see analyzer/report.py
+    """
+    data = build_report(name, contradictions, narrowing, pos_nodes, neg_nodes, policy_content)
+    write_report(data, output_yaml_path, fmt)
 
-    }
 
-    with open(output_yaml_path, 'w', encoding='utf-8') as file:
-        yaml.dump(data, file, allow_unicode=True, default_flow_style=False, width=1024)
+class PolicyStream:
+    """
+    Usage:
+        stream = PolicyStream()
+        for record in records:  # the JSON objects of analysis.jsonl, e.g. as the prompt pipeline produces them
+            stream.add_record(record)
+        contradictions, narrowing, pos_nodes, neg_nodes, stats = stream.analyze()
+    Incremental prepare_nodes: every tuple is grouped by (entity, verb, data) and sentence, and the first tuple of a
+    negative group checked for negation, as it arrives, so that only the condition merge of the groups and the rules
+    are left when the last record is in. The nodes are the same as prepare_nodes on the tuples in the same order.
+    """
+
+    def __init__(self):
+        self.parser = RecordParser()
+        # {(entity, verb, data): {sentence: tuples}} of the collect / not collect tuples, in order of arrival
+        self._pos: dict[tuple, dict[str, list[CollectionNodeWithContext]]] = {}
+        self._neg: dict[tuple, dict[str, list[CollectionNodeWithContext]]] = {}
+        # (entity, verb, data, sentence) of the negative groups dropped by filter_negation_nodes
+        self._dropped: set[tuple] = set()
+        self.records = 0
+        self.tuples = 0
+
+    def add_record(self, json_data: dict) -> int:
+        """
+        Add the tuples of one record and return their number
+        """
+        self.records += 1
+        count = 0
+        for node in self.parser.nodes(json_data):
+            self.add(node)
+            count += 1
+        return count
+
+    def add(self, node: CollectionNodeWithContext):
+        self.tuples += 1
+        verb = node.verb.strip()
+        key = (node.entity, node.verb, node.data)
+        if verb == 'collect':
+            groups = self._pos
+        elif verb == 'not collect':
+            groups = self._neg
+            if (*key, node.sentence) in self._dropped:
+                return
+            if node.sentence not in groups.get(key, ()) and not filter_negation_nodes([node]):
+                self._dropped.add((*key, node.sentence))
+                return
+        else:
+            return
+        groups.setdefault(key, {}).setdefault(node.sentence, []).append(node)
+
+    @staticmethod
+    def _merge(groups: dict[tuple, dict[str, list[CollectionNodeWithContext]]]) -> list[CollectionNode]:
+        return [merge_group([reduce_group(group) for group in by_sentence.values()]) for by_sentence in groups.values()]
+
+    def nodes(self) -> tuple[list[CollectionNode], list[CollectionNode]]:
+        """
+        The (collect, not collect) nodes of the tuples added so far; the conditions of the tuples are merged in place,
+        so this is called once, after the last record
+        """
+        return self._merge(self._pos), self._merge(self._neg)
 
+    def analyze(self):
+        return detect_contradictions(*self.nodes())
 
-def analyze_nodes(objects: list[CollectionNodeWithContext]):
-    # results: list[dict] = extract(json_path)
-    pos: list[CollectionNodeWithContext] = list(filter(lambda x: x.verb.strip() == 'collect', objects))
-    neg: list[CollectionNodeWithContext] = list(filter(lambda x: x.verb.strip() == 'not collect', objects))
 
-    # first filter
-    pos: list[CollectionNodeWithContext] = reduce_nodes(pos)
-    neg: list[CollectionNodeWithContext] = reduce_nodes(neg)
-    # second filter
-    neg: list[CollectionNodeWithContext] = filter_negation_nodes(neg)
+def prepare_nodes(objects: Iterable[CollectionNodeWithContext]) -> tuple[list[CollectionNode], list[CollectionNode]]:
+    """
+    Filter and merge the tuples of a policy into the (collect, not collect) nodes the rules are applied to.
+    objects is consumed once, so it may be the iter_jsonl_data stream.
+    """
+    stream = PolicyStream()
+    for x in objects:
+        stream.add(x)
+    return stream.nodes()
 
-    pos_nodes: list[CollectionNode] = merge_node(pos)
-    neg_nodes: list[CollectionNode] = merge_node(neg)
 
+def detect_contradictions(pos_nodes: list[CollectionNode], neg_nodes: list[CollectionNode]):
+    """
+    (contradictions, narrowing, pos_nodes, neg_nodes, stats), with the per-rule counts and timings of the run in stats
+    """
     contradictions: [(CollectionNode, CollectionNode)] = []
     narrowing: [(CollectionNode, CollectionNode)] = []
-    apply_rule(pos_nodes, neg_nodes, contradictions, narrowing)
+    stats = apply_rule(pos_nodes, neg_nodes, contradictions, narrowing)
 
-    return contradictions, narrowing, pos_nodes, neg_nodes
+    return contradictions, narrowing, pos_nodes, neg_nodes, stats
+
+
+def analyze_nodes(objects: Iterable[CollectionNodeWithContext]):
+    return detect_contradictions(*prepare_nodes(objects))
 
 
 def load_data(self, policy_full_path: str) -> list[str]:
@@ -347,45 +378,81 @@ def load_data(self, policy_full_path: str) -> list[str]:
         return lemmatized_sentences
 
 
-def load_jsonl_data(jsonl_path: str) -> list[CollectionNodeWithContext]:
+_ontologies_loaded = False
+TUPLE_RE = re.compile(TUPLE_PATTERN)
+
+
+def preload_ontologies():
     """
-    Load and parse JSONL data into a list of NewCollectionNode objects.
+    Load the entity, data and condition ontologies once per process.
     """
-    nodes = []
+    global _ontologies_loaded
+    if _ontologies_loaded:
+        return
     EntityHandler.preload(entity_ontology_path, entity_relation_yml)
     DataHandler.preload(data_ontology_path, data_relation_yml)
     ConditionHandler.preload(condition_dir_path, condition_relation_yml)
+    _ontologies_loaded = True
+
+
+class RecordParser:
+    """
+    The tuples of the records of one policy (the JSON objects of its analysis.jsonl).
+    The tuple fields are interned, the sentences and contexts are stored once in the SentenceTable of the policy, and
+    equal candidate lists are shared as one tuple, so the memory kept per tuple does not grow with the size of its
+    record.
+    """
 
-    with open(jsonl_path, 'r', encoding='utf-8') as f:
+    def __init__(self):
+        preload_ontologies()
+        self.sentences = SentenceTable()
+        self._candidates: dict[tuple, tuple] = {}
+
+    def _shared(self, values: list) -> tuple:
+        key = tuple(map(sys.intern, values))
+        return self._candidates.setdefault(key, key)
+
+    def nodes(self, json_data: dict) -> Iterator[CollectionNodeWithContext]:
+        sentence = sys.intern(json_data['sentence'])
+        context = sys.intern(json_data['context'])
+        candidate_entities = self._shared(json_data['candidate_entities'])
+        candidate_data = self._shared(json_data['candidate_data'])
+        candidate_conditions = self._shared(json_data['candidate_conditions'])
+
+        for t in TUPLE_RE.findall(json_data['response']):
+            entity, verb, data, condition = map(sys.intern, t)
+            yield CollectionNodeWithContext(
+                entity, verb, data, condition,
+                candidate_entities, 'None', candidate_data, candidate_conditions,
+                sentence, context, sentences=self.sentences
+            )
+
+
+def iter_jsonl_data(jsonl_path: str) -> Iterator[CollectionNodeWithContext]:
+    """
+    Parse the tuples of a JSONL file one line at a time, see RecordParser.
+    """
+    parser = RecordParser()
+    with open(jsonl_path, 'rb') as f:
         for line in f:
-            json_data = json.loads(line)
-            sentence = json_data['sentence']
-            context = json_data['context']
-            candidate_entities = json_data['candidate_entities']
-            candidate_data = json_data['candidate_data']
-            candidate_conditions = json_data['candidate_conditions']
-            response = json_data['response']
+            if not line.strip():
+                continue
+            yield from parser.nodes(_json_loads(line))
 
-            tuples = re.findall(TUPLE_PATTERN, response)
-            for t in tuples:
-                entity, verb, data, condition = t
-                node = CollectionNodeWithContext(
-                    entity, verb, data, condition,
-                    candidate_entities, 'None', candidate_data, candidate_conditions,
-                    sentence, context
-                )
-                nodes.append(node)
 
-    return nodes
+def load_jsonl_data(jsonl_path: str) -> list[CollectionNodeWithContext]:
+    """
+    Load and parse JSONL data into a list of NewCollectionNode objects.
+    """
+    return list(iter_jsonl_data(jsonl_path))
 
 
-def process_single_file(jsonl_path: str, output_yaml_path: str, policy_path: str, policy_name: str = "Zynga"):
+def report_of_results(results: tuple, policy_path: str, policy_name: str) -> tuple[dict, PairStore, RuleStats]:
     """
-    Process a single JSONL file and generate a YAML report.
+    Report dict, pair store and rule stats of the (contradictions, narrowing, pos_nodes, neg_nodes, stats) of
+    analyze_nodes
     """
-    start_time = time.time()
-    nodes = load_jsonl_data(jsonl_path)
-    contradictions, narrowing, pos_nodes, neg_nodes = analyze_nodes(nodes)
+    contradictions, narrowing, pos_nodes, neg_nodes, stats = results
 
     print("contradictions num: ", len(contradictions))
     print("narrowing num: ", len(narrowing))
@@ -397,44 +464,275 @@ def process_single_file(jsonl_path: str, output_yaml_path: str, policy_path: str
     with open(policy_path, 'r', encoding='utf-8') as f:
         policy_content = f.read()
 
-    generate_yaml_report(policy_name, output_yaml_path, contradictions, narrowing, pos_nodes, neg_nodes, policy_content)
+    data = build_report(policy_name, contradictions, narrowing, pos_nodes, neg_nodes, policy_content)
+    return data, PairStore.from_results(pos_nodes, neg_nodes, contradictions, narrowing), stats
+
+
+def build_policy_report(jsonl_path: str, policy_path: str, policy_name: str) -> tuple[dict, PairStore, RuleStats]:
+    """
+    Analyze a JSONL file and return the report dict of the policy, the pair store of its tuples and the rule stats
+    """
+    return report_of_results(analyze_nodes(iter_jsonl_data(jsonl_path)), policy_path, policy_name)
+
+
+def save_policy_report(data: dict, store: PairStore, output_yaml_path: str, fmt: str = 'yaml', sidecar: bool = False,
+                       db: Optional[str] = None):
+    output_path = report_path(output_yaml_path, fmt) if fmt != 'yaml' else output_yaml_path
+    write_report(data, output_path, fmt)
+    if sidecar:
+        write_sidecar(data, output_path)
+    # lets the post stage re-evaluate only the pairs of the tuples it changes
+    store.save(pair_store_path(output_path))
+    if db:
+        add_to_store(db, data, path=output_path)
+
+
+def process_single_file(jsonl_path: str, output_yaml_path: str, policy_path: str, policy_name: str = "Zynga",
+                        fmt: str = 'yaml', sidecar: bool = False, db: Optional[str] = None) -> RuleStats:
+    """
+    Process a single JSONL file and generate a YAML report; with another fmt, the report replaces the extension of
+    output_yaml_path, see report_path. With sidecar, the report is also written as the binary sidecar the post stage
+    reads instead of the YAML. With db, the report is also added to the SQLite result store at db, see
+    analyzer/result_store.py.
+    Returns the per-rule counts and timings of the contradiction rules.
+    """
+    start_time = time.time()
+    data, store, stats = build_policy_report(jsonl_path, policy_path, policy_name)
+    save_policy_report(data, store, output_yaml_path, fmt, sidecar, db)
     running_time = time.time() - start_time
     logger.info(f"Time cost: {running_time:.2f} seconds.")
+    return stats
 
 
-def process_batch(jsonl_dir: str, yaml_dir: str, policy_dir: str, filter_func: Optional[Callable] = None):
+def process_stream(stream: PolicyStream, output_yaml_path: str, policy_path: str, policy_name: str,
+                   fmt: str = 'yaml', sidecar: bool = False, db: Optional[str] = None) -> RuleStats:
     """
-    Process multiple JSONL files in a directory and generate YAML reports.
+    process_single_file on the records added to stream instead of a JSONL file
     """
-    logger.info(f"Processing LLM outputs directory: {jsonl_dir} and policies directory: {policy_dir}")
     start_time = time.time()
+    data, store, stats = report_of_results(stream.analyze(), policy_path, policy_name)
+    save_policy_report(data, store, output_yaml_path, fmt, sidecar, db)
+    running_time = time.time() - start_time
+    logger.info(f"Time cost after the last record of {policy_name}: {running_time:.2f} seconds.")
+    return stats
+
+
+def find_policy_content(root: str) -> Optional[str]:
+    """
+    Policy file of the policy directory root, None if there is none
+    """
+    if os.path.exists(os.path.join(root, "cleaned.html")):
+        return os.path.join(root, "cleaned.html")
+    elif os.path.exists(os.path.join(root, "cleaned.md")):
+        return os.path.join(root, "cleaned.md")
+    html_files = sorted(f for f in os.listdir(root)
+                        if f.endswith('.html') or f.endswith(".htm") or f.endswith('.txt') or f.endswith('.md'))
+    if not html_files:
+        return None
+    print("default naming is: cleaned.html, second for cleaned.md, at last try using the first file with .html/.htm/.txt/.md suffix")
+    return os.path.join(root, html_files[0])
+
+
+def find_batch_jobs(jsonl_dir: str, filter_func: Optional[Callable] = None) -> list[tuple[str, str, str, str]]:
+    """
+    (jsonl path, yaml path, policy content path, policy name) of every policy under jsonl_dir, sorted by path
+    """
+    jobs = []
     for root, _, files in os.walk(jsonl_dir):
         for file in files:
             if file.endswith('.jsonl') and 'analysis' in file:
                 jsonl_path = os.path.join(root, file)
                 yaml_path = os.path.join(root, "analysis.yaml")
-                if os.path.exists(os.path.join(root, "cleaned.html")):
-                    content_path =os.path.join(root, "cleaned.html")
-                elif os.path.exists(os.path.join(root, "cleaned.md")):
-                    content_path =os.path.join(root, "cleaned.md")
-                else:
-                    html_files=[f for f in os.listdir(root) if f.endswith('.html') or f.endswith(".htm") or f.endswith('.txt') or f.endswith('.md')]
-                    print("default naming is: cleaned.html, second for cleaned.md, at last try using the first file with .html/.htm/.txt/.md suffix")
-                    content_path = os.path.join(root, html_files[0])
+                content_path = find_policy_content(root)
 
                 policy_name = os.path.basename(root)
                 if filter_func and filter_func(policy_name):
                     print(f"Skipping {policy_name}")
                     continue
+                jobs.append((jsonl_path, yaml_path, content_path, policy_name))
+    return sorted(jobs)
+
 
-                try:
-                    print(f"Processing {policy_name}")
-                    process_single_file(jsonl_path, yaml_path, content_path, policy_name)
-                except Exception as e:
-                    print(f"Error processing {policy_name}: {e.args}")
-                    e.with_traceback()
+def analyze_policy(job: tuple[str, str, str, str], capture: bool = False, fmt: str = 'yaml',
+                   sidecar: bool = False, process: Callable = process_single_file, db: Optional[str] = None) -> dict:
+    """
+    Run process (process_single_file, or another function with its arguments) on one batch job and return its
+    summary row, with the rule stats process returns; with capture, the printed output of the job is returned in the
+    row instead of being written to stdout.
+    """
+    jsonl_path, yaml_path, content_path, policy_name = job
+    row = {'policy': policy_name, 'jsonl': jsonl_path, 'status': 'ok', 'seconds': 0.0, 'error': '',
+           **rule_stats_row(None)}
+    out = io.StringIO() if capture else sys.stdout
+    start_time = time.time()
+    with contextlib.redirect_stdout(out):
+        try:
+            print(f"Processing {policy_name}")
+            stats = process(jsonl_path, yaml_path, content_path, policy_name, fmt, sidecar, db)
+            if stats is not None:
+                print(stats.report())
+                row.update(rule_stats_row(stats))
+        except Exception as e:
+            print(f"Error processing {policy_name}: {e.args}")
+            traceback.print_exc(file=sys.stdout)
+            row['status'] = 'error'
+            row['error'] = f"{type(e).__name__}: {e}"
+    row['seconds'] = round(time.time() - start_time, 3)
+    if capture:
+        row['output'] = out.getvalue()
+    return row
+
+
+def rule_stats_row(stats: Optional[RuleStats]) -> dict:
+    """
+    Summary row columns of the rule stats of a policy: pairs, contradictions and narrowings over all categories, time
+    spent in the rules and the hits of every rule as "name: hits; ..."
+    """
+    if stats is None:
+        return {'rule_pairs': 0, 'rule_contradictions': 0, 'rule_narrowings': 0, 'rule_seconds': 0.0, 'rule_hits': ''}
+    return {
+        'rule_pairs': sum(s['pairs'] for s in stats.categories.values()),
+        'rule_contradictions': sum(s['contradictions'] for s in stats.categories.values()),
+        'rule_narrowings': sum(s['narrowings'] for s in stats.categories.values()),
+        'rule_seconds': round(stats.seconds, 3),
+        'rule_hits': '; '.join(f"{name}: {hits}" for name, hits in stats.rule_hits.items() if hits),
+    }
+
+
+def triage_policy(job: tuple[str, str, str, str], capture: bool = False, limit: int = 1) -> dict:
+    """
+    Look for the first limit contradictions of one batch job, without applying every rule or writing a report.
+    Returns its summary row, with the contradictions found as "(..) vs (..)" strings joined by "; ".
+    """
+    jsonl_path, _, _, policy_name = job
+    row = {'policy': policy_name, 'jsonl': jsonl_path, 'status': 'ok', 'seconds': 0.0, 'error': '',
+           'contradictions': ''}
+    out = io.StringIO() if capture else sys.stdout
+    start_time = time.time()
+    with contextlib.redirect_stdout(out):
+        try:
+            pos_nodes, neg_nodes = prepare_nodes(iter_jsonl_data(jsonl_path))
+            found = [f"{f.node1.pretty_print()} vs {f.node2.pretty_print()}"
+                     for f in iter_pairs(pos_nodes, neg_nodes, kinds=(CONTRADICTION,), limit=limit)]
+            row['contradictions'] = '; '.join(found)
+            print(f"{policy_name}: {'contradiction' if found else 'no contradiction'}")
+            for pair in found:
+                print(f"  {pair}")
+        except Exception as e:
+            print(f"Error processing {policy_name}: {e.args}")
+            traceback.print_exc(file=sys.stdout)
+            row['status'] = 'error'
+            row['error'] = f"{type(e).__name__}: {e}"
+    row['seconds'] = round(time.time() - start_time, 3)
+    if capture:
+        row['output'] = out.getvalue()
+    return row
+
+
+def _init_batch_worker(snapshots: dict):
+    """
+    Install the ontologies loaded by the parent process instead of parsing the YAML files again
+    """
+    global _ontologies_loaded
+    install_snapshots(snapshots, EntityHandler, DataHandler, ConditionHandler)
+    _ontologies_loaded = True
+
+
+def _run_jobs(run_job: Callable, jobs: list[tuple[str, str, str, str]], workers: int) -> list[dict]:
+    """
+    Summary rows of run_job(job) for every job, in job order; with workers > 1 the jobs run in a process pool and the
+    captured output of every job is printed once it is done
+    """
+    summary = []
+    if workers > 1 and len(jobs) > 1:
+        preload_ontologies()
+        snapshots = export_snapshots(EntityHandler, DataHandler, ConditionHandler)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_worker,
+                                 initargs=(snapshots,)) as executor:
+            for row in executor.map(partial(run_job, capture=True), jobs):
+                print(row.pop('output'), end='')
+                summary.append(row)
+    else:
+        for job in jobs:
+            summary.append(run_job(job))
+    return summary
+
+
+def process_batch(jsonl_dir: str, yaml_dir: str, policy_dir: str, filter_func: Optional[Callable] = None,
+                  workers: int = 1, summary_path: Optional[str] = None, fmt: str = 'yaml',
+                  sidecar: bool = False, process: Callable = process_single_file,
+                  db: Optional[str] = None) -> list[dict]:
+    """
+    Process multiple JSONL files in a directory and generate YAML reports (or reports in fmt); process runs every
+    policy, see analyze_policy. With db, every report is also added to the SQLite result store at db.
+    With workers > 1 the policies are spread over a process pool; the output of every policy is printed in job order
+    once it is done, so the console output and the reports do not depend on the number of workers.
+    Returns the per-policy summary rows (policy, jsonl, status, seconds, error), also written to summary_path as CSV.
+    """
+    logger.info(f"Processing LLM outputs directory: {jsonl_dir} and policies directory: {policy_dir}")
+    start_time = time.time()
+    jobs = find_batch_jobs(jsonl_dir, filter_func)
+    if db:
+        # the schema is created once, before the workers add their reports
+        ResultStore(db).close()
+    summary = _run_jobs(partial(analyze_policy, fmt=fmt, sidecar=sidecar, process=process, db=db), jobs, workers)
     running_time = time.time() - start_time
+    log_batch_summary(summary, running_time)
+    if summary_path:
+        write_batch_summary(summary, summary_path)
     logger.info(f"Overall running time: {running_time:.2f} seconds.")
+    log_recognition_cache_stats()
+    return summary
+
+
+def triage_batch(jsonl_dir: str, filter_func: Optional[Callable] = None, limit: int = 1, workers: int = 1,
+                 summary_path: Optional[str] = None) -> list[dict]:
+    """
+    Run triage_policy on every policy under jsonl_dir; the rows are also written to summary_path as CSV
+    """
+    logger.info(f"Triage of LLM outputs directory: {jsonl_dir}")
+    start_time = time.time()
+    jobs = find_batch_jobs(jsonl_dir, filter_func)
+    summary = _run_jobs(partial(triage_policy, limit=limit), jobs, workers)
+    running_time = time.time() - start_time
+    log_batch_summary(summary, running_time)
+    flagged = sum(1 for row in summary if row['contradictions'])
+    logger.info(f"Triage: {flagged} of {len(summary)} policies have a contradiction.")
+    if summary_path:
+        write_batch_summary(summary, summary_path)
+    return summary
+
+
+def log_batch_summary(summary: list[dict], running_time: float):
+    failed = [row for row in summary if row['status'] != 'ok']
+    busy = sum(row['seconds'] for row in summary)
+    logger.info(f"Batch summary: {len(summary)} policies, {len(failed)} failed, "
+                f"{busy:.2f} seconds of analysis in {running_time:.2f} seconds.")
+    for row in sorted(summary, key=lambda r: -r['seconds'])[:5]:
+        logger.info(f"  slowest: {row['policy']} {row['seconds']:.2f} seconds")
+    for row in failed:
+        logger.error(f"  failed: {row['policy']}: {row['error']}")
+
+
+def write_batch_summary(summary: list[dict], summary_path: str):
+    with open(summary_path, 'w', encoding='utf-8', newline='') as f:
+        fieldnames = ['policy', 'jsonl', 'status', 'seconds', 'error']
+        if summary:
+            # e.g. the contradictions of triage_policy
+            fieldnames += [key for key in summary[0] if key not in fieldnames and key != 'output']
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(summary)
+
+
+def log_recognition_cache_stats():
+    """
+    Log hit/miss/eviction counts of the ontology recognition caches, used to size them from real corpus runs.
+    """
+    for handler in (EntityHandler, DataHandler, ConditionHandler):
+        for name, stats in handler.cache_stats().items():
+            if stats['hits'] or stats['misses']:
+                logger.info(f"{handler.__name__}.{name}: {stats}")
 
 
 def redirect_output_to_file(file_path):
@@ -0,0 +1,317 @@
+import asyncio
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import traceback
+from typing import Callable, Optional
+
+from config import *
+from analyzer.analyzer import find_policy_content, preload_ontologies, process_single_file, _run_jobs, \
+    log_batch_summary, write_batch_summary
+from contradiction.incremental import ontology_fingerprint
+from post_launcher import process_single_yaml
+from util.code_hash import file_hash, code_version
+
+"""
+Content-hash build graph of the pipeline.
+Every policy directory holds three artifacts built one from the other: analysis.jsonl (prompt stage, launcher.py),
+analysis.yaml (analyze stage, analyze_launcher.py) and post_analysis.yaml (post stage, post_launcher.py).
+The hashes of the inputs of every artifact (policy text, prompt template, model id, ontology snapshot, code version
+of its stage and the artifact it is built from) and of the artifact itself are recorded in the build.json manifest of
+the directory. An artifact is stale if it is missing, changed since it was built, or any of its input hashes differ;
+a run rebuilds the stale artifacts only, the prompts of all policies concurrently and the analyze and post stages of
+independent policies in worker processes. The crawl is not part of the graph, the crawled policy text is its source.
+The prompt stage writes the candidate entities, data and conditions the ontology handlers recognize into
+analysis.jsonl, so the recognition code of the handlers is part of its code version too: a change there marks the
+LLM outputs stale, and a run with stages=(ANALYZE, POST) (build_launcher.py --stages analyze post) keeps them without
+prompting again. A policy is prompted into a temporary directory whose outputs replace the previous ones only once
+the prompt stage succeeded, so a failed or interrupted run keeps the LLM outputs already paid for.
+"""
+
+MANIFEST = 'build.json'
+MANIFEST_VERSION = 1
+PROMPT, ANALYZE, POST = 'prompt', 'analyze', 'post'
+STAGES = (PROMPT, ANALYZE, POST)
+ARTIFACTS = {PROMPT: 'analysis.jsonl', ANALYZE: 'analysis.yaml', POST: 'post_analysis.yaml'}
+# sources of every stage, hashed into its code version (directories: their .py files)
+STAGE_CODE = {
+    # the candidate recognition of extract_candidates, not the rest of the ontology and util packages
+    PROMPT: ['launcher.py', 'config.py', 'pipeline', 'util/string/preprocess.py', 'util/structured',
+             'ontology/condition', 'ontology/data', 'ontology/entity', 'ontology/fuzzy.py'],
+    ANALYZE: ['analyze_launcher.py', 'config.py', 'node.py', 'analyzer/analyzer.py', 'analyzer/report.py',
+              'contradiction', 'ontology', 'util'],
+    POST: ['post_launcher.py', 'config.py', 'node.py', 'analyzer/post_analysis.py', 'analyzer/report.py',
+           'contradiction', 'ontology'],
+}
+PROMPT_TEMPLATE = os.path.join(PROJECT_ROOT, 'pipeline', 'prompt_template.py')
+
+
+class BuildContext:
+    """
+    The inputs shared by every policy: model id, prompt template, ontology snapshot and code versions
+    """
+    _instances: dict[str, 'BuildContext'] = {}
+
+    @classmethod
+    def shared(cls, model: str) -> 'BuildContext':
+        """
+        The context of model, computed once per process
+        """
+        if model not in cls._instances:
+            cls._instances[model] = cls(model)
+        return cls._instances[model]
+
+    def __init__(self, model: str):
+        preload_ontologies()
+        self.model = model
+        self.template = file_hash(PROMPT_TEMPLATE)
+        self.ontology = ontology_fingerprint()
+        self.code = {stage: code_version(paths) for stage, paths in STAGE_CODE.items()}
+
+
+class PolicyBuild:
+    """
+    Usage:
+        build = PolicyBuild(policy_dir, context)
+        build.stale(ANALYZE)  # reasons the artifact of the stage must be rebuilt, empty if it is up to date
+        ... rebuild it ...
+        build.record(ANALYZE)
+        build.save()
+    The artifacts and build.json manifest of one policy directory.
+    """
+
+    def __init__(self, directory: str, context: BuildContext):
+        self.directory = directory
+        self.name = os.path.basename(directory)
+        self.context = context
+        self.policy_path = find_policy_content(directory)
+        self.manifest = self._load()
+
+    def _load(self) -> dict:
+        try:
+            with open(os.path.join(self.directory, MANIFEST), 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            if manifest.get('version') == MANIFEST_VERSION:
+                return manifest
+        except (OSError, ValueError):
+            pass
+        return {'version': MANIFEST_VERSION, 'artifacts': {}}
+
+    def save(self):
+        with open(os.path.join(self.directory, MANIFEST), 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=2, sort_keys=True)
+
+    def path(self, stage: str) -> str:
+        return os.path.join(self.directory, ARTIFACTS[stage])
+
+    def inputs(self, stage: str) -> dict[str, Optional[str]]:
+        """
+        Current hashes of the inputs of the artifact of stage
+        """
+        inputs = {'ontology': self.context.ontology, 'code': self.context.code[stage]}
+        if stage == PROMPT:
+            inputs.update(policy=file_hash(self.policy_path) if self.policy_path else None,
+                          template=self.context.template, model=self.context.model)
+        elif stage == ANALYZE:
+            inputs.update(policy=file_hash(self.policy_path) if self.policy_path else None,
+                          source=file_hash(self.path(PROMPT)))
+        else:
+            inputs.update(source=file_hash(self.path(ANALYZE)))
+        return inputs
+
+    def stale(self, stage: str, upstream_stale: bool = False) -> list[str]:
+        """
+        Why the artifact of stage must be rebuilt; with upstream_stale, the artifact it is built from will be rebuilt
+        """
+        record = self.manifest['artifacts'].get(ARTIFACTS[stage])
+        output = file_hash(self.path(stage))
+        if output is None:
+            return ['missing']
+        if record is None:
+            return ['not recorded']
+        if record['output'] != output:
+            return ['changed since built']
+        reasons = [f"{name} changed" for name, value in self.inputs(stage).items()
+                   if record['inputs'].get(name) != value]
+        if upstream_stale and 'source changed' not in reasons:
+            reasons.append('source stale')
+        return reasons
+
+    def record(self, stage: str):
+        self.manifest['artifacts'][ARTIFACTS[stage]] = {
+            'stage': stage,
+            'inputs': self.inputs(stage),
+            'output': file_hash(self.path(stage)),
+            'built': time.strftime('%Y-%m-%d %H:%M:%S'),
+        }
+
+    def plan(self, stages: tuple[str, ...] = STAGES) -> dict[str, list[str]]:
+        """
+        {stage: reasons} of the stale artifacts, an artifact built from a stale one is stale too
+        """
+        plan = {}
+        upstream = False
+        for stage in STAGES:
+            reasons = self.stale(stage, upstream)
+            if stage in stages and reasons:
+                plan[stage] = reasons
+            # an artifact the run does not rebuild keeps its hash
+            upstream = stage in plan
+        return plan
+
+
+def find_policy_dirs(directory: str) -> list[str]:
+    """
+    The policy directories under directory: those with a policy file (see find_policy_content) or an analysis.jsonl
+    """
+    found = []
+    for root, dirs, files in os.walk(directory):
+        # e.g. the temporary directories of an interrupted prompt stage
+        dirs[:] = [d for d in dirs if not d.startswith('.')]
+        if ARTIFACTS[PROMPT] in files or find_policy_content(root) is not None:
+            found.append(root)
+    return sorted(found)
+
+
+async def _prompt_policies(builds: list[PolicyBuild], model: str, api_key: Optional[str],
+                           api_base_url: Optional[str], concurrency: int) -> dict[str, str]:
+    """
+    Run the prompt stage of builds concurrently; {policy name: error} of the failed ones
+    """
+    from pipeline.abstract_pipeline import RUN_MODE
+    from pipeline.async_prompt_pipeline import AsyncPromptPipeline
+
+    kwargs = {key: value for key, value in (('api_key', api_key), ('api_base_url', api_base_url)) if value}
+    pipeline = AsyncPromptPipeline(policy_dir=None, save_dir=None, model=model, mode=InputMode.BATCH,
+                                   run_mode=RUN_MODE.PROMPT_ONLY, **kwargs)
+    semaphore = asyncio.Semaphore(concurrency)
+    errors = {}
+
+    async def prompt(build: PolicyBuild):
+        async with semaphore:
+            # the prompt stage appends, a rebuild starts from empty outputs, which replace the previous ones on success
+            staging = tempfile.mkdtemp(prefix='.prompt-', dir=build.directory)
+            try:
+                await pipeline.process_single_async(build.policy_path, model, staging)
+                for name in (ARTIFACTS[PROMPT], 'record.jsonl'):
+                    if os.path.isfile(os.path.join(staging, name)):
+                        os.replace(os.path.join(staging, name), os.path.join(build.directory, name))
+                    elif os.path.isfile(os.path.join(build.directory, name)):
+                        os.remove(os.path.join(build.directory, name))
+                build.record(PROMPT)
+                build.save()
+            except Exception as e:
+                logger.error(f"Error prompting {build.name}: {e}", exc_info=True)
+                errors[build.name] = f"{type(e).__name__}: {e}"
+            finally:
+                shutil.rmtree(staging, ignore_errors=True)
+
+    await asyncio.gather(*(prompt(build) for build in builds))
+    return errors
+
+
+def build_policy(job: tuple[str, tuple[str, ...], str], capture: bool = False) -> dict:
+    """
+    Rebuild the stale analyze and post artifacts of one policy directory and return its summary row
+    """
+    directory, stages, model = job
+    build = PolicyBuild(directory, BuildContext.shared(model))
+    row = {'policy': build.name, 'jsonl': build.path(PROMPT), 'status': 'ok', 'seconds': 0.0, 'error': '', 'built': ''}
+    out = io.StringIO() if capture else sys.stdout
+    start_time = time.time()
+    built = []
+    with contextlib.redirect_stdout(out):
+        try:
+            plan = build.plan(tuple(s for s in stages if s != PROMPT))
+            if ANALYZE in plan:
+                print(f"Analyzing {build.name}: {', '.join(plan[ANALYZE])}")
+                stats = process_single_file(build.path(PROMPT), build.path(ANALYZE), build.policy_path, build.name)
+                print(stats.report())
+                build.record(ANALYZE)
+                built.append(ANALYZE)
+            if POST in plan:
+                print(f"Post-processing {build.name}: {', '.join(plan[POST])}")
+                if os.path.isfile(build.path(POST)):
+                    os.remove(build.path(POST))
+                process_single_yaml(build.path(ANALYZE))
+                if not os.path.isfile(build.path(POST)):
+                    raise RuntimeError("the post stage wrote no report")
+                build.record(POST)
+                built.append(POST)
+        except Exception as e:
+            print(f"Error building {build.name}: {e.args}")
+            traceback.print_exc(file=sys.stdout)
+            row['status'] = 'error'
+            row['error'] = f"{type(e).__name__}: {e}"
+        finally:
+            if built:
+                build.save()
+    row['built'] = ','.join(built)
+    row['seconds'] = round(time.time() - start_time, 3)
+    if capture:
+        row['output'] = out.getvalue()
+    return row
+
+
+def run_build(directory: str, stages: tuple[str, ...] = STAGES, model: str = deepseek_model, workers: int = 1,
+              dry_run: bool = False, adopt: bool = False, api_key: Optional[str] = None,
+              api_base_url: Optional[str] = None, concurrency: int = 8,
+              summary_path: Optional[str] = None, filter_func: Optional[Callable] = None) -> list[dict]:
+    """
+    Rebuild the stale artifacts of every policy directory under directory.
+    With dry_run, only log what would be rebuilt and why; with adopt, record the existing artifacts that are not in a
+    manifest yet as up to date instead of rebuilding them (e.g. the LLM outputs of runs before the build graph).
+    """
+    start_time = time.time()
+    context = BuildContext.shared(model)
+    builds = [PolicyBuild(d, context) for d in find_policy_dirs(directory)]
+    if filter_func:
+        builds = [b for b in builds if not filter_func(b.name)]
+
+    if adopt:
+        for build in builds:
+            adopted = [stage for stage in STAGES
+                       if ARTIFACTS[stage] not in build.manifest['artifacts'] and os.path.isfile(build.path(stage))]
+            for stage in adopted:
+                build.record(stage)
+            if adopted and not dry_run:
+                build.save()
+                logger.info(f"{build.name}: recorded the existing {', '.join(ARTIFACTS[s] for s in adopted)}")
+
+    plans = {build.directory: build.plan(stages) for build in builds}
+    counts = {stage: sum(1 for plan in plans.values() if stage in plan) for stage in STAGES}
+    logger.info(f"Build of {len(builds)} policies: " +
+                ', '.join(f"{counts[stage]} {ARTIFACTS[stage]} stale" for stage in stages))
+    for build in builds:
+        for stage, reasons in plans[build.directory].items():
+            logger.info(f"  {build.name}/{ARTIFACTS[stage]}: {', '.join(reasons)}")
+    if dry_run:
+        return []
+
+    summary = []
+    prompt_builds = [build for build in builds if PROMPT in plans[build.directory]]
+    failed = {}
+    if prompt_builds:
+        missing = [build.name for build in prompt_builds if not build.policy_path]
+        if missing:
+            logger.error(f"No policy file to prompt in: {', '.join(missing)}")
+        prompt_builds = [build for build in prompt_builds if build.policy_path]
+        failed = asyncio.run(_prompt_policies(prompt_builds, model, api_key, api_base_url, concurrency))
+        failed.update({name: 'no policy file' for name in missing})
+        summary += [{'policy': name, 'jsonl': '', 'status': 'error', 'seconds': 0.0, 'error': error, 'built': ''}
+                    for name, error in failed.items()]
+
+    # the analyze and post artifacts of a policy whose prompt stage was rebuilt are stale by now
+    jobs = [(build.directory, stages, model) for build in builds
+            if plans[build.directory] and build.name not in failed]
+    summary += _run_jobs(build_policy, jobs, workers)
+    running_time = time.time() - start_time
+    log_batch_summary(summary, running_time)
+    if summary_path:
+        write_batch_summary(summary, summary_path)
+    return summary
@@ -0,0 +1,60 @@
+import time
+from typing import Callable, Optional
+
+from config import *
+from analyzer.analyzer import build_policy_report, process_batch
+from analyzer.post_analysis import NodeStore, process_post_analysis_results, add_missing_tuples_from_candidates, \
+    update_contradiction_pairs, post_report_path
+from analyzer.report import report_path, write_report, write_sidecar
+from analyzer.result_store import add_to_store, POST
+from contradiction.engine import RuleStats
+from contradiction.incremental import pair_store_path
+
+"""
+Fused analyze + post pipeline.
+The report of a policy is built in memory and goes straight through the post-analysis rules (unspecified entity
+resolution, candidate-based tuple inference) and the contradiction update of its final tuples, so only the post_*
+report is written, without the intermediate report being dumped and parsed again. The post_* report is the same as
+the one analyze_launcher followed by post_launcher writes.
+"""
+
+
+def process_single_pipeline(jsonl_path: str, output_yaml_path: str, policy_path: str, policy_name: str,
+                            fmt: str = 'yaml', sidecar: bool = False, db: Optional[str] = None) -> RuleStats:
+    """
+    Analyze a JSONL file and post-process its report in memory; the post_* report is written next to
+    output_yaml_path (in fmt, see process_single_file), with its pair store and, with sidecar, its binary sidecar.
+    With db, the post_* report is also added to the SQLite result store at db as the post stage of the policy.
+    :return: the per-rule counts and timings of the contradiction rules, see process_single_file
+    """
+    output_path = post_report_path(report_path(output_yaml_path, fmt) if fmt != 'yaml' else output_yaml_path)
+    start_time = time.time()
+    content, store, stats = build_policy_report(jsonl_path, policy_path, policy_name)
+
+    nodes = NodeStore(content['nodes'])
+    num_unspecified = len(process_post_analysis_results(content, nodes))
+    num_tuples_inferred = len(add_missing_tuples_from_candidates(content, nodes))
+    update_contradiction_pairs(content, store)
+
+    write_report(content, output_path, fmt)
+    if sidecar:
+        write_sidecar(content, output_path)
+    store.save(pair_store_path(output_path))
+    if db:
+        add_to_store(db, content, POST, output_path)
+    logger.info(
+        f"Processed {jsonl_path} → {output_path} | "
+        f"Unspecified resolved: {num_unspecified}, Candidates added: {num_tuples_inferred} | "
+        f"Time cost: {time.time() - start_time:.2f} seconds."
+    )
+    return stats
+
+
+def process_batch_pipeline(jsonl_dir: str, yaml_dir: str, policy_dir: str, filter_func: Optional[Callable] = None,
+                           workers: int = 1, summary_path: Optional[str] = None, fmt: str = 'yaml',
+                           sidecar: bool = False, db: Optional[str] = None) -> list[dict]:
+    """
+    process_batch with process_single_pipeline for every policy
+    """
+    return process_batch(jsonl_dir, yaml_dir, policy_dir, filter_func, workers, summary_path, fmt, sidecar,
+                         process=process_single_pipeline, db=db)
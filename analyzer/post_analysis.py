@@ -1,7 +1,14 @@
+import os
 import re
+import numpy as np
 import yaml
+from collections import defaultdict
 from itertools import product
+from typing import Iterable, Optional
 from config import *
+from contradiction.incremental import PairStore, pair_store_path
+from node import CollectionNode
+from ontology.condition.condition import Condition
 from ontology.data.handler import DataHandler
 from ontology.entity.Entity import Entity
 
@@ -13,6 +20,16 @@ third_party_alias = [entity.value for entity in Entity if entity != Entity.UNSPE
 This file is to process post-analysis results from YAML files. It resolves unspecified entities and adds missing tuples.
 """
 
+POST_PREFIX = "post_"
+
+
+def post_report_path(path: str) -> str:
+    """
+    Path of the post-processed report of the report at path
+    """
+    return os.path.join(os.path.dirname(path), POST_PREFIX + os.path.basename(path))
+
+
 def load_yaml_content(yaml_path: str) -> dict:
     """
     Load and parse YAML file content.
@@ -27,27 +44,105 @@ def load_yaml_content(yaml_path: str) -> dict:
         return yaml.load(f, Loader=yaml.FullLoader)
 
 
-def resolve_unspecified_entities(content: dict) -> dict:
+# node classes indexed by NodeStore, as the substring tests the post-analysis rules use
+UNSPECIFIED, WE, NEGATIVE = 'unspecified', 'we', 'not'
+
+
+def node_classes(node: dict) -> tuple[str, ...]:
+    classes = []
+    if UNSPECIFIED in node['entity']:
+        classes.append(UNSPECIFIED)
+    if WE in node['entity']:
+        classes.append(WE)
+    if NEGATIVE in node['verb']:
+        classes.append(NEGATIVE)
+    return tuple(classes)
+
+
+class NodeStore:
+    """
+    Usage:
+        store = NodeStore(content['nodes'])
+        for idx in store.ids(UNSPECIFIED):
+            store.remove(idx)
+        store.covers(entity, data)
+        content['nodes'][:] = store.nodes()
+    The report nodes in insertion order, with hash indexes by (entity, data) and by class (unspecified / we entity,
+    negative verb). Removal is O(1); a node may be removed while iterating over a list returned by ids().
+    """
+
+    def __init__(self, nodes: list[dict] = ()):
+        self._nodes: dict[int, dict] = {}
+        # dicts as insertion-ordered sets of node ids
+        self._by_pair: dict[tuple[str, str], dict[int, None]] = defaultdict(dict)
+        self._by_class: dict[str, dict[int, None]] = defaultdict(dict)
+        self._next_id = 0
+        for node in nodes:
+            self.add(node)
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def __getitem__(self, idx: int) -> dict:
+        return self._nodes[idx]
+
+    def add(self, node: dict) -> int:
+        idx = self._next_id
+        self._next_id += 1
+        self._nodes[idx] = node
+        self._by_pair[(node['entity'], node['data'])][idx] = None
+        for c in node_classes(node):
+            self._by_class[c][idx] = None
+        return idx
+
+    def remove(self, idx: int):
+        node = self._nodes.pop(idx)
+        pair = (node['entity'], node['data'])
+        del self._by_pair[pair][idx]
+        if not self._by_pair[pair]:
+            del self._by_pair[pair]
+        for c in node_classes(node):
+            del self._by_class[c][idx]
+
+    def ids(self, node_class: Optional[str] = None) -> list[int]:
+        """
+        Ids of the nodes of node_class (all nodes if None), in insertion order
+        """
+        if node_class is None:
+            return list(self._nodes)
+        return list(self._by_class.get(node_class, ()))
+
+    def nodes(self, node_class: Optional[str] = None) -> list[dict]:
+        return [self._nodes[idx] for idx in self.ids(node_class)]
+
+    def has_class(self, idx: int, node_class: str) -> bool:
+        return idx in self._by_class.get(node_class, ())
+
+    def covers(self, entity: str, data: str) -> bool:
+        return (entity, data) in self._by_pair
+
+
+def resolve_unspecified_entities(content: dict, store: Optional[NodeStore] = None) -> dict:
     """
     Resolve unspecified entities in the content by determining whether they should be classified 
     as 'we' or 'third parties' based on context and evidence.
     
     Args:
         content (dict): The content dictionary containing nodes with entities
+        store (NodeStore): Store of content['nodes'], built if not given; kept in sync with the resolved nodes
         
     Returns:
         dict: Mapping of old nodes to new nodes with resolved entities
     """
-    nodes = content['nodes']
-    unspecified = list(filter(lambda x: 'unspecified' in x['entity'], nodes))
-    we_collect = list(filter(lambda x: 'we' in x['entity'], nodes))
-    other_collect = list(filter(lambda x: x not in unspecified and x not in we_collect, nodes))
-    we_collect_data = set(map(lambda x: x['data'], we_collect))
-    other_collect_data = set(map(lambda x: x['data'], other_collect))
+    if store is None:
+        store = NodeStore(content['nodes'])
+    unspecified = store.ids(UNSPECIFIED)
+    we_collect_data = set(node['data'] for node in store.nodes(WE))
 
     to_append = []
     new_nodes = {}
-    for aTuple in unspecified:
+    for idx in unspecified:
+        aTuple = store[idx]
         has_third_party_flag = False
         for anEvidence in aTuple['evidence']:
             candidateEntity = anEvidence['candidateEntity']
@@ -74,63 +169,90 @@ def resolve_unspecified_entities(content: dict) -> dict:
             new_nodes[str(aTuple)] = new_tuple
             to_append.append(new_tuple)
 
-    for node in unspecified:
-        del content['nodes'][content['nodes'].index(node)]
-    content['nodes'].extend(to_append)
+    for idx in unspecified:
+        store.remove(idx)
+    for node in to_append:
+        store.add(node)
+    content['nodes'][:] = store.nodes()
 
     return new_nodes
 
 
-def add_missing_tuples_from_candidates(content: dict) -> list[dict]:
+def split_candidates(string: str, parts: dict[str, list[str]]) -> list[str]:
+    """
+    Items of a '{a,b}' candidate string, memoized in parts
+    """
+    if string not in parts:
+        parts[string] = string.strip('{}').split(',')
+    return parts[string]
+
+
+def evidence_context(evid: dict) -> str:
+    context = ''
+    if 'context' in evid:
+        context = evid['context']
+    if 'sentence' in evid:
+        context += evid['sentence']
+    return context.strip().lower()
+
+
+def recognize_contexts(contexts: Iterable[str]) -> dict[str, tuple[str, ...]]:
+    """
+    Data values recognized in every distinct context, in one recognize_many batch
+    """
+    unique = list(dict.fromkeys(contexts))
+    if not unique:
+        return {}
+    incidence = DataHandler.recognize_many(unique)
+    values = [concept.value for concept in incidence.concepts]
+    return {context: tuple(values[j] for j in np.flatnonzero(row)) for context, row in zip(unique, incidence.matrix)}
+
+
+def add_missing_tuples_from_candidates(content: dict, store: Optional[NodeStore] = None) -> list[dict]:
     """
     Add missing tuples based on candidate data and entities to account for potential network 
     failures or other reasons that may cause data types to be missing.
     
     Args:
         content (dict): The content dictionary containing nodes with entities
+        store (NodeStore): Store of content['nodes'], built if not given
         
     Returns:
         list[dict]: List of complementary nodes that were added
     """
-    nodes = content['nodes']
-    we_not_collect = list(filter(lambda x: 'not' in x['verb'] and 'we' in x['entity'], nodes))
-    we_not_collect_data = set(map(lambda x: x['data'], we_not_collect))
-    other_not_collect = list(filter(lambda x: x not in we_not_collect, nodes))
-    other_not_collect_data = set(map(lambda x: x['data'], other_not_collect))
-
-    collect_nodes = [node for node in nodes if 'unspecified' not in node['entity'] and 'not' not in node['verb']]
+    if store is None:
+        store = NodeStore(content['nodes'])
+    we_not_collect_data = set()
+    other_not_collect_data = set()
+    collect_nodes = []
+    for idx in store.ids():
+        node = store[idx]
+        if store.has_class(idx, NEGATIVE) and store.has_class(idx, WE):
+            we_not_collect_data.add(node['data'])
+        else:
+            other_not_collect_data.add(node['data'])
+        if not store.has_class(idx, UNSPECIFIED) and not store.has_class(idx, NEGATIVE):
+            collect_nodes.append(node)
 
-    we_collect_nodes = list(filter(lambda x: 'we' in x['entity'], collect_nodes))
-    other_collect_nodes = list(filter(lambda x: x not in we_collect_nodes, collect_nodes))
+    # every candidate string is split and every distinct evidence context recognized once per report
+    parts: dict[str, list[str]] = {}
+    evidences = [[(split_candidates(evid['candidateData'], parts), split_candidates(evid['candidateEntity'], parts),
+                   evidence_context(evid)) for evid in node['evidence']] for node in collect_nodes]
+    recognized = recognize_contexts(context for node_evidences in evidences for _, _, context in node_evidences)
 
-    covered_pair = [(node['entity'], node['data']) for node in nodes]
     uncovered_pair = set()
-    for node in collect_nodes:
-        evidences = node['evidence']
+    for node_evidences in evidences:
         candidate_data = []
         candidate_entity = []
-        for evid in evidences:
-            parser = lambda string: string.strip('{}').split(',')
-            candidate_data.extend(list(parser(evid['candidateData'])))
-            candidate_entity.extend(list(parser(evid['candidateEntity'])))
-
-            context = ''
-            if 'context' in evid:
-                context = evid['context']
-            if 'sentence' in evid:
-                context += evid['sentence']
-            context = context.strip().lower()
-            new_candidate_data = DataHandler.recognize_as_Data(context)
-            candidate_data.extend(map(lambda x: x.value, new_candidate_data))
-
-        if not isinstance(candidate_data, list):
-            candidate_data = [candidate_data]
-        if not isinstance(candidate_entity, list):
-            candidate_entity = [candidate_entity]
+        for data, entity, context in node_evidences:
+            candidate_data.extend(data)
+            candidate_entity.extend(entity)
+            candidate_data.extend(recognized[context])
+
         candidate_data = list(set(candidate_data))
         candidate_entity = list(set(candidate_entity))
         for e, d in product(candidate_entity, candidate_data):
-            if d and (e, d) not in covered_pair:
+            if d and not store.covers(e, d):
                 if e == Entity.WE.value:
                     if d not in we_not_collect_data:
                         uncovered_pair.add((e, d))
@@ -160,21 +282,63 @@ def add_missing_tuples_from_candidates(content: dict) -> list[dict]:
     return complementary_nodes
 
 
-def process_post_analysis_results(content: dict) -> dict:
+def process_post_analysis_results(content: dict, store: Optional[NodeStore] = None) -> dict:
     """
     Process content by resolving unspecified entities.
     
     Args:
         content (dict): The content dictionary containing nodes with entities
+        store (NodeStore): Store of content['nodes'], built if not given
         
     Returns:
         dict: Mapping of old nodes to new nodes with resolved entities
     """
-    mapping_old2new: dict = resolve_unspecified_entities(content)
+    mapping_old2new: dict = resolve_unspecified_entities(content, store)
 
     nodes = content['nodes']
     new_tuples = [node['tuple'] for node in mapping_old2new.values()]
     content['rule1'] = new_tuples
 
     content['tuples'] = [node['tuple'] for node in nodes if 'unspecified' not in node['entity']]
-    return mapping_old2new
\ No newline at end of file
+    return mapping_old2new
+
+
+def report_nodes(content: dict) -> list[tuple[str, CollectionNode]]:
+    """
+    (tuple string, node) of the tuples of a report: its nodes and the tuples inferred by rule2
+    """
+    ret = []
+    for node in content['nodes'] + content.get('rule2', []):
+        condition = node.get('condition', Condition.NO_COND.value)
+        ret.append((node['tuple'], CollectionNode(node['entity'], node['verb'], node['data'], condition)))
+    return ret
+
+
+def load_pair_store(yaml_path: str, content: dict) -> PairStore:
+    """
+    Pair store saved with the report at yaml_path, or one evaluated from the tuples of content
+    """
+    from analyzer.analyzer import preload_ontologies
+    preload_ontologies()
+    store = PairStore.load(pair_store_path(yaml_path))
+    if store is None:
+        store = PairStore()
+        store.add_all(report_nodes(content))
+    return store
+
+
+def update_contradiction_pairs(content: dict, store: PairStore) -> tuple[int, int]:
+    """
+    Bring the store up to date with the tuples of content and rewrite its contradiction and narrowing pairs.
+    Only the pairs of added or removed tuples are evaluated.
+
+    Returns:
+        tuple[int, int]: Number of tuples added to and removed from the store
+    """
+    added, removed = store.sync(report_nodes(content))
+    content['contradictionPairs'] = store.contradiction_pairs()
+    content['narrowingPairs'] = store.narrowing_pairs()
+    if 'basicInfo' in content:
+        content['basicInfo']['contradictionPairNum'] = len(content['contradictionPairs'])
+        content['basicInfo']['narrowingPairNum'] = len(content['narrowingPairs'])
+    return added, removed
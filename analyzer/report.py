@@ -0,0 +1,332 @@
+import json
+import os
+import pickle
+import re
+from typing import Callable, Iterator, Optional
+
+import yaml
+
+from node import CollectionNode
+
+try:
+    from yaml import CDumper as _FastDumper
+except ImportError:
+    _FastDumper = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+"""
+Report writers of the analyzer.
+build_report turns the analysis of one policy into the report dict that is written as YAML (the format the post
+stage and the evaluation scripts read), JSON, JSON lines, or Parquet tables of tuples, evidence and pairs.
+YAML is dumped with libyaml when it is available. Reports holding strings libyaml writes differently (characters it
+escapes, double-quoted strings long enough to be folded, which it breaks at other points) are dumped by the
+pure-Python dumper, so that the output is byte-identical either way.
+The analyze and post stages can also hand reports over in a binary sidecar (msgpack, or pickle without msgpack)
+next to the report, which the post stage reads instead of parsing the YAML again.
+"""
+
+REPORT_FORMATS = ('yaml', 'json', 'jsonl', 'parquet')
+# .ndjson keeps JSON-lines reports apart from the analysis.jsonl LLM outputs the batch mode reads
+REPORT_SUFFIXES = {'yaml': '.yaml', 'json': '.json', 'jsonl': '.ndjson', 'parquet': '.parquet'}
+PARQUET_TABLES = ('tuples', 'evidence', 'pairs')
+
+# characters libyaml escapes while the pure-Python emitter writes them as they are
+_ESCAPED_BY_LIBYAML = re.compile('[\x85\U00010000-\U0010FFFF]')
+YAML_WIDTH = 1024
+# double-quoted strings longer than this may reach YAML_WIDTH once escaped (up to 10 columns a character) and
+# indented, and the emitters fold them at different points
+_FOLDABLE_LENGTH = (YAML_WIDTH - 128) // 10
+# only used to tell the style a string gets
+_STYLE_ANALYZER = yaml.emitter.Emitter(None, allow_unicode=True)
+
+
+def missing_dependency(fmt: str) -> Optional[str]:
+    """
+    Why reports cannot be written in fmt here, or None
+    """
+    if fmt == 'parquet' and pyarrow is None:
+        return "The parquet report format requires pyarrow (pip install pyarrow)"
+    return None
+
+
+def report_path(yaml_path: str, fmt: str) -> str:
+    """
+    Path of the report in fmt that replaces the YAML report at yaml_path
+    """
+    return os.path.splitext(yaml_path)[0] + REPORT_SUFFIXES[fmt]
+
+
+def parquet_table_path(path: str, table: str) -> str:
+    return f"{os.path.splitext(path)[0]}.{table}.parquet"
+
+
+SIDECAR_VERSION = 1
+SIDECAR_SUFFIXES = {'msgpack': '.report.msgpack', 'pickle': '.report.pickle'}
+
+
+def sidecar_path(path: str, codec: Optional[str] = None) -> str:
+    """
+    Binary sidecar of the report at path, in codec or in the best codec available
+    """
+    codec = codec or ('msgpack' if msgpack is not None else 'pickle')
+    return os.path.splitext(path)[0] + SIDECAR_SUFFIXES[codec]
+
+
+def report_of_sidecar(path: str) -> Optional[str]:
+    """
+    YAML report path of the sidecar at path, None if path is not a sidecar
+    """
+    for suffix in SIDECAR_SUFFIXES.values():
+        if path.endswith(suffix):
+            return path[:-len(suffix)] + '.yaml'
+    return None
+
+
+def write_sidecar(data: dict, path: str) -> str:
+    """
+    Write the sidecar of the report at path and return its path
+    """
+    payload = {'version': SIDECAR_VERSION, 'report': data}
+    out = sidecar_path(path)
+    with open(out, 'wb') as file:
+        if msgpack is not None:
+            file.write(msgpack.packb(payload, use_bin_type=True))
+        else:
+            pickle.dump(payload, file, protocol=pickle.HIGHEST_PROTOCOL)
+    return out
+
+
+def read_sidecar(path: str) -> Optional[dict]:
+    """
+    Report of the sidecar of the report at path, or None if there is no readable sidecar or the report at path was
+    written after it (e.g. edited by hand)
+    """
+    report_mtime = os.path.getmtime(path) if os.path.isfile(path) else None
+    for codec in ('msgpack', 'pickle'):
+        if codec == 'msgpack' and msgpack is None:
+            continue
+        candidate = sidecar_path(path, codec)
+        if not os.path.isfile(candidate):
+            continue
+        if report_mtime is not None and report_mtime > os.path.getmtime(candidate):
+            return None
+        try:
+            with open(candidate, 'rb') as file:
+                if codec == 'msgpack':
+                    payload = msgpack.unpackb(file.read(), raw=False)
+                else:
+                    payload = pickle.load(file)
+        except Exception as e:
+            print(f"Cannot read report sidecar {candidate}: {e}")
+            continue
+        if isinstance(payload, dict) and payload.get('version') == SIDECAR_VERSION:
+            return payload['report']
+    return None
+
+
+def build_report(name: str, contradictions: list[tuple[CollectionNode, CollectionNode]],
+                 narrowing: list[tuple[CollectionNode, CollectionNode]], pos_nodes: list[CollectionNode],
+                 neg_nodes: list[CollectionNode], policy_content: str) -> dict:
+    entities = list(set([node.entity.strip() for node in pos_nodes + neg_nodes]))
+    data_items = list(set([node.data.strip() for node in pos_nodes + neg_nodes]))
+    conditions = list(set([node.condition.strip() for node in pos_nodes + neg_nodes]))
+    contradiction_pair_num = len(contradictions)
+    narrowing_pair_num = len(narrowing)
+    policy_length = len(policy_content)
+
+    nodes_info: list[dict] = []
+    tuples: set[str] = set()
+    for node in pos_nodes + neg_nodes:
+        evidence_list = []
+        for idx, ctx in enumerate(node.extra.get('contexts', [])):
+            context_dict = {
+                'evidenceId': (idx + 1),
+                'sentence': ctx.sentence,
+                'candidateEntity': ctx.candidateEntity,
+                'candidateData': ctx.candidateData,
+                'candidateCondition': ctx.candidateCondition,
+            }
+            if ctx.context != ctx.sentence:
+                context_dict['context'] = ctx.context
+                context_dict['sentenceIntegrity'] = False
+            else:
+                context_dict['sentenceIntegrity'] = True
+            evidence_list.append(context_dict)
+            tuples.add(node.pretty_print())
+        node_dict = {
+            'tuple': node.pretty_print(),
+            'entity': node.entity.strip(),
+            'verb': node.verb.strip(),
+            'data': node.data.strip(),
+            'condition': node.condition.strip(),
+            'evidence': evidence_list,
+        }
+        nodes_info.append(node_dict)
+
+    contradiction_pairs = [f"{pair[0].pretty_print()} vs {pair[1].pretty_print()}" for pair in contradictions]
+    narrowing_pairs = [f"{pair[0].pretty_print()} vs {pair[1].pretty_print()}" for pair in narrowing]
+
+    return {
+        'tuples': sorted(list(tuples)),
+        'basicInfo': {
+            'name': name,
+            'policyLength': policy_length,
+            'tupleNum': len(tuples),
+            'entityNum': len(entities),
+            'entities': entities,
+
+            'dataItemNum': len(data_items),
+            'dataItems': data_items,
+
+            'conditionNum': len(conditions),
+            'occuredConditions': conditions,
+
+            'contradictionPairNum': contradiction_pair_num,
+            'narrowingPairNum': narrowing_pair_num,
+            'collectionTupleNum': len(pos_nodes),
+            'negationTupleNum': len(neg_nodes),
+        },
+
+        'nodes': sorted(nodes_info, key=lambda x: str(x)),
+        'contradictionPairs': sorted(contradiction_pairs, key=lambda x: str(x)),
+        'narrowingPairs': sorted(narrowing_pairs, key=lambda x: str(x)),
+
+    }
+
+
+def _strings(obj) -> Iterator[str]:
+    if isinstance(obj, str):
+        yield obj
+    elif isinstance(obj, dict):
+        for key, value in obj.items():
+            yield from _strings(key)
+            yield from _strings(value)
+    elif isinstance(obj, (list, tuple, set)):
+        for value in obj:
+            yield from _strings(value)
+
+
+def _written_differently(s: str) -> bool:
+    if _ESCAPED_BY_LIBYAML.search(s):
+        return True
+    return len(s) > _FOLDABLE_LENGTH and not _STYLE_ANALYZER.analyze_scalar(s).allow_single_quoted
+
+
+def yaml_dumper(data) -> type:
+    """
+    libyaml's dumper, unless it is missing or data holds strings it would write differently
+    """
+    if _FastDumper is None or any(_written_differently(s) for s in _strings(data)):
+        return yaml.Dumper
+    return _FastDumper
+
+
+def dump_yaml(data, file):
+    yaml.dump(data, file, Dumper=yaml_dumper(data), allow_unicode=True, default_flow_style=False, width=YAML_WIDTH)
+
+
+def write_yaml(data: dict, path: str):
+    with open(path, 'w', encoding='utf-8') as file:
+        dump_yaml(data, file)
+
+
+def _dumps_json(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def write_json(data: dict, path: str):
+    with open(path, 'wb') as file:
+        file.write(_dumps_json(data))
+
+
+def jsonl_records(data: dict) -> Iterator[dict]:
+    """
+    One record per line: the basic info, then every node, tuple and pair, told apart by their 'record' field
+    """
+    yield {'record': 'basicInfo', **data['basicInfo']}
+    for node in data['nodes']:
+        yield {'record': 'node', **node}
+    for t in data['tuples']:
+        yield {'record': 'tuple', 'tuple': t}
+    for key, record in (('contradictionPairs', 'contradictionPair'), ('narrowingPairs', 'narrowingPair')):
+        for pair in data[key]:
+            yield {'record': record, 'pair': pair}
+
+
+def write_jsonl(data: dict, path: str):
+    with open(path, 'wb') as file:
+        for record in jsonl_records(data):
+            file.write(_dumps_json(record))
+            file.write(b'\n')
+
+
+def parquet_columns(data: dict) -> dict[str, dict[str, list]]:
+    """
+    {table: {column: values}} of the tuples, evidence and pairs tables of a report
+    """
+    name = data['basicInfo']['name']
+    tuples = {'policy': [], 'tuple': [], 'entity': [], 'verb': [], 'data': [], 'condition': [], 'evidenceNum': []}
+    evidence = {'policy': [], 'tuple': [], 'evidenceId': [], 'sentence': [], 'context': [], 'sentenceIntegrity': [],
+                'candidateEntity': [], 'candidateData': [], 'candidateCondition': []}
+    pairs = {'policy': [], 'kind': [], 'pair': [], 'left': [], 'right': []}
+    for node in data['nodes']:
+        for column in ('tuple', 'entity', 'verb', 'data', 'condition'):
+            tuples[column].append(node[column])
+        tuples['policy'].append(name)
+        tuples['evidenceNum'].append(len(node['evidence']))
+        for ev in node['evidence']:
+            evidence['policy'].append(name)
+            evidence['tuple'].append(node['tuple'])
+            evidence['context'].append(ev.get('context', ev['sentence']))
+            for column in ('evidenceId', 'sentence', 'sentenceIntegrity', 'candidateEntity', 'candidateData',
+                           'candidateCondition'):
+                evidence[column].append(ev[column])
+    for key, kind in (('contradictionPairs', 'contradiction'), ('narrowingPairs', 'narrowing')):
+        for pair in data[key]:
+            left, _, right = pair.partition(' vs ')
+            for column, value in (('policy', name), ('kind', kind), ('pair', pair), ('left', left), ('right', right)):
+                pairs[column].append(value)
+    return {'tuples': tuples, 'evidence': evidence, 'pairs': pairs}
+
+
+def write_parquet(data: dict, path: str):
+    """
+    Write the tables of parquet_columns next to path, as <name>.tuples.parquet, <name>.evidence.parquet and
+    <name>.pairs.parquet
+    """
+    if pyarrow is None:
+        raise ImportError(missing_dependency('parquet'))
+    columns = parquet_columns(data)
+    for table in PARQUET_TABLES:
+        pyarrow.parquet.write_table(pyarrow.table(columns[table]), parquet_table_path(path, table))
+
+
+WRITERS: dict[str, Callable[[dict, str], None]] = {
+    'yaml': write_yaml,
+    'json': write_json,
+    'jsonl': write_jsonl,
+    'parquet': write_parquet,
+}
+
+
+def write_report(data: dict, path: str, fmt: str = 'yaml'):
+    if fmt not in WRITERS:
+        raise ValueError(f"Unknown report format {fmt}, expected one of {', '.join(REPORT_FORMATS)}")
+    WRITERS[fmt](data, path)
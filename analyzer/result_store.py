@@ -0,0 +1,334 @@
+import os
+import sqlite3
+from typing import Optional
+
+import yaml
+
+from analyzer.report import read_sidecar, report_of_sidecar
+
+"""
+SQLite store of analysis results.
+Every report added to the store becomes a policy row (one per policy and stage, analysis or post) with its sentences,
+tuples, evidence and contradiction / narrowing pairs, indexed by entity, data and condition, so that questions across
+a whole corpus, e.g. which apps contradict on location under children, are answered with one indexed query instead of
+parsing every report again. Composite conditions ("user action and third party") are split into their members, so
+that a condition filter matches every tuple whose condition contains it.
+"""
+
+ANALYSIS, POST = 'analysis', 'post'
+STAGES = (ANALYSIS, POST)
+# prefix the post stage gives its reports, see analyzer.post_analysis.POST_PREFIX
+_POST_PREFIX = 'post_'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS policies (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    path TEXT,
+    policy_length INTEGER,
+    tuple_num INTEGER,
+    contradiction_num INTEGER,
+    narrowing_num INTEGER,
+    UNIQUE (name, stage)
+);
+CREATE TABLE IF NOT EXISTS sentences (
+    id INTEGER PRIMARY KEY,
+    policy_id INTEGER NOT NULL REFERENCES policies(id) ON DELETE CASCADE,
+    text TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tuples (
+    id INTEGER PRIMARY KEY,
+    policy_id INTEGER NOT NULL REFERENCES policies(id) ON DELETE CASCADE,
+    tuple TEXT NOT NULL,
+    entity TEXT,
+    verb TEXT,
+    data TEXT,
+    condition TEXT,
+    source TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tuple_conditions (
+    tuple_id INTEGER NOT NULL REFERENCES tuples(id) ON DELETE CASCADE,
+    condition TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS evidence (
+    id INTEGER PRIMARY KEY,
+    tuple_id INTEGER NOT NULL REFERENCES tuples(id) ON DELETE CASCADE,
+    evidence_id INTEGER,
+    sentence_id INTEGER REFERENCES sentences(id) ON DELETE CASCADE,
+    context_id INTEGER REFERENCES sentences(id) ON DELETE CASCADE,
+    sentence_integrity INTEGER,
+    candidate_entity TEXT,
+    candidate_data TEXT,
+    candidate_condition TEXT
+);
+CREATE TABLE IF NOT EXISTS pairs (
+    id INTEGER PRIMARY KEY,
+    policy_id INTEGER NOT NULL REFERENCES policies(id) ON DELETE CASCADE,
+    kind TEXT NOT NULL,
+    left_tuple TEXT NOT NULL,
+    right_tuple TEXT NOT NULL,
+    left_id INTEGER REFERENCES tuples(id),
+    right_id INTEGER REFERENCES tuples(id)
+);
+CREATE INDEX IF NOT EXISTS sentences_policy ON sentences (policy_id);
+CREATE INDEX IF NOT EXISTS tuples_policy ON tuples (policy_id);
+CREATE INDEX IF NOT EXISTS tuples_data ON tuples (data, entity);
+CREATE INDEX IF NOT EXISTS tuples_entity ON tuples (entity);
+CREATE INDEX IF NOT EXISTS tuple_conditions_condition ON tuple_conditions (condition, tuple_id);
+CREATE INDEX IF NOT EXISTS tuple_conditions_tuple ON tuple_conditions (tuple_id);
+CREATE INDEX IF NOT EXISTS evidence_tuple ON evidence (tuple_id);
+CREATE INDEX IF NOT EXISTS evidence_sentence ON evidence (sentence_id);
+CREATE INDEX IF NOT EXISTS evidence_context ON evidence (context_id);
+CREATE INDEX IF NOT EXISTS pairs_policy ON pairs (policy_id, kind);
+CREATE INDEX IF NOT EXISTS pairs_left ON pairs (left_id);
+CREATE INDEX IF NOT EXISTS pairs_right ON pairs (right_id);
+-- the post report of a policy when there is one, its analysis report otherwise
+CREATE VIEW IF NOT EXISTS latest_policies AS
+    SELECT * FROM policies p
+    WHERE p.stage = 'post' OR NOT EXISTS (SELECT 1 FROM policies q WHERE q.name = p.name AND q.stage = 'post');
+"""
+
+
+def condition_members(condition: str) -> list[str]:
+    """
+    Members of a condition string, see ConditionSet.join
+    """
+    return [c.strip() for c in condition.split(' and ') if c.strip()]
+
+
+def _match(column: str, value: str) -> tuple[str, str]:
+    """
+    SQL test of column against value, a LIKE pattern when value holds a % wildcard
+    """
+    return (f"{column} LIKE ?" if '%' in value else f"{column} = ?"), value
+
+
+def report_stage(path: str) -> str:
+    return POST if os.path.basename(path).startswith(_POST_PREFIX) else ANALYSIS
+
+
+class ResultStore:
+    """
+    SQLite database of analysis reports, see the module docstring. Several processes can add reports to the same
+    database; each report is written in one transaction.
+    """
+
+    def __init__(self, path: str, timeout: float = 60.0):
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=timeout)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        if path != ':memory:':
+            self.connection.execute("PRAGMA journal_mode = WAL")
+        with self.connection:
+            self.connection.executescript(SCHEMA)
+
+    def __enter__(self) -> 'ResultStore':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    # ---- writing ----
+
+    def add_report(self, data: dict, stage: str = ANALYSIS, path: Optional[str] = None) -> int:
+        """
+        Add the report dict of a policy (build_report, or the post stage's report), replacing the report the policy
+        had at that stage. Tuples inferred by the post stage (rule2) are added with source 'rule2'.
+        :return: id of the policy row
+        """
+        if stage not in STAGES:
+            raise ValueError(f"Unknown stage {stage}, expected one of {', '.join(STAGES)}")
+        info = data['basicInfo']
+        with self.connection as db:
+            db.execute("DELETE FROM policies WHERE name = ? AND stage = ?", (info['name'], stage))
+            policy_id = db.execute(
+                "INSERT INTO policies (name, stage, path, policy_length, tuple_num, contradiction_num, narrowing_num) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (info['name'], stage, path, info.get('policyLength'), len(data.get('tuples', [])),
+                 len(data.get('contradictionPairs', [])), len(data.get('narrowingPairs', [])))).lastrowid
+
+            sentences: dict[str, int] = {}
+            for node in data['nodes']:
+                for ev in node['evidence']:
+                    sentences.setdefault(ev['sentence'], len(sentences))
+                    sentences.setdefault(ev.get('context', ev['sentence']), len(sentences))
+            first = db.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM sentences").fetchone()[0]
+            db.executemany("INSERT INTO sentences (id, policy_id, text) VALUES (?, ?, ?)",
+                           [(first + i, policy_id, text) for text, i in sentences.items()])
+
+            tuple_ids: dict[str, int] = {}
+            evidence, conditions = [], []
+            nodes = [(node, 'node') for node in data['nodes']] + [(node, 'rule2') for node in data.get('rule2', [])]
+            for node, source in nodes:
+                condition = node.get('condition', 'any condition')
+                tuple_id = db.execute(
+                    "INSERT INTO tuples (policy_id, tuple, entity, verb, data, condition, source) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (policy_id, node['tuple'], node['entity'], node['verb'], node['data'], condition, source)).lastrowid
+                tuple_ids.setdefault(node['tuple'], tuple_id)
+                conditions.extend((tuple_id, c) for c in condition_members(condition))
+                for ev in node.get('evidence', []):
+                    evidence.append((tuple_id, ev['evidenceId'], first + sentences[ev['sentence']],
+                                     first + sentences[ev.get('context', ev['sentence'])],
+                                     int(ev['sentenceIntegrity']), ev['candidateEntity'], ev['candidateData'],
+                                     ev['candidateCondition']))
+            db.executemany("INSERT INTO tuple_conditions (tuple_id, condition) VALUES (?, ?)", conditions)
+            db.executemany(
+                "INSERT INTO evidence (tuple_id, evidence_id, sentence_id, context_id, sentence_integrity, "
+                "candidate_entity, candidate_data, candidate_condition) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", evidence)
+
+            pairs = []
+            for key, kind in (('contradictionPairs', 'contradiction'), ('narrowingPairs', 'narrowing')):
+                for pair in data.get(key, []):
+                    left, _, right = pair.partition(' vs ')
+                    pairs.append((policy_id, kind, left, right, tuple_ids.get(left), tuple_ids.get(right)))
+            db.executemany("INSERT INTO pairs (policy_id, kind, left_tuple, right_tuple, left_id, right_id) "
+                           "VALUES (?, ?, ?, ?, ?, ?)", pairs)
+        return policy_id
+
+    def add_file(self, path: str, stage: Optional[str] = None) -> Optional[int]:
+        """
+        Add the YAML report at path, read from its binary sidecar when it has one; the stage defaults to post for
+        post_* reports. Returns None for files that are not reports.
+        """
+        content = read_sidecar(path)
+        if content is None:
+            if not os.path.isfile(path):
+                return None
+            with open(path, 'r', encoding='utf-8') as f:
+                content = yaml.load(f, Loader=yaml.FullLoader)
+        if not isinstance(content, dict) or 'nodes' not in content or 'basicInfo' not in content:
+            return None
+        return self.add_report(content, stage or report_stage(path), path)
+
+    def add_directory(self, directory: str) -> int:
+        """
+        Add every YAML report (or report written as a sidecar only) under directory, return how many were added
+        """
+        paths = set()
+        for root, _, files in os.walk(directory):
+            for file in files:
+                if file.endswith('.yaml'):
+                    paths.add(os.path.join(root, file))
+                elif report_of_sidecar(file):
+                    paths.add(os.path.join(root, report_of_sidecar(file)))
+        added = 0
+        for path in sorted(paths):
+            try:
+                added += self.add_file(path) is not None
+            except Exception as e:
+                print(f"Cannot add report {path}: {e}")
+        return added
+
+    # ---- queries ----
+
+    def query(self, sql: str, params: tuple = ()) -> list[dict]:
+        return [dict(row) for row in self.connection.execute(sql, params)]
+
+    def _policy_filter(self, policy: Optional[str], stage: Optional[str]) -> tuple[str, list, list]:
+        """
+        FROM clause of the policies of stage (the latest stage of every policy when None), WHERE tests and params
+        """
+        source = 'latest_policies' if stage is None else 'policies'
+        where, params = [], []
+        if stage is not None:
+            where.append("p.stage = ?")
+            params.append(stage)
+        if policy:
+            test, value = _match('p.name', policy)
+            where.append(test)
+            params.append(value)
+        return f"{source} p", where, params
+
+    @staticmethod
+    def _tuple_filter(alias: str, entity: Optional[str], data: Optional[str],
+                      condition: Optional[str]) -> tuple[list[str], list]:
+        where, params = [], []
+        for column, value in (('entity', entity), ('data', data)):
+            if value:
+                test, value = _match(f"{alias}.{column}", value)
+                where.append(test)
+                params.append(value)
+        if condition:
+            test, value = _match('c.condition', condition)
+            where.append(f"EXISTS (SELECT 1 FROM tuple_conditions c WHERE c.tuple_id = {alias}.id AND {test})")
+            params.append(value)
+        return where, params
+
+    def tuples(self, entity: Optional[str] = None, data: Optional[str] = None, condition: Optional[str] = None,
+               verb: Optional[str] = None, policy: Optional[str] = None, stage: Optional[str] = None) -> list[dict]:
+        """
+        Tuples matching every given filter. Filters are exact values, or LIKE patterns when they hold a %; condition
+        matches any member of a tuple's condition. stage None reads the latest stage of every policy.
+        """
+        source, where, params = self._policy_filter(policy, stage)
+        tests, values = self._tuple_filter('t', entity, data, condition)
+        if verb:
+            test, value = _match('t.verb', verb)
+            tests.append(test)
+            values.append(value)
+        where = ' AND '.join(where + tests) or '1'
+        return self.query(
+            f"SELECT p.name AS policy, p.stage, t.tuple, t.entity, t.verb, t.data, t.condition, t.source, "
+            f"(SELECT COUNT(*) FROM evidence e WHERE e.tuple_id = t.id) AS evidenceNum "
+            f"FROM {source} JOIN tuples t ON t.policy_id = p.id WHERE {where} ORDER BY p.name, t.tuple",
+            tuple(params + values))
+
+    def pairs(self, kind: Optional[str] = 'contradiction', entity: Optional[str] = None, data: Optional[str] = None,
+              condition: Optional[str] = None, policy: Optional[str] = None,
+              stage: Optional[str] = None) -> list[dict]:
+        """
+        Pairs of kind (all kinds when None) with either tuple matching the entity, data and condition filters, see
+        tuples
+        """
+        source, where, params = self._policy_filter(policy, stage)
+        if kind:
+            where.append("r.kind = ?")
+            params.append(kind)
+        if entity or data or condition:
+            left, left_params = self._tuple_filter('l', entity, data, condition)
+            right, right_params = self._tuple_filter('t', entity, data, condition)
+            where.append(f"(({' AND '.join(left)}) OR ({' AND '.join(right)}))")
+            params.extend(left_params + right_params)
+        where = ' AND '.join(where) or '1'
+        return self.query(
+            f"SELECT p.name AS policy, p.stage, r.kind, r.left_tuple AS left, r.right_tuple AS right "
+            f"FROM {source} JOIN pairs r ON r.policy_id = p.id "
+            f"LEFT JOIN tuples l ON l.id = r.left_id LEFT JOIN tuples t ON t.id = r.right_id "
+            f"WHERE {where} ORDER BY p.name, r.left_tuple, r.right_tuple",
+            tuple(params))
+
+    def policies(self, stage: Optional[str] = None) -> list[dict]:
+        source, where, params = self._policy_filter(None, stage)
+        where = ' AND '.join(where) or '1'
+        return self.query(
+            f"SELECT p.name, p.stage, p.path, p.policy_length AS policyLength, p.tuple_num AS tupleNum, "
+            f"p.contradiction_num AS contradictionPairNum, p.narrowing_num AS narrowingPairNum "
+            f"FROM {source} WHERE {where} ORDER BY p.name", tuple(params))
+
+    def evidence(self, tuple_string: str, policy: str, stage: Optional[str] = None) -> list[dict]:
+        """
+        Evidence of a tuple of a policy, with its sentence and context
+        """
+        source, where, params = self._policy_filter(policy, stage)
+        where = ' AND '.join(where + ["t.tuple = ?"])
+        return self.query(
+            f"SELECT p.name AS policy, t.tuple, e.evidence_id AS evidenceId, s.text AS sentence, c.text AS context, "
+            f"e.sentence_integrity AS sentenceIntegrity, e.candidate_entity AS candidateEntity, "
+            f"e.candidate_data AS candidateData, e.candidate_condition AS candidateCondition "
+            f"FROM {source} JOIN tuples t ON t.policy_id = p.id JOIN evidence e ON e.tuple_id = t.id "
+            f"JOIN sentences s ON s.id = e.sentence_id JOIN sentences c ON c.id = e.context_id "
+            f"WHERE {where} ORDER BY t.id, e.evidence_id", tuple(params + [tuple_string]))
+
+
+def add_to_store(db_path: str, data: dict, stage: str = ANALYSIS, path: Optional[str] = None):
+    """
+    Add a report to the result store at db_path, the analyzer's optional sink
+    """
+    with ResultStore(db_path) as store:
+        store.add_report(data, stage, path)
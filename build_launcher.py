@@ -0,0 +1,47 @@
+import argparse
+import time
+
+from analyzer.build_graph import STAGES, run_build
+from config import *
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Rebuild the stale prompt, analyze and post artifacts of a policies directory.",
+        epilog="Examples:\n"
+               "  python build_launcher.py --input path/to/policies --dry-run\n"
+               "  python build_launcher.py --input path/to/policies --adopt --stages analyze post --workers 8\n"
+               "  python build_launcher.py --input path/to/policies --model deepseek-chat --key [key] --url [url]"
+    )
+    parser.add_argument('--input', required=True, help='Directory of the policy directories')
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES),
+                        help='Stages to rebuild (default: all)')
+    parser.add_argument('--model', default=deepseek_model, help='Model of the prompt stage (default: %(default)s)')
+    parser.add_argument('--key', help='API key for the model provider')
+    parser.add_argument('--url', help='Base URL for the model provider')
+    parser.add_argument('--concurrency', type=int, default=8, metavar='N',
+                        help='Policies prompted at the same time (default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=1, metavar='N',
+                        help='Run the analyze and post stages of the policies in N worker processes')
+    parser.add_argument('--dry-run', action='store_true', help='Only list the stale artifacts and why')
+    parser.add_argument('--adopt', action='store_true',
+                        help='Record the existing artifacts without a build.json entry as up to date, '
+                             'e.g. the LLM outputs of earlier runs, instead of rebuilding them')
+    parser.add_argument('--summary', metavar='CSV', help='Write the per-policy timings and errors to this CSV')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if not os.path.isdir(args.input):
+        logger.error(f"Input directory does not exist: {args.input}")
+        return
+    start_time = time.time()
+    run_build(args.input, stages=tuple(s for s in STAGES if s in args.stages), model=args.model,
+              workers=args.workers, dry_run=args.dry_run, adopt=args.adopt, api_key=args.key, api_base_url=args.url,
+              concurrency=args.concurrency, summary_path=args.summary)
+    logger.info(f"Total running time: {time.time() - start_time:.2f} seconds.")
+
+
+if __name__ == '__main__':
+    main()
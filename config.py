@@ -29,6 +29,14 @@ region_yml = os.path.join(condition_dir_path, "region.yml")
 specific_yml = os.path.join(condition_dir_path, "specific.yml")
 thirdp_yml = os.path.join(condition_dir_path, "thirdp.yml")
 
+# recognition caches of the ontology handlers, see ontology/cache.py
+RECOGNITION_CACHE_SIZE = 100000  # entries per recognition entry point, None means unbounded
+RECOGNITION_CACHE_TTL = None  # seconds, None means entries never expire
+# approximate fallback for data/entity terms no regex matches, see ontology/fuzzy.py
+FUZZY_MATCH_THRESHOLD = 0.8  # minimum Dice similarity of character trigrams of the distinguishing words
+FUZZY_MAX_TERM_WORDS = 5  # longer inputs (sentences, contexts) never go through the fallback
+FUZZY_MEMO_DIR = None  # directory of the on-disk memo, outside the source tree; None keeps it in memory
+
 
 gpt_key = '<YOUR_GPT_KEY>'
 gpt_base = '<YOUR_GPT_BASE>'
@@ -0,0 +1,124 @@
+from collections import defaultdict
+from typing import Callable, Hashable, Optional
+
+from node import CollectionNode
+from ontology.data.handler import DataHandler
+from ontology.entity.handler import EntityHandler
+
+"""
+Blocking index for candidate-pair generation in apply_rule.
+A pos/neg pair can only fire a rule if entity_related, data_related and condition_related all hold. The first two
+only depend on the entity (data) strings being equal or on the pair of ontology concepts they resolve to, so the
+neg nodes are bucketed by string and by concept, every distinct concept pair is decided once, and a pos node only
+meets the neg nodes of the related buckets. The candidates are a superset of the related pairs (apply_rule still
+runs the full predicates on them), which keeps the rule output identical to the pos x neg product.
+"""
+
+# data strings that data_related never relates to anything but themselves
+NON_PERSONAL_DATA = ['non_personal_info', 'aggregate', 'transformed_information', 'pseudonymous']
+
+
+def node_entity_concept(node: CollectionNode):
+    return node.entity_concept
+
+
+def node_related_data_concept(node: CollectionNode):
+    """
+    The data concept of node if data_related may relate its data string to other strings
+    """
+    if node.data in NON_PERSONAL_DATA:
+        return None
+    return node.data_concept
+
+
+def entity_concepts_related(a, b) -> bool:
+    return EntityHandler.is_lower(a, b) or EntityHandler.is_higher(a, b)
+
+
+def data_concepts_related(a, b) -> bool:
+    return DataHandler.is_lower(a, b) or DataHandler.is_higher(a, b)
+
+
+class _Block:
+    """
+    Buckets of node indices by term string and by the ontology concept the node resolved the term to
+    """
+
+    def __init__(self, resolve: Callable[[CollectionNode], Optional[Hashable]],
+                 related: Callable[[Hashable, Hashable], bool]):
+        self.resolve = resolve
+        self.related = related
+        self.by_term: dict[str, set[int]] = defaultdict(set)
+        self.by_concept: dict[Hashable, set[int]] = defaultdict(set)
+        self._related_concepts: dict[Hashable, list] = {}
+
+    def concept_of(self, node: CollectionNode):
+        try:
+            return self.resolve(node)
+        except Exception:
+            # the rule predicates fail on this term too, only an equal term can pair with it
+            return None
+
+    def add(self, term: str, node: CollectionNode, idx: int):
+        self.by_term[term].add(idx)
+        concept = self.concept_of(node)
+        if concept:
+            if concept not in self.by_concept:
+                # a new bucket may be related to concepts already looked up
+                self._related_concepts.clear()
+            self.by_concept[concept].add(idx)
+
+    def remove(self, term: str, node: CollectionNode, idx: int):
+        self.by_term.get(term, set()).discard(idx)
+        concept = self.concept_of(node)
+        if concept:
+            self.by_concept.get(concept, set()).discard(idx)
+
+    def related_concepts(self, concept) -> list:
+        if concept not in self._related_concepts:
+            self._related_concepts[concept] = [c for c in self.by_concept if self.related(concept, c)]
+        return self._related_concepts[concept]
+
+    def candidates(self, term: str, node: CollectionNode) -> set[int]:
+        found = set(self.by_term.get(term, ()))
+        concept = self.concept_of(node)
+        if concept:
+            for c in self.related_concepts(concept):
+                found |= self.by_concept[c]
+        return found
+
+
+class BlockingIndex:
+    """
+    Usage:
+        index = BlockingIndex(neg)
+        for node1 in pos:
+            for j in index.candidates(node1):
+                node2 = neg[j]  # in the same order as product(pos, neg)
+    """
+
+    def __init__(self, neg: list[CollectionNode]):
+        self.entities = _Block(node_entity_concept, entity_concepts_related)
+        self.data = _Block(node_related_data_concept, data_concepts_related)
+        for idx, node in enumerate(neg):
+            self.add(node, idx)
+
+    def add(self, node: CollectionNode, idx: int):
+        self.entities.add(node.entity, node, idx)
+        self.data.add(node.data, node, idx)
+
+    def remove(self, node: CollectionNode, idx: int):
+        """
+        Drop the node added under idx; node must still hold the entity and data it was added with
+        """
+        self.entities.remove(node.entity, node, idx)
+        self.data.remove(node.data, node, idx)
+
+    def candidates(self, node: CollectionNode) -> list[int]:
+        """
+        Sorted indices of the neg nodes whose entity and data may be related to those of node
+        """
+        entities = self.entities.candidates(node.entity, node)
+        if not entities:
+            return []
+        return sorted(entities & self.data.candidates(node.data, node))
@@ -0,0 +1,159 @@
+import time
+from collections import namedtuple
+from typing import Optional
+
+from contradiction.contradiction_util import entity_lower, entity_higher, data_lower, data_higher, \
+    entity_related, data_related, condition_related, condition_lower, condition_higher
+from node import CollectionNode
+
+"""
+Single-pass rule engine.
+A rule is a row of a declarative table: the kind of pair it reports (contradiction or narrowing) and the relation
+node1 (collect) must have to node2 (not collect) on entity, data and condition. RuleEngine compiles a table once
+into a dispatch structure: the condition relation of a related pair selects a category, and the category maps the
+entity and data relations of the pair, encoded as bits, to the tuple of rules that fire. Evaluating a pair computes
+every relation once and looks the rules up, instead of testing every rule predicate in turn.
+"""
+
+CONTRADICTION, NARROWING = 'contradiction', 'narrowing'
+
+# entity / data relations of node1 to node2: equal strings, lower (more specific) or higher (more general) concept
+EQ, LOWER, HIGHER = 'eq', 'lower', 'higher'
+RELATIONS = (EQ, LOWER, HIGHER)
+# condition relations: equal condition strings, higher / lower condition, or any related condition (PolicyLint)
+ANY = 'any'
+
+# category name of the pairs of every condition relation, as in the reports and logs
+CATEGORIES = {EQ: 'no_condition', HIGHER: 'high_condition', LOWER: 'low_condition', ANY: 'any_condition'}
+
+Rule = namedtuple('Rule', ['name', 'kind', 'entity', 'data', 'condition'])
+
+
+def _relation_bits(same: bool, lower: bool, higher: bool) -> int:
+    return same | (lower << 1) | (higher << 2)
+
+
+class RuleStats:
+    """
+    Per-category and per-rule counters of a run, returned by apply_rule:
+        categories: {category: {'pairs': related pairs of the category, 'contradictions': pairs with a contradiction,
+                     'narrowings': pairs with a narrowing, 'seconds': time spent evaluating them}}
+        rule_hits: {rule name: pairs the rule fired on}
+    """
+
+    def __init__(self, rules: list[Rule], categories: list[str]):
+        self.categories = {c: {'pairs': 0, 'contradictions': 0, 'narrowings': 0, 'seconds': 0.0} for c in categories}
+        self.rule_hits = {rule.name: 0 for rule in rules}
+        self.evaluated = 0
+        self.errors = 0
+        self.seconds = 0.0
+
+    def count(self, category: str, key: str) -> int:
+        return self.categories.get(category, {}).get(key, 0)
+
+    def counts(self) -> dict:
+        """
+        All counters without the timings, equal for every evaluation mode of the same input
+        """
+        return {
+            'categories': {c: {k: v for k, v in s.items() if k != 'seconds'} for c, s in self.categories.items()},
+            'rule_hits': dict(self.rule_hits),
+            'errors': self.errors,
+        }
+
+    def __eq__(self, other):
+        if isinstance(other, RuleStats):
+            return self.counts() == other.counts()
+        return NotImplemented
+
+    def report(self) -> str:
+        lines = [f"{c}: cnt: {s['pairs']}, contractions: {s['contradictions']}, narrowings: {s['narrowings']}"
+                 for c, s in self.categories.items()]
+        lines.append(', '.join(f"{name}: {hits}" for name, hits in self.rule_hits.items() if hits))
+        return '\n'.join(lines)
+
+
+class RuleEngine:
+    """
+    Usage:
+        engine = RuleEngine(NO_CONDITION_RULES + HIGHER_CONDITION_RULES + LOWER_CONDITION_RULES)
+        stats = engine.new_stats()
+        for node1, node2 in pairs:
+            engine.evaluate(node1, node2, contradictions, narrowings, stats)
+    """
+
+    def __init__(self, rules: list[Rule]):
+        self.rules = list(rules)
+        names = [rule.name for rule in self.rules]
+        if len(set(names)) != len(names):
+            raise ValueError("Rule names must be unique")
+        conditions = {rule.condition for rule in self.rules}
+        if ANY in conditions and len(conditions) > 1:
+            raise ValueError("Rules on any condition cannot be mixed with rules on a condition relation")
+        # the condition relations are tried in this order, the first that holds decides the category
+        self.conditions = [c for c in (ANY, EQ, HIGHER, LOWER) if c in conditions]
+        self.table: dict[str, list[list[tuple[Rule, ...]]]] = {}
+        for condition in self.conditions:
+            rules_of = [rule for rule in self.rules if rule.condition == condition]
+            self.table[condition] = [[tuple(rule for rule in rules_of
+                                            if e_bits >> RELATIONS.index(rule.entity) & 1
+                                            and d_bits >> RELATIONS.index(rule.data) & 1)
+                                      for d_bits in range(8)] for e_bits in range(8)]
+
+    def new_stats(self) -> RuleStats:
+        return RuleStats(self.rules, [CATEGORIES[c] for c in self.conditions])
+
+    def condition_relation(self, node1: CollectionNode, node2: CollectionNode) -> Optional[str]:
+        for condition in self.conditions:
+            if condition == ANY or \
+                    (condition == EQ and node1.condition == node2.condition) or \
+                    (condition == HIGHER and condition_higher(node1, node2)) or \
+                    (condition == LOWER and condition_lower(node1, node2)):
+                return condition
+        return None
+
+    def match(self, node1: CollectionNode, node2: CollectionNode) -> tuple[Optional[str], tuple[Rule, ...]]:
+        """
+        (condition relation, rules that fire) of (node1, node2); the relation is None if the nodes are not related
+        """
+        if (not entity_related(node1, node2)) or (not data_related(node1, node2)) or (
+                not condition_related(node1, node2)):
+            return None, ()
+        condition = self.condition_relation(node1, node2)
+        if condition is None:
+            return None, ()
+        if node1.verb.lower().strip() != 'collect' or node2.verb.lower().strip() != 'not collect':
+            return condition, ()
+        e_bits = _relation_bits(node1.entity == node2.entity, entity_lower(node1, node2), entity_higher(node1, node2))
+        d_bits = _relation_bits(node1.data == node2.data, data_lower(node1, node2), data_higher(node1, node2))
+        return condition, self.table[condition][e_bits][d_bits]
+
+    def evaluate(self, node1: CollectionNode, node2: CollectionNode,
+                 contradictions: list[tuple[CollectionNode, CollectionNode]],
+                 narrowings: list[tuple[CollectionNode, CollectionNode]],
+                 stats: Optional[RuleStats] = None) -> Optional[str]:
+        """
+        Apply the rules of the category of (node1, node2), once per firing rule, and return the category, or None if
+        the nodes are not related
+        """
+        start = time.perf_counter()
+        if stats is not None:
+            stats.evaluated += 1
+        condition, fired = self.match(node1, node2)
+        if condition is None:
+            return None
+        for rule in fired:
+            (contradictions if rule.kind == CONTRADICTION else narrowings).append((node1, node2))
+
+        category = CATEGORIES[condition]
+        if stats is not None:
+            counters = stats.categories[category]
+            counters['pairs'] += 1
+            if any(rule.kind == CONTRADICTION for rule in fired):
+                counters['contradictions'] += 1
+            if any(rule.kind == NARROWING for rule in fired):
+                counters['narrowings'] += 1
+            for rule in fired:
+                stats.rule_hits[rule.name] += 1
+            counters['seconds'] += time.perf_counter() - start
+        return category
@@ -0,0 +1,223 @@
+import json
+import os
+from collections import defaultdict
+from functools import lru_cache
+from typing import Iterable, Optional
+
+from contradiction.blocking import BlockingIndex
+from contradiction.rule import apply_rule_to_pair
+from node import CollectionNode
+from ontology.condition.handler import ConditionHandler
+from ontology.data.handler import DataHandler
+from ontology.entity.handler import EntityHandler
+from util.code_hash import code_version
+
+"""
+Incremental contradiction detection.
+PairStore keeps the tuples of one policy in two blocking indexes (collect / not collect) together with the number of
+contradiction and narrowing pairs every related (collect, not collect) pair produced. Adding a tuple evaluates the
+rules against the candidates of the opposite index only, removing a tuple drops its pairs, so the cost of an edit is
+proportional to the tuples it touches. The store is saved next to a report as a JSON sidecar and reused as long as
+the ontologies it was computed with and the code of the rules and of the term recognition are unchanged.
+"""
+
+PAIR_STORE_SUFFIX = '.pairs.json'
+PAIR_STORE_VERSION = 1
+# sources the stored pairs depend on besides the ontologies: the rules, the recognition code of the handlers
+# (aliases, fuzzy fallback) and its settings
+PAIR_STORE_CODE = ['config.py', 'node.py', 'contradiction', 'ontology']
+
+
+def pair_store_path(report_path: str) -> str:
+    return os.path.splitext(report_path)[0] + PAIR_STORE_SUFFIX
+
+
+def ontology_fingerprint() -> str:
+    return ':'.join(handler.snapshot().fingerprint() for handler in (EntityHandler, DataHandler, ConditionHandler))
+
+
+@lru_cache(maxsize=None)
+def rule_code_version() -> str:
+    return code_version(PAIR_STORE_CODE)
+
+
+def pair_store_fingerprint() -> str:
+    return f"{ontology_fingerprint()}:{rule_code_version()}"
+
+
+def is_negative(node: CollectionNode) -> bool:
+    return 'not' in node.verb
+
+
+class PairStore:
+    """
+    Usage:
+        store = PairStore()
+        store.add_all((node.pretty_print(), node) for node in pos_nodes + neg_nodes)
+        store.sync(report_nodes)  # add / remove the tuples that differ from the stored ones
+        store.contradiction_pairs()  # sorted "(..) vs (..)" strings, as in the analysis report
+    Tuples are identified by their tuple string; a string may occur several times.
+    """
+
+    def __init__(self, fingerprint: Optional[str] = None):
+        self.fingerprint = fingerprint or pair_store_fingerprint()
+        self.nodes: dict[int, CollectionNode] = {}
+        self.keys: dict[int, str] = {}
+        self.ids_by_key: dict[str, list[int]] = defaultdict(list)
+        self.pos_index = BlockingIndex([])
+        self.neg_index = BlockingIndex([])
+        # (pos id, neg id) -> [contradictions, narrowings], only for pairs that produced some
+        self.results: dict[tuple[int, int], list[int]] = {}
+        self.pairs_of: dict[int, set[tuple[int, int]]] = defaultdict(set)
+        self._next_id = 0
+        self.evaluated = 0
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def _insert(self, key: str, node: CollectionNode) -> int:
+        idx = self._next_id
+        self._next_id += 1
+        self.nodes[idx] = node
+        self.keys[idx] = key
+        self.ids_by_key[key].append(idx)
+        (self.neg_index if is_negative(node) else self.pos_index).add(node, idx)
+        return idx
+
+    def _record(self, pos_id: int, neg_id: int, contradictions: int, narrowings: int):
+        if contradictions or narrowings:
+            self.results[(pos_id, neg_id)] = [contradictions, narrowings]
+            self.pairs_of[pos_id].add((pos_id, neg_id))
+            self.pairs_of[neg_id].add((pos_id, neg_id))
+
+    def _evaluate(self, pos_id: int, neg_id: int):
+        node1, node2 = self.nodes[pos_id], self.nodes[neg_id]
+        contradictions, narrowings = [], []
+        self.evaluated += 1
+        try:
+            apply_rule_to_pair(node1, node2, contradictions, narrowings)
+        except Exception as e:
+            print("Error when applying rules: ", str(node1), str(node2))
+        self._record(pos_id, neg_id, len(contradictions), len(narrowings))
+
+    def add(self, key: str, node: CollectionNode) -> int:
+        """
+        Add a tuple and evaluate it against the related tuples of the opposite verb
+        """
+        idx = self._insert(key, node)
+        if is_negative(node):
+            for pos_id in self.pos_index.candidates(node):
+                self._evaluate(pos_id, idx)
+        else:
+            for neg_id in self.neg_index.candidates(node):
+                self._evaluate(idx, neg_id)
+        return idx
+
+    def add_all(self, nodes: Iterable[tuple[str, CollectionNode]]) -> list[int]:
+        return [self.add(key, node) for key, node in nodes]
+
+    def remove(self, idx: int):
+        node = self.nodes.pop(idx)
+        key = self.keys.pop(idx)
+        self.ids_by_key[key].remove(idx)
+        if not self.ids_by_key[key]:
+            del self.ids_by_key[key]
+        (self.neg_index if is_negative(node) else self.pos_index).remove(node, idx)
+        for pair in self.pairs_of.pop(idx, ()):
+            self.results.pop(pair, None)
+            other = pair[1] if pair[0] == idx else pair[0]
+            self.pairs_of[other].discard(pair)
+
+    def remove_key(self, key: str) -> bool:
+        """
+        Remove one occurrence of the tuple key, False if there is none
+        """
+        ids = self.ids_by_key.get(key)
+        if not ids:
+            return False
+        self.remove(ids[-1])
+        return True
+
+    def sync(self, nodes: Iterable[tuple[str, CollectionNode]]) -> tuple[int, int]:
+        """
+        Make the stored tuples equal (as a multiset of tuple strings) to nodes; returns (added, removed)
+        """
+        wanted: dict[str, list[CollectionNode]] = defaultdict(list)
+        for key, node in nodes:
+            wanted[key].append(node)
+        removed = 0
+        for key in list(self.ids_by_key):
+            surplus = len(self.ids_by_key[key]) - len(wanted.get(key, ()))
+            for _ in range(surplus):
+                self.remove_key(key)
+                removed += 1
+        added = 0
+        for key, candidates in wanted.items():
+            for node in candidates[len(self.ids_by_key.get(key, ())):]:
+                self.add(key, node)
+                added += 1
+        return added, removed
+
+    def _pairs(self, column: int) -> list[str]:
+        pairs = []
+        for (pos_id, neg_id), counts in self.results.items():
+            pairs.extend([f"{self.keys[pos_id]} vs {self.keys[neg_id]}"] * counts[column])
+        return sorted(pairs)
+
+    def contradiction_pairs(self) -> list[str]:
+        return self._pairs(0)
+
+    def narrowing_pairs(self) -> list[str]:
+        return self._pairs(1)
+
+    @classmethod
+    def from_results(cls, pos: list[CollectionNode], neg: list[CollectionNode],
+                     contradictions: list[tuple[CollectionNode, CollectionNode]],
+                     narrowings: list[tuple[CollectionNode, CollectionNode]]) -> 'PairStore':
+        """
+        Store of the nodes and pairs of an apply_rule run, without evaluating the rules again
+        """
+        store = cls()
+        ids = {id(node): store._insert(node.pretty_print(), node) for node in pos + neg}
+        counts: dict[tuple[int, int], list[int]] = defaultdict(lambda: [0, 0])
+        for column, pairs in ((0, contradictions), (1, narrowings)):
+            for node1, node2 in pairs:
+                counts[(ids[id(node1)], ids[id(node2)])][column] += 1
+        for (pos_id, neg_id), (c, n) in counts.items():
+            store._record(pos_id, neg_id, c, n)
+        return store
+
+    def save(self, path: str):
+        ids = sorted(self.nodes)
+        position = {idx: i for i, idx in enumerate(ids)}
+        data = {
+            'version': PAIR_STORE_VERSION,
+            'fingerprint': self.fingerprint,
+            'nodes': [[self.keys[idx], self.nodes[idx].entity, self.nodes[idx].verb, self.nodes[idx].data,
+                       str(self.nodes[idx].condition)] for idx in ids],
+            'pairs': sorted([position[p], position[n], c, r] for (p, n), (c, r) in self.results.items()),
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: str) -> Optional['PairStore']:
+        """
+        The store saved at path, or None if there is none or it was computed with other ontologies or rule code
+        """
+        if not os.path.isfile(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Cannot read pair store {path}: {e}")
+            return None
+        if data.get('version') != PAIR_STORE_VERSION or data.get('fingerprint') != pair_store_fingerprint():
+            return None
+        store = cls(data['fingerprint'])
+        ids = [store._insert(key, CollectionNode(entity, verb, d, condition))
+               for key, entity, verb, d, condition in data['nodes']]
+        for p, n, c, r in data['pairs']:
+            store._record(ids[p], ids[n], c, r)
+        return store
@@ -1,8 +1,7 @@
 from itertools import product
-from typing import List, Tuple
 
-from contradiction.contradiction_util import entity_lower, entity_higher, data_lower, data_higher
-from contradiction.contradiction_util import entity_related, data_related, condition_related
+from contradiction.engine import RuleEngine, RuleStats, ANY
+from contradiction.no_condition import NO_CONDITION_RULES
 from node import CollectionNode
 
 # In this file, we define 9 rules for node1.condition == node2.condition, which means we ignore 'condition' attribute
@@ -21,124 +20,25 @@ Bibtex:
 }
 """
 
-# c1cnt, c2cnt, c3cnt, c4cnt, c5cnt = 0, 0, 0, 0, 0
-# n1cnt, n2cnt, n3cnt, n4cnt = 0, 0, 0, 0
-
-
-# c1: base contradiction
-# (companyX, collect, email) vs (companyX, not collect, email)
-def lc1(node1: CollectionNode, node2: CollectionNode, contradictions: List[Tuple[CollectionNode, CollectionNode]]):
-    if node1.entity == node2.entity and node1.data == node2.data:
-        contradictions.append((node1, node2))
-
-# (companyX, collect, email) vs (companyX, not collect, personal info)
-def lc2(node1: CollectionNode, node2: CollectionNode, contradictions: List[Tuple[CollectionNode, CollectionNode]]):
-    if node1.entity == node2.entity and data_lower(node1.data, node2.data):
-        contradictions.append((node1, node2))
-
-# (companyX, collect, email) vs (advertiser, not collect, email)
-def lc3(node1: CollectionNode, node2: CollectionNode, contradictions: List[Tuple[CollectionNode, CollectionNode]]):
-    if entity_lower(node1.entity, node2.entity) and node1.data == node2.data:
-        contradictions.append((node1, node2))
-
-
-# (companyX, collect, email) vs (advertiser, not collect, personal info)
-def lc4(node1: CollectionNode, node2: CollectionNode, contradictions: List[Tuple[CollectionNode, CollectionNode]]):
-    if entity_lower(node1.entity, node2.entity) and data_lower(node1.data, node2.data):
-        contradictions.append((node1, node2))
-
-
-# c5
-# (advertiser, collect, email) vs (companyX, not collect, personal info)
-def lc5(node1: CollectionNode, node2: CollectionNode, contradictions: List[Tuple[CollectionNode, CollectionNode]]):
-    if entity_higher(node1.entity, node2.entity) and data_lower(node1.data, node2.data):
-        contradictions.append((node1, node2))
-
-
-# there is a principle in narrowing that the negation should always use a lower/equal data item
-# n1: base narrowing
-# (companyX, collect, personal info) vs (companyX, not collect, email)
-def ln1(node1: CollectionNode, node2: CollectionNode, narrowed: List[Tuple[CollectionNode, CollectionNode]]):
-    if node1.entity == node2.entity and data_higher(node1.data, node2.data):
-        narrowed.append((node1, node2))
-
-
-# n2
-# (companyX, collect, personal info) vs (advertiser, not collect, email)
-def ln2(node1: CollectionNode, node2: CollectionNode, narrowed: List[Tuple[CollectionNode, CollectionNode]]):
-    if entity_lower(node1.entity, node2.entity) and data_higher(node1.data, node2.data):
-        narrowed.append((node1, node2))
-
-
-# n3
-# (advertiser, collect, email) vs (companyX, not collect, email)
-def ln3(node1: CollectionNode, node2: CollectionNode, narrowed: List[Tuple[CollectionNode, CollectionNode]]):
-    if entity_higher(node1.entity, node2.entity) and node1.data == node2.data:
-        narrowed.append((node1, node2))
-
-
-# n4:
-# (advertiser, collect, personal info) vs (companyX, not collect, email)
-def ln4(node1: CollectionNode, node2: CollectionNode, narrowed: List[Tuple[CollectionNode, CollectionNode]]):
-    if entity_higher(node1.entity, node2.entity) and data_higher(node1.data, node2.data):
-        narrowed.append((node1, node2))
-
-c_rules=[lc1,lc2,lc3,lc4,lc5]
-n_rules=[ln1,ln2,ln3,ln4]
-def no_condition_rule_cmp(node1: CollectionNode, node2: CollectionNode,
-                      contradictions: List[Tuple[CollectionNode, CollectionNode]],
-                      narrowed: List[Tuple[CollectionNode, CollectionNode]],
-                    cr_cnts:list[int],nr_cnts:list[int]
-                          ):
-    v1, v2 = node1.verb.lower().strip(), node2.verb.lower().strip()
-    if v1 == 'collect' and v2 == 'not collect':
-        for i in range(5):
-            old_len=len(contradictions)
-            c_rules[i](node1, node2, contradictions)
-            if len(contradictions)>old_len:
-                cr_cnts[i]+=1
-
-        for i in range(4):
-            old_len=len(narrowed)
-            n_rules[i](node1, node2, narrowed)
-            if len(narrowed)>old_len:
-                nr_cnts[i]+=1
-
-
+# the no_condition rules (c1-c5, n1-n4) applied to every related pair whatever its conditions
+POLICYLINT_RULES = [rule._replace(name=rule.name.replace('no_condition', 'policylint'), condition=ANY)
+                    for rule in NO_CONDITION_RULES]
+POLICYLINT_ENGINE = RuleEngine(POLICYLINT_RULES)
 
 
 def apply_rule_cmp(pos: list[CollectionNode],
-               neg: list[CollectionNode],
-               contradictions: list[tuple[CollectionNode, CollectionNode]],
-               narrowings: list[tuple[CollectionNode, CollectionNode]]):
-
-    no_condition_cnt = 0
-    no_condition_contractions_cnt, no_condition_narrowings_cnt = 0, 0
-    cr_cnts=[0,0,0,0,0]
-    nr_cnts=[0,0,0,0]
-
+                   neg: list[CollectionNode],
+                   contradictions: list[tuple[CollectionNode, CollectionNode]],
+                   narrowings: list[tuple[CollectionNode, CollectionNode]]) -> RuleStats:
+    """
+    PolicyLint baseline of apply_rule; stats.rule_hits holds the pairs every rule (policylint.c1 ..) fired on
+    """
+    stats = POLICYLINT_ENGINE.new_stats()
     # make a combination of all the nodes: node1 from pos, node2 from neg
     for node1, node2 in product(pos, neg):
         try:
-            contradictions_cnt,narrowings_cnt = len(contradictions),len(narrowings)
-
-            if (not entity_related(node1, node2)) or (not data_related(node1, node2)) or (
-                    not condition_related(node1.condition, node2.condition)):
-                continue
-            no_condition_rule_cmp(node1, node2, contradictions, narrowings,cr_cnts,nr_cnts)
-            no_condition_cnt += 1
-            if len(contradictions) > contradictions_cnt:
-                no_condition_contractions_cnt += 1
-            if len(narrowings) > narrowings_cnt:
-                no_condition_narrowings_cnt += 1
-
+            POLICYLINT_ENGINE.evaluate(node1, node2, contradictions, narrowings, stats)
         except Exception as e:
+            stats.errors += 1
             print("Error when applying rules: ", str(node1), str(node2))
-
-    print(f"no_condition: cnt: {no_condition_cnt}, contractions: {no_condition_contractions_cnt}, narrowings: {no_condition_narrowings_cnt}")
-    for i in range(5):
-        print(f"c{i+1}: {cr_cnts[i]}")
-    for i in range(4):
-        print(f"n{i+1}: {nr_cnts[i]}")
-
-    return cr_cnts
\ No newline at end of file
+    return stats
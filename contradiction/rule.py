@@ -1,74 +1,122 @@
+import time
+from collections import defaultdict, namedtuple
 from itertools import product
-from contradiction.higher_condition import higher_condition_rule
-from contradiction.lower_condition import lower_condition_rule
-from contradiction.no_condition import no_condition_rule
-from contradiction.contradiction_util import condition_higher, condition_lower, \
-    entity_related, data_related, condition_related
+from typing import Iterator, Optional
+from contradiction.blocking import BlockingIndex
+from contradiction.engine import RuleEngine, RuleStats, CONTRADICTION, NARROWING
+from contradiction.higher_condition import HIGHER_CONDITION_RULES
+from contradiction.lower_condition import LOWER_CONDITION_RULES
+from contradiction.no_condition import NO_CONDITION_RULES
+from contradiction.vectorized import apply_rule_vectorized
 from node import CollectionNode
 
+# the contradiction and narrowing rules, compiled once
+RULES = NO_CONDITION_RULES + HIGHER_CONDITION_RULES + LOWER_CONDITION_RULES
+RULE_ENGINE = RuleEngine(RULES)
+
+# a rule firing on (node1, node2), yielded by iter_pairs
+Finding = namedtuple('Finding', ['rule', 'node1', 'node2'])
+
+
+def apply_rule_to_pair(node1: CollectionNode,
+                       node2: CollectionNode,
+                       contradictions: list[tuple[CollectionNode, CollectionNode]],
+                       narrowings: list[tuple[CollectionNode, CollectionNode]],
+                       stats: Optional[RuleStats] = None) -> Optional[str]:
+    """
+    Apply the rules of the condition category of (node1, node2) and return the category, or None if the nodes are
+    not related
+    """
+    return RULE_ENGINE.evaluate(node1, node2, contradictions, narrowings, stats)
+
 
 def apply_rule(pos: list[CollectionNode],
                neg: list[CollectionNode],
                contradictions: list[tuple[CollectionNode, CollectionNode]],
-               narrowings: list[tuple[CollectionNode, CollectionNode]]):
-    global no_condition_cnt, high_condition_cnt, low_condition_cnt
-
-    # reset counter
-    no_condition_cnt = 0
-    no_condition_contractions_cnt, no_condition_narrowing_cnt = 0, 0
-    high_condition_cnt = 0
-    high_condition_contractions_cnt, high_condition_narrowing_cnt = 0, 0
-    low_condition_cnt = 0
-    low_condition_contractions_cnt, low_condition_narrowing_cnt = 0, 0
+               narrowings: list[tuple[CollectionNode, CollectionNode]],
+               blocking: bool = True,
+               vectorized: bool = False) -> RuleStats:
+    """
+    Apply the contradiction and narrowing rules to every related pair (node1 from pos, node2 from neg).
+    With blocking, only the candidate pairs of a BlockingIndex over neg are evaluated; the pairs it skips
+    are never related, so the output is the same as evaluating the full product.
+    With vectorized, all predicates are evaluated at once over integer-encoded nodes, see contradiction/vectorized.py.
+    Returns the per-category and per-rule counters of the run.
+    """
+    if vectorized:
+        return apply_rule_vectorized(pos, neg, contradictions, narrowings)
 
+    start = time.perf_counter()
+    stats = RULE_ENGINE.new_stats()
     # make a combination of all the nodes: node1 from pos, node2 from neg
-    for node1, node2 in product(pos, neg):
+    if blocking:
+        index = BlockingIndex(neg)
+        pairs = ((node1, neg[j]) for node1 in pos for j in index.candidates(node1))
+    else:
+        pairs = product(pos, neg)
+    for node1, node2 in pairs:
         try:
-            contradictions_cnt, narrowings_cnt = len(contradictions), len(narrowings)
-
-            if (not entity_related(node1, node2)) or (not data_related(node1, node2)) or (
-                    not condition_related(node1.condition, node2.condition)):
-                continue
-            elif node1.condition == node2.condition:
-                no_condition_rule(node1, node2, contradictions, narrowings)
-                no_condition_cnt += 1
-                if len(contradictions) > contradictions_cnt:
-                    no_condition_contractions_cnt += 1
-                if len(narrowings) > narrowings_cnt:
-                    no_condition_narrowing_cnt += 1
+            RULE_ENGINE.evaluate(node1, node2, contradictions, narrowings, stats)
+        except Exception as e:
+            stats.errors += 1
+            print("Error when applying rules: ", str(node1), str(node2))
+    stats.seconds = time.perf_counter() - start
+    return stats
 
-            elif condition_higher(node1.condition, node2.condition):
-                higher_condition_rule(node1, node2, contradictions, narrowings)
-                high_condition_cnt += 1
-                if len(contradictions) > contradictions_cnt:
-                    high_condition_contractions_cnt += 1
-                if len(narrowings) > narrowings_cnt:
-                    high_condition_narrowing_cnt += 1
 
-            elif condition_lower(node1.condition, node2.condition):
-                lower_condition_rule(node1, node2, contradictions, narrowings)
-                low_condition_contractions_cnt += 1
-                if len(contradictions) > contradictions_cnt:
-                    low_condition_cnt += 1
-                if len(narrowings) > narrowings_cnt:
-                    low_condition_narrowing_cnt += 1
+def _pairs_by_priority(pos: list[CollectionNode],
+                       neg: list[CollectionNode]) -> Iterator[tuple[CollectionNode, CollectionNode]]:
+    """
+    The candidate pairs of apply_rule, each once: first those with equal entity and data strings, then those with an
+    equal entity or data, then the pairs whose terms are only related through the ontologies.
+    The blocking index of the last group is only built if the consumer gets that far.
+    """
+    by_both, by_entity, by_data = defaultdict(list), defaultdict(list), defaultdict(list)
+    for j, node2 in enumerate(neg):
+        by_both[(node2.entity, node2.data)].append(j)
+        by_entity[node2.entity].append(j)
+        by_data[node2.data].append(j)
+    for node1 in pos:
+        for j in by_both.get((node1.entity, node1.data), ()):
+            yield node1, neg[j]
+    for node1 in pos:
+        # exactly one of entity and data is equal
+        for j in sorted(set(by_entity.get(node1.entity, ())) ^ set(by_data.get(node1.data, ()))):
+            yield node1, neg[j]
+    index = BlockingIndex(neg)
+    for node1 in pos:
+        for j in index.candidates(node1):
+            if neg[j].entity != node1.entity and neg[j].data != node1.data:
+                yield node1, neg[j]
 
 
+def iter_pairs(pos: list[CollectionNode],
+               neg: list[CollectionNode],
+               kinds: tuple[str, ...] = (CONTRADICTION, NARROWING),
+               limit: Optional[int] = None) -> Iterator[Finding]:
+    """
+    Lazily yield a Finding for every rule of the given kinds that fires, the pairs with exact entity and data matches
+    first, and stop after limit findings. Exhausted, it yields the pairs of apply_rule in another order.
+    """
+    if limit is not None and limit <= 0:
+        return
+    found = 0
+    for node1, node2 in _pairs_by_priority(pos, neg):
+        try:
+            _, fired = RULE_ENGINE.match(node1, node2)
         except Exception as e:
             print("Error when applying rules: ", str(node1), str(node2))
+            continue
+        for rule in fired:
+            if rule.kind in kinds:
+                yield Finding(rule, node1, node2)
+                found += 1
+                if limit is not None and found >= limit:
+                    return
 
-    # output the results
-    print(
-        f"no_condition: cnt: {no_condition_cnt}, "
-        f"contractions: {no_condition_contractions_cnt}, "
-        f"narrowings: {no_condition_narrowing_cnt}")
-    print(
-        f"high_condition: cnt:{high_condition_cnt}, "
-        f"contractions: {high_condition_contractions_cnt}, "
-        f"narrowings: {high_condition_narrowing_cnt}")
-    print(
-        f"low_condition: cnt:{low_condition_cnt}, "
-        f"contractions: {low_condition_contractions_cnt}, "
-        f"narrowings: {low_condition_narrowing_cnt}")
 
-    return low_condition_contractions_cnt, no_condition_contractions_cnt
+def exists(pos: list[CollectionNode], neg: list[CollectionNode], kind: str = CONTRADICTION) -> bool:
+    """
+    Whether some pair fires a rule of kind, stopping at the first one
+    """
+    return next(iter_pairs(pos, neg, kinds=(kind,), limit=1), None) is not None
@@ -0,0 +1,174 @@
+import time
+from typing import Callable, Hashable
+
+import numpy as np
+
+from contradiction.blocking import NON_PERSONAL_DATA
+from contradiction.engine import RuleStats, CATEGORIES, CONTRADICTION, NARROWING, EQ, LOWER, HIGHER
+from contradiction.higher_condition import HIGHER_CONDITION_RULES
+from contradiction.lower_condition import LOWER_CONDITION_RULES
+from contradiction.no_condition import NO_CONDITION_RULES
+from node import CollectionNode
+from ontology.batch import relation_matrix
+from ontology.data.Data import Data
+from ontology.data.handler import DataHandler
+from ontology.entity.Entity import Entity
+from ontology.entity.handler import EntityHandler
+
+"""
+Vectorized evaluation of the contradiction and narrowing rules.
+pos and neg nodes are encoded as integer arrays (term ids, ontology concept ids, condition ids), every rule predicate
+becomes a boolean len(pos) x len(neg) matrix computed by broadcasting against the ontology relation matrices, and
+the pairs are emitted in the order of product(pos, neg), once per firing rule, exactly as apply_rule does.
+"""
+
+# the rule tables of apply_rule, see engine.py
+RULES = NO_CONDITION_RULES + HIGHER_CONDITION_RULES + LOWER_CONDITION_RULES
+
+
+def _encode(values: list, key: Callable = lambda v: v) -> tuple[np.ndarray, list]:
+    """
+    Integer ids of values (equal values share an id) and the list of distinct values
+    """
+    ids: dict[Hashable, int] = {}
+    distinct = []
+    codes = np.empty(len(values), dtype=np.int64)
+    for i, v in enumerate(values):
+        k = key(v)
+        if k not in ids:
+            ids[k] = len(distinct)
+            distinct.append(v)
+        codes[i] = ids[k]
+    return codes, distinct
+
+
+def _concept_codes(nodes: list, resolve: Callable, concepts: list) -> np.ndarray:
+    """
+    Concept index of the term of every node, -1 for terms that resolve to no concept
+    """
+    column = {c: j for j, c in enumerate(concepts)}
+    codes = np.full(len(nodes), -1, dtype=np.int64)
+    for i, node in enumerate(nodes):
+        try:
+            concept = resolve(node)
+        except Exception:
+            concept = None
+        if concept:
+            codes[i] = column[concept]
+    return codes
+
+
+class _Relations:
+    """
+    eq/lower/higher matrices of one tuple field (entity or data) between pos and neg nodes
+    """
+
+    def __init__(self, pos: list, neg: list, field: str, concepts: list, lower: np.ndarray):
+        # equal terms resolve to the same concept, the first node carrying a term stands for all of them
+        terms, distinct = _encode(pos + neg, key=lambda node: getattr(node, field))
+        concept_of = _concept_codes(distinct, lambda node: getattr(node, f"{field}_concept"), concepts)
+        p, n = terms[:len(pos)], terms[len(pos):]
+        self.eq = p[:, None] == n[None, :]
+        cp, cn = concept_of[p], concept_of[n]
+        known = (cp[:, None] >= 0) & (cn[None, :] >= 0)
+        self.lower = known & lower[cp[:, None], cn[None, :]]
+        self.higher = known & lower[cn[None, :], cp[:, None]]
+        self.terms = [getattr(node, field) for node in distinct]
+        self.pos_ids, self.neg_ids = p, n
+
+    def get(self, relation: str) -> np.ndarray:
+        return getattr(self, relation)
+
+
+def _condition_matrices(pos: list[CollectionNode], neg: list[CollectionNode]):
+    # the categories compare condition strings, the relations their parsed ConditionSet
+    codes, distinct = _encode(pos + neg, key=lambda node: node.condition)
+    k = len(distinct)
+    related = np.zeros((k, k), dtype=bool)
+    higher = np.zeros((k, k), dtype=bool)
+    lower = np.zeros((k, k), dtype=bool)
+    p, n = np.unique(codes[:len(pos)]), np.unique(codes[len(pos):])
+    for a in p:
+        for b in n:
+            try:
+                cs1, cs2 = distinct[a].condition_set, distinct[b].condition_set
+                related[a, b] = cs1.related(cs2)
+                if related[a, b] and a != b:
+                    higher[a, b] = cs1.higher(cs2)
+                    lower[a, b] = cs1.lower(cs2)
+            except Exception as e:
+                related[a, b] = False
+                print("Error when evaluating conditions: ", distinct[a].condition, distinct[b].condition, str(e))
+    cp, cn = codes[:len(pos), None], codes[None, len(pos):]
+    return cp == cn, related[cp, cn], higher[cp, cn], lower[cp, cn]
+
+
+def _emit(pos, neg, count: np.ndarray, out: list):
+    rows, cols = np.nonzero(count)
+    repeats = count[rows, cols]
+    rows, cols = np.repeat(rows, repeats).tolist(), np.repeat(cols, repeats).tolist()
+    out.extend(zip(map(pos.__getitem__, rows), map(neg.__getitem__, cols)))
+
+
+def evaluate_rules(pos: list[CollectionNode], neg: list[CollectionNode]) -> dict:
+    """
+    {'categories': {category: mask}, 'rules': {rule name: mask of the pairs it fires on}}, as len(pos) x len(neg)
+    boolean arrays
+    """
+    entity_lower = EntityHandler.derived('lower_matrix', lambda: relation_matrix(list(Entity), EntityHandler.is_lower))
+    data_lower = DataHandler.derived('lower_matrix', lambda: relation_matrix(list(Data), DataHandler.is_lower))
+    entities = _Relations(pos, neg, 'entity', list(Entity), entity_lower)
+    data = _Relations(pos, neg, 'data', list(Data), data_lower)
+
+    # data_related, unlike data_lower/data_higher, never relates the non-personal data strings
+    personal = np.array([t not in NON_PERSONAL_DATA for t in data.terms], dtype=bool)
+    personal_pair = personal[data.pos_ids][:, None] & personal[data.neg_ids][None, :]
+    entity_related = entities.eq | entities.lower | entities.higher
+    data_related = data.eq | (personal_pair & (data.lower | data.higher))
+
+    cond_eq, cond_related, cond_higher, cond_lower = _condition_matrices(pos, neg)
+    related = entity_related & data_related & cond_related
+    categories = {
+        CATEGORIES[EQ]: related & cond_eq,
+        CATEGORIES[HIGHER]: related & ~cond_eq & cond_higher,
+        CATEGORIES[LOWER]: related & ~cond_eq & ~cond_higher & cond_lower,
+    }
+
+    collect = np.array([n.verb.lower().strip() == 'collect' for n in pos], dtype=bool)
+    not_collect = np.array([n.verb.lower().strip() == 'not collect' for n in neg], dtype=bool)
+    verb_ok = collect[:, None] & not_collect[None, :]
+
+    fired = {rule.name: entities.get(rule.entity) & data.get(rule.data) & categories[CATEGORIES[rule.condition]] &
+             verb_ok for rule in RULES}
+    return {'categories': categories, 'rules': fired}
+
+
+def apply_rule_vectorized(pos: list[CollectionNode],
+                          neg: list[CollectionNode],
+                          contradictions: list[tuple[CollectionNode, CollectionNode]],
+                          narrowings: list[tuple[CollectionNode, CollectionNode]]) -> RuleStats:
+    """
+    Same pairs and counters as apply_rule
+    """
+    start = time.perf_counter()
+    stats = RuleStats(RULES, [CATEGORIES[c] for c in (EQ, HIGHER, LOWER)])
+    if not pos or not neg:
+        return stats
+    r = evaluate_rules(pos, neg)
+
+    # a pair belongs to exactly one category, so the pairs of every list stay in product order
+    count = {kind: np.zeros((len(pos), len(neg)), dtype=np.int64) for kind in (CONTRADICTION, NARROWING)}
+    for rule in RULES:
+        count[rule.kind] += r['rules'][rule.name]
+        stats.rule_hits[rule.name] = int(r['rules'][rule.name].sum())
+    _emit(pos, neg, count[CONTRADICTION], contradictions)
+    _emit(pos, neg, count[NARROWING], narrowings)
+
+    stats.evaluated = len(pos) * len(neg)
+    for category, mask in r['categories'].items():
+        counters = stats.categories[category]
+        counters['pairs'] = int(mask.sum())
+        counters['contradictions'] = int((mask & (count[CONTRADICTION] > 0)).sum())
+        counters['narrowings'] = int((mask & (count[NARROWING] > 0)).sum())
+    stats.seconds = time.perf_counter() - start
+    return stats
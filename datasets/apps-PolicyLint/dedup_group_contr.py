@@ -1,11 +1,26 @@
+import os
+import sys
+from typing import Optional
+
 import pandas as pd
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from evals.corpus import load_table
+
+# with a corpus directory (evals/corpus.py), the sentence pairs are read from its contradictions table instead of the
+# result CSVs
 
-def dedup_contradiction_in_poligraph(output_file_csv):
-    path = r'<PATH>\policylint-reclassify.csv'
 
+def poligraph_pairs(path: str = r'<PATH>\policylint-reclassify.csv', corpus_dir: Optional[str] = None) -> pd.DataFrame:
+    if corpus_dir:
+        df = load_table(corpus_dir, 'contradictions', 'poligraph', ['app', 'sentence1', 'sentence2'])
+        return df.set_axis(['app_id', 'pos_text', 'neg_text'], axis=1)
     df = pd.read_csv(path, encoding='utf-8')
-    df = df[['app_id', 'pos_text', 'neg_text']]
+    return df[['app_id', 'pos_text', 'neg_text']]
+
+
+def dedup_contradiction_in_poligraph(output_file_csv, corpus_dir: Optional[str] = None):
+    df = poligraph_pairs(corpus_dir=corpus_dir)
     df = df.drop_duplicates(keep='first', ignore_index=True)
     df['id'] = df.index + 1
     # before dumpint to csv, we need to make sure that the column id is the first column
@@ -13,39 +28,36 @@ def dedup_contradiction_in_poligraph(output_file_csv):
     df.to_csv(output_file_csv, encoding='utf-8', index=False)
 
 
-def dedup_contradiction_in_policyLint(output_file_csv):
-    path = r'<PATH>\policylint_results.csv'
-
+def policylint_pairs(path: str = r'<PATH>\policylint_results.csv', corpus_dir: Optional[str] = None) -> pd.DataFrame:
+    if corpus_dir:
+        df = load_table(corpus_dir, 'contradictions', 'policylint', ['app', 'sentence1', 'sentence2'])
+        return df.set_axis(['packageName', 'policySentences', 'contradictionSentences'], axis=1)
     df = pd.read_csv(path, encoding='utf-8')
     # packageName	policyEntity	policyAction	policyData	policySentences	contradictionNum	contradictoryEntity	contradictoryAction	contradictoryData	contradictionSentences
-    df = df[['packageName', 'policySentences', 'contradictionSentences']]
+    return df[['packageName', 'policySentences', 'contradictionSentences']]
+
+
+def dedup_policylint_frame(df: pd.DataFrame) -> pd.DataFrame:
     # exchange policySentences and contradictionSentences
     # make sure in dictionary order, str(policySentences) < str(contradictionSentences)
-    df['policySentences'] = df['policySentences'].astype(str)
-    df['contradictionSentences'] = df['contradictionSentences'].astype(str)
-    minMap, maxMap = {}, {}
-    for index, row in df.iterrows():
-        row = row.to_dict()
-        minMap[index] = min(row['policySentences'], row['contradictionSentences'])
-        maxMap[index] = max(row['policySentences'], row['contradictionSentences'])
-
-        if row['policySentences'] != minMap[index]:
-            print(f"row {index} exchange policySentences and contradictionSentences")
-            print(f"original policySentences: {row['policySentences']}")
-            print(f"new policySentences: {minMap[index]}")
-            df.at[index, 'policySentences'] = minMap[index]
-            df.at[index, 'contradictionSentences'] = maxMap[index]
-            print(df.at[index, 'policySentences'])
-            print("------------------------------")
+    df = df.astype({'policySentences': str, 'contradictionSentences': str})
+    exchange = df['policySentences'] > df['contradictionSentences']
+    print(f"{exchange.sum()} rows exchange policySentences and contradictionSentences")
+    df.loc[exchange, ['policySentences', 'contradictionSentences']] = \
+        df.loc[exchange, ['contradictionSentences', 'policySentences']].to_numpy()
     df = df.drop_duplicates(keep='first', ignore_index=True,
                             subset=['packageName', 'policySentences', 'contradictionSentences'])
     df['id'] = df.index + 1
     # before dumpint to csv, we need to make sure that the column id is the first column
-    df = df[['id', 'packageName', 'policySentences', 'contradictionSentences']]
+    return df[['id', 'packageName', 'policySentences', 'contradictionSentences']]
+
+
+def dedup_contradiction_in_policyLint(output_file_csv, corpus_dir: Optional[str] = None):
+    df = dedup_policylint_frame(policylint_pairs(corpus_dir=corpus_dir))
     df.to_csv(output_file_csv, encoding='utf-8', index=False)
 
 
 if __name__ == '__main__':
     # dedup_contradiction_in_poligraph()
     # dedup_contradiction_in_policyLint()
-    pass
\ No newline at end of file
+    pass
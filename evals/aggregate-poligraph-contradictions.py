@@ -1,15 +1,30 @@
 from collections import defaultdict
 import os
-import yaml
+import sys
 import csv
+import numpy as np
 import pandas as pd
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from evals.corpus import load_table, poligraph_edges, DEFAULT_CORPUS
+
+"""
+Contradictions of the PoliGraph graphs.
+The graph edges are read from the corpus (evals/corpus.py) when it has them, and from the graph YAMLs otherwise. The
+contradiction rules run on the (positive, negative) edge pairs of all apps at once as column masks over one joined
+frame; the edges keep their order in the graph, which the rules depend on (see find_contradictions). The graphs keep
+the order os.walk found them in, which the contradiction ids follow, and the contexts are the edge texts as the graphs
+hold them, so the CSV files are those the row-by-row version of this script wrote.
+"""
+
 # Config 1
 # USE_POLIGRAPH_CONTRADICTION_RULE = True
 # Config 2: use simpler contradiction rule
 USE_POLIGRAPH_CONTRADICTION_RULE = False
 
 dir_path = r'..\datasets\apps-PoliGraph\yamls'
+# graph edges exported by evals/corpus.py --poligraph-graphs, read instead of the graphs when they are there
+corpus_dir = DEFAULT_CORPUS
 output_file = os.path.join(dir_path, 'contradictions.csv')
 output_file2 = os.path.join(dir_path, 'contradiction_context.csv')
 output_file3 = os.path.join(dir_path, 'contradiction_context_updated.csv')
@@ -44,6 +59,23 @@ word_map = {
 positive = ['COLLECT', 'BE_SHARED', 'BE_SOLD', 'STORE', 'USE']
 negative = ['NOT_COLLECT', 'NOT_BE_SHARED', 'NOT_BE_SOLD', 'NOT_STORE', 'NOT_USE']
 
+ANONYMIZED = ['aggregate / deidentified / pseudonymized information', 'non-personal information',
+              'aggregate information',
+              'anonymized information', 'non-identifiable information', 'non-identifiable data',
+              'pseudonymized data',
+              'pseudonymized information', 'anonymized data', 'deidentified information', 'non-personal data',
+              'aggregate statistical information'
+    , 'deidentifie information', 'demographic detail', 'demographic', 'demographic information', 'demographic data',
+              'aggregate', 'non-identifiable', 'non-identifiable', 'non-identifiable information', 'anonymized',
+              'data aggregate', 'cpu information'
+                                'anonymous'
+              ]
+CONTRADICTION_COLUMNS = ['id', 'filename', 'entity1', 'verb1', 'data1', 'entity2', 'verb2', 'data2', 'context1',
+                         'context2']
+IGNORED_DATA = ['time', 'date', 'option', 'setting', 'choice', 'control', 'pixel'
+    , 'encryption', 'encrypt', 'language'
+                ]
+
 
 def delete():
     cnt = 0
@@ -57,190 +89,183 @@ def delete():
     print(f"Deleted {cnt} files")
 
 
+def load_edges() -> pd.DataFrame:
+    """
+    Graph edges of every app, in os.walk and graph order: app, position, entity (source), action (key), data
+    (target), sentence, text
+    """
+    if os.path.isdir(os.path.join(corpus_dir, 'statements', 'tool=poligraph')):
+        # the corpus keeps the edges in the order they were exported in
+        return load_table(corpus_dir, 'statements', 'poligraph')
+    return poligraph_edges(dir_path)
+
+
 def check_verbs():
-    seen_verbs = defaultdict(int)
-    for root, dirs, files in os.walk(dir_path):
-        for file in files:
-            if file in yamls:
-                full_yaml_path = os.path.join(root, file)
-                with open(full_yaml_path, 'r', encoding='utf-8') as f:
-                    data = yaml.safe_load(f)
-                    nodes = data['links']
-                    for node in nodes:
-                        key = node['key']
-                        if key not in seen_verbs:
-                            seen_verbs[key] = 1
-                            print("Found first verb:", key)
-                        else:
-                            seen_verbs[key] += 1
+    seen_verbs = load_edges()['action'].value_counts(sort=False)
     print(f"Found {len(seen_verbs)} verbs")
     print("Verbs and their counts:")
     for verb, count in seen_verbs.items():
         print(f"{verb}: {count}")
 
 
+def subordinates_of(subsumes) -> defaultdict:
+    """
+    {father: [subordinates]} of the (source, target) SUBSUM edges of a graph
+    """
+    subordinates = defaultdict(list)
+    for source, target in subsumes:
+        subordinates[source].append(target)
+
+    while True:
+        old_subordinates = subordinates.copy()
+        for father in subordinates:
+            for child in subordinates[father]:
+                if child in subordinates:
+                    subordinates[father].extend(subordinates[child])
+
+        if old_subordinates == subordinates:
+            break
+    return subordinates
+
+
+def _keys(*codes: np.ndarray, sizes: tuple) -> np.ndarray:
+    """
+    One int64 key per row of the code columns, sizes being the number of values of every column
+    """
+    key = np.zeros(len(codes[0]), dtype=np.int64)
+    for code, size in zip(codes, sizes):
+        key = key * size + code
+    return key
+
+
+def find_contradictions(edges: pd.DataFrame) -> pd.DataFrame:
+    """
+    Contradictions of the (positive, negative) edge pairs of every app, in (positive edge, negative edge) order.
+    Names (entities, data and actions) are factorized once, so the string tests run once per distinct name and the
+    pairs are arrays of codes.
+    The SUBSUM edges of an app give its subordinates. The rules also test which names are fathers of a subordinate;
+    every pair that gets to the subsumption test with two different data makes its first data such a father, for the
+    pairs after it, so a name counts as a father from the first such pair on.
+    """
+    apps, app_names = pd.factorize(edges['app'])
+    codes, names = pd.factorize(pd.concat([edges['entity'], edges['data'], edges['action']], ignore_index=True))
+    entity, data, action = np.split(codes, 3)
+    A, V = len(app_names), len(names)
+    names = pd.Series(names, dtype=object)
+
+    # (app, father, child) of the subordinates and (app, father) of the fathers of every app
+    subsume = np.flatnonzero(edges['action'].to_numpy() == 'SUBSUM')
+    subordinates, fathers = [], []
+    for app, rows in pd.Series(subsume).groupby(apps[subsume], sort=False):
+        tree = subordinates_of(zip(entity[rows], data[rows]))
+        fathers.extend(app * V + f for f in tree)
+        subordinates.extend((app * V + f) * V + c for f, children in tree.items() for c in children)
+    subordinates = np.unique(np.array(subordinates, dtype=np.int64))
+    fathers = np.unique(np.array(fathers, dtype=np.int64))
+
+    # every (positive, negative) pair of every app, in order
+    pos = np.flatnonzero(edges['action'].isin(positive).to_numpy())
+    neg = np.flatnonzero(edges['action'].isin(negative).to_numpy())
+    neg_of = pd.Series(neg).groupby(apps[neg], sort=False)
+    left, right, order = [], [], []
+    for app, rows in pd.Series(pos).groupby(apps[pos], sort=False):
+        if app not in neg_of.groups:
+            continue
+        negs = neg_of.get_group(app).to_numpy()
+        left.append(np.repeat(rows.to_numpy(), len(negs)))
+        right.append(np.tile(negs, len(rows)))
+        order.append(np.arange(len(rows) * len(negs)))
+    if not left:
+        return pd.DataFrame(columns=CONTRADICTION_COLUMNS)
+    left, right, order = np.concatenate(left), np.concatenate(right), np.concatenate(order)
+    app = apps[left]
+    e1, e2, d1, d2 = entity[left], entity[right], data[left], data[right]
+
+    def flag(test) -> np.ndarray:
+        return names.map(test).to_numpy(dtype=bool)
+
+    unspecified = flag(lambda n: n == 'UNSPECIFIED_DATA')
+    children = flag(lambda n: n == 'personal identifier @children' or '@children' in n)
+    personal = flag(lambda n: 'personal' in n)
+    anonymized = flag(lambda n: n in ANONYMIZED)
+    any_anonymized = flag(lambda n: any(a in n for a in ANONYMIZED))
+    all_anonymized = flag(lambda n: all(a in n for a in ANONYMIZED))
+    location, cookie = flag(lambda n: 'location' in n), flag(lambda n: 'cookie' in n)
+    ignored = flag(lambda n: n in IGNORED_DATA)
+
+    skip = unspecified[d1] | unspecified[d2] | children[d2] | (personal[d1] & ~personal[d2])
+    # pairs that reach the subsumption test make their first data a father
+    reach = ~skip & (d1 != d2)
+    first_father = pd.Series(order[reach]).groupby(_keys(app[reach], d1[reach], sizes=(A, V))).min()
+
+    def is_father(values: np.ndarray) -> np.ndarray:
+        keys = _keys(app, values, sizes=(A, V))
+        since = first_father.reindex(keys).to_numpy()
+        return np.isin(keys, fathers) | (since <= order)
+
+    skip |= (d1 != d2) & np.isin(_keys(app, d1, d2, sizes=(A, V, V)), subordinates)
+    skip |= anonymized[d1] != anonymized[d2]
+    skip |= any_anonymized[d1] & ~all_anonymized[d2]
+    skip |= any_anonymized[d2] & ~all_anonymized[d1]
+    skip |= location[d1] & cookie[d2]
+    skip |= ignored[d1] | ignored[d2]
+    skip |= (d1 != d2) & ~is_father(d1) & ~is_father(d2)
+    we = pd.Index(names).get_loc('we') if 'we' in set(names) else -1
+    we_father = is_father(np.full(len(app), we)) if we >= 0 else np.zeros(len(app), dtype=bool)
+    skip |= (e1 == we) & (e2 != we) & ~we_father
+    skip |= (e2 == we) & (e1 != we) & ~we_father
+    skip |= (e1 != e2) & ~is_father(e1) & ~is_father(e2)
+
+    if USE_POLIGRAPH_CONTRADICTION_RULE:
+        # both names under a common father (or that father itself)
+        family = pd.DataFrame({'father': np.concatenate([subordinates // V, fathers]),
+                               'member': np.concatenate([subordinates % V, fathers % V])})
+        related = family.merge(family, on='father')
+        related = np.unique(related['father'] // V * V * V + related['member_x'] * V + related['member_y'])
+        skip |= (d1 != d2) & ~np.isin(_keys(app, d1, d2, sizes=(A, V, V)), related)
+        skip |= (e1 != e2) & ~np.isin(_keys(app, e1, e2, sizes=(A, V, V)), related)
+
+    negation = pd.Index(names).get_indexer(names.map(word_map))
+    found = np.flatnonzero(~skip & (action[right] == negation[action[left]]))
+    described = pd.DataFrame({'app': app[found], 'e1': e1[found], 'd1': d1[found], 'e2': e2[found],
+                              'd2': d2[found], 'v1': action[left][found]})
+    found = found[~described.duplicated().to_numpy()]
+
+    contradictions = pd.DataFrame({'filename': app_names[app[found]]})
+    for side, rows in (('1', left[found]), ('2', right[found])):
+        contradictions['entity' + side] = edges['entity'].to_numpy()[rows]
+        contradictions['verb' + side] = edges['action'].to_numpy()[rows]
+        contradictions['data' + side] = edges['data'].to_numpy()[rows]
+    contradictions['context1'] = edges['text'].to_numpy()[left[found]]
+    contradictions['context2'] = edges['text'].to_numpy()[right[found]]
+    contradictions.insert(0, 'id', range(1, len(contradictions) + 1))
+    return contradictions[CONTRADICTION_COLUMNS]
 
 
 def output_contradiction():
     header = ['id', 'filename', 'entity1', 'verb1', 'data1', 'entity2', 'verb2', 'data2', ]
     header2 = ['id', 'filename', 'context1', 'context2']
-    cnt = 0
-    ANONYMIZED = ['aggregate / deidentified / pseudonymized information', 'non-personal information',
-                  'aggregate information',
-                  'anonymized information', 'non-identifiable information', 'non-identifiable data',
-                  'pseudonymized data',
-                  'pseudonymized information', 'anonymized data', 'deidentified information', 'non-personal data',
-                  'aggregate statistical information'
-        , 'deidentifie information', 'demographic detail', 'demographic', 'demographic information', 'demographic data',
-                  'aggregate', 'non-identifiable', 'non-identifiable', 'non-identifiable information', 'anonymized',
-                  'data aggregate', 'cpu information'
-                                    'anonymous'
-                  ]
-
-    def find_contradiction(nodes):
-        nonlocal cnt
-        contradictions = []
-        positive_nodes = [node for node in nodes if node['key'] in positive]
-        negative_nodes = [node for node in nodes if node['key'] in negative]
-        subsumes = [node for node in nodes if node['key'] == 'SUBSUM']
-        subordinates = defaultdict(list)
-        for edge in subsumes:
-            source = edge['source']
-            target = edge['target']
-            subordinates[source].append(target)
-
-        while True:
-            old_subordinates = subordinates.copy()
-            for father in subordinates:
-                for child in subordinates[father]:
-                    if child in subordinates:
-                        subordinates[father].extend(subordinates[child])
-
-            if old_subordinates == subordinates:
-                break
-
-        visited = set()
-        for pos in positive_nodes:
-            for neg in negative_nodes:
-                entity1, verb1, data1 = pos['source'], pos['key'], pos['target']
-                entity2, verb2, data2 = neg['source'], neg['key'], neg['target']
-
-                if data1 == 'UNSPECIFIED_DATA' or data2 == 'UNSPECIFIED_DATA':
-                    continue
-                if data2 == 'personal identifier @children' or '@children' in data2:
-                    continue
-                if 'personal' in data1 and 'personal' not in data2:
-                    continue
-                if data1 != data2 and data2 in subordinates[data1]:
-                    continue
-                if any(d in ANONYMIZED for d in [data1, data2]) and any(d not in ANONYMIZED for d in [data1, data2]):
-                    continue
-                if any(anony in data1 for anony in ANONYMIZED) and any(anony not in data2 for anony in ANONYMIZED):
-                    continue
-                if any(anony in data2 for anony in ANONYMIZED) and any(anony not in data1 for anony in ANONYMIZED):
-                    continue
-                if 'location' in data1 and 'cookie' in data2:
-                    continue
-                if any(word in [data1, data2] for word in
-                       ['time', 'date', 'option', 'setting', 'choice', 'control', 'pixel'
-                           , 'encryption', 'encrypt', 'language'
-                        ]):
-                    continue
-
-                if data1 != data2 and data1 not in subordinates and data2 not in subordinates:
-                    continue
-
-                if entity1 == 'we' and entity2 != 'we' and 'we' not in subordinates:
-                    continue
-                if entity2 == 'we' and entity1 != 'we' and 'we' not in subordinates:
-                    continue
-                if entity1 != entity2 and entity1 not in subordinates and entity2 not in subordinates:
-                    continue
-
-                if USE_POLIGRAPH_CONTRADICTION_RULE:
-                    if data1 != data2 and not any(
-                            (data1 in subordinates[d] or data1 == d) and (data2 in subordinates[d] or data2 == d) for d
-                            in subordinates.keys()):
-                        continue
-
-                    if entity1 != entity2 and not any(
-                            (entity1 in subordinates[d] or entity1 == d) and (
-                                    entity2 in subordinates[d] or entity2 == d) for d in
-                            subordinates.keys()):
-                        continue
-
-                description = (entity1, data1, entity2, data2, verb1)
-                if description in visited:
-                    continue
-
-                if word_map[verb1] == verb2 or word_map[verb2] == verb1:
-                    cnt += 1
-                    visited.add(description)
-                    contradictions.append({
-                        'id': cnt,
-                        'entity1': entity1,
-                        'verb1': verb1,
-                        'data1': data1,
-                        'entity2': entity2,
-                        'verb2': verb2,
-                        'data2': data2,
-                        'context1': pos['text'],
-                        'context2': neg['text'],
-
-                    })
-        return contradictions
-
     SEP = ';'
 
-    # with open(output_file, 'w', encoding='utf-8') as out_f:
-    #     out_f.write(SEP.join(header) + '\n')
-
-    csv_writer = csv.writer(open(output_file, 'w', encoding='utf-8', newline=''), delimiter=SEP)
-    csv_writer.writerow(header)
-    csv_writer2 = csv.writer(open(output_file2, 'w', encoding='utf-8', newline=''), delimiter=SEP)
-    csv_writer2.writerow(header2)
-
-    for root, dirs, files in os.walk(dir_path):
-        for file in files:
-            if file in yamls:
-                full_yaml_path = os.path.join(root, file)
-                filename = full_yaml_path.split(os.sep)[-2]
-                with open(full_yaml_path, 'r', encoding='utf-8') as f:
-                    data = yaml.safe_load(f)
-                    nodes = data['links']
-                    contradiction_pairs = find_contradiction(nodes)
-                    if contradiction_pairs and len(contradiction_pairs) > 0:
-                        # with open(output_file, 'a', encoding='utf-8', newline='') as out_f:
-                        #     for pair in contradiction_pairs:
-                        #         out_f.write(
-                        #             f"{pair['id']},{filename},{pair['entity1']},{pair['verb1']},{pair['data1']},"
-                        #             f"{pair['context1']},{pair['entity2']},{pair['verb2']},{pair['data2']},"
-                        #             f"{pair['context2']}\n")
-
-                        for pair in contradiction_pairs:
-                            csv_writer.writerow([
-                                pair['id'],
-                                filename,
-                                pair['entity1'],
-                                pair['verb1'],
-                                pair['data1'],
-                                pair['entity2'],
-                                pair['verb2'],
-                                pair['data2'],
-                            ])
-
-                            csv_writer2.writerow([
-                                pair['id'],
-                                filename,
-                                pair['context1'],
-                                pair['context2'],
-                            ])
-
-                        print(f"Contradictions found in {filename}: {len(contradiction_pairs)}")
-                    else:
-                        print(f"No contradictions found in {filename}")
-
-    print(f"Total contradictions found: {cnt}")
+    edges = load_edges()
+    contradictions = find_contradictions(edges)
+    with open(output_file, 'w', encoding='utf-8', newline='') as f:
+        csv_writer = csv.writer(f, delimiter=SEP)
+        csv_writer.writerow(header)
+        csv_writer.writerows(contradictions[header].itertuples(index=False))
+    with open(output_file2, 'w', encoding='utf-8', newline='') as f:
+        csv_writer2 = csv.writer(f, delimiter=SEP)
+        csv_writer2.writerow(header2)
+        csv_writer2.writerows(contradictions[header2].itertuples(index=False))
+
+    counts = contradictions.groupby('filename').size()
+    for filename in edges['app'].unique():
+        if counts.get(filename, 0) > 0:
+            print(f"Contradictions found in {filename}: {counts[filename]}")
+        else:
+            print(f"No contradictions found in {filename}")
+
+    print(f"Total contradictions found: {len(contradictions)}")
 
 
 def normalize():
@@ -0,0 +1,229 @@
+import argparse
+import ast
+import os
+import re
+import sys
+import time
+from itertools import combinations
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from evals.corpus import TOOLS, CONTRADICTION_COLUMNS, load_table, policond_from_csv, poligraph_from_csv, \
+    policylint_from_csv
+
+"""
+Cross-tool comparison of the contradictions of PoliCond, PoliGraph and PolicyLint.
+Every side of a contradiction is split into sentences, which are normalized once (bytes literals decoded, whitespace
+and case folded) and hashed; a contradiction then has one key per (app, sentence, sentence) pair of its two sides,
+the two sentence hashes in sorted order. Contradictions of two tools match when they share a key, so the tools are
+compared with hash joins on the keys instead of nested loops over sentence strings. Apps are matched on the number
+their names start with, which the tools write differently otherwise.
+A contradiction is true when its label is above 0 and verified when its label is 0 or more (-1 is not verified);
+contradictions that share keys are clustered, and recall is measured against the pooled ground truth, the clusters of
+the true contradictions of any tool.
+"""
+
+_BYTES_LITERAL = re.compile(r"""^b(['"]).*\1$""", re.S)
+_SENTENCE_BREAK = re.compile(r'\|\||\n|(?<=[.!?])\s+')
+_SPACES = re.compile(r'\s+')
+KEY_COLUMNS = ['app', 'key1', 'key2']
+
+
+def decode(text: str) -> str:
+    """
+    The text of a bytes literal (b'...', as PolicyLint and PoliGraph write sentences), other texts as they are
+    """
+    if _BYTES_LITERAL.match(text):
+        try:
+            return ast.literal_eval(text).decode('utf-8', errors='replace')
+        except (ValueError, SyntaxError):
+            return text[2:-1]
+    return text
+
+
+def normalize(sentence: str) -> str:
+    return _SPACES.sub(' ', sentence).strip().casefold()
+
+
+def app_keys(apps: pd.Series) -> pd.Series:
+    """
+    Number an app name starts with ("125_My Family" -> "125"), the normalized name when it has none
+    """
+    number = apps.str.extract(r'^\s*(\d+)_', expand=False)
+    return number.fillna(apps.map(normalize))
+
+
+def sentence_hashes(texts: pd.Series) -> pd.DataFrame:
+    """
+    (row, hash) of the normalized sentences of every text, one row per sentence; every distinct text is split and
+    normalized once
+    """
+    distinct = pd.Series(texts.dropna().unique(), dtype=object)
+    sentences = distinct.map(lambda t: [normalize(s) for s in _SENTENCE_BREAK.split(decode(str(t)))])
+    sentences = sentences.explode()
+    sentences = sentences[sentences.notna() & (sentences != '')]
+    hashes = pd.DataFrame({'text': distinct[sentences.index].to_numpy(),
+                           'hash': pd.util.hash_pandas_object(sentences, index=False).to_numpy()})
+    rows = pd.DataFrame({'row': np.arange(len(texts)), 'text': texts.to_numpy()})
+    return rows.merge(hashes.drop_duplicates(), on='text')[['row', 'hash']]
+
+
+def contradiction_keys(contradictions: pd.DataFrame) -> pd.DataFrame:
+    """
+    (row, app, key1, key2) of every (sentence of side 1, sentence of side 2) pair of every contradiction, key1 <= key2
+    """
+    apps = app_keys(contradictions['app'].astype(str)).to_numpy()
+    side1, side2 = sentence_hashes(contradictions['sentence1']), sentence_hashes(contradictions['sentence2'])
+    keys = side1.merge(side2, on='row', suffixes=('1', '2'))
+    low, high = np.minimum(keys['hash1'], keys['hash2']), np.maximum(keys['hash1'], keys['hash2'])
+    keys = pd.DataFrame({'row': keys['row'], 'app': apps[keys['row']], 'key1': low, 'key2': high})
+    return keys.drop_duplicates(ignore_index=True)
+
+
+def clusters(keys: pd.DataFrame, rows: pd.Index) -> pd.Series:
+    """
+    Cluster of every row: the connected components of the rows that share keys, labeled by their smallest row
+    """
+    key_ids = keys.groupby(KEY_COLUMNS, sort=False).ngroup().to_numpy()
+    label = pd.Series(keys['row'].to_numpy())
+    while True:
+        by_key = label.groupby(key_ids).transform('min')
+        spread = by_key.groupby(keys['row'].to_numpy()).transform('min')
+        if spread.equals(label):
+            break
+        label = spread
+    cluster = pd.Series(rows, index=rows)
+    cluster[keys['row'].to_numpy()] = label.to_numpy()
+    return cluster
+
+
+class Comparison:
+    """
+    Keys of the contradictions of every tool, and the overlap and score tables of the tools.
+    Contradictions that share a key, across tools or within one, are clustered into one contradiction, which is true
+    when its verified contradictions (label 0 or more) include a true one (label above 0).
+    """
+
+    def __init__(self, contradictions: pd.DataFrame):
+        self.contradictions = contradictions.reset_index(drop=True)
+        self.tools = [t for t in TOOLS if t in set(self.contradictions['tool'])]
+        frames = []
+        for tool in self.tools:
+            rows = self.contradictions[self.contradictions['tool'] == tool]
+            keys = contradiction_keys(rows)
+            keys['row'] = rows.index.to_numpy()[keys['row']]
+            frames.append(keys)
+        self.keys = pd.concat(frames, ignore_index=True)
+        self.keys['tool'] = self.contradictions['tool'].to_numpy()[self.keys['row']]
+        self.cluster = clusters(self.keys, self.contradictions.index)
+
+    def _clusters_of(self, tool: str) -> pd.Series:
+        return self.cluster[self.contradictions['tool'] == tool]
+
+    def matched(self, tool: str, other: str) -> pd.Series:
+        """
+        Whether every contradiction of tool shares a key with a contradiction of other
+        """
+        keys = self.keys[self.keys['tool'] == tool]
+        joined = keys.merge(self.keys.loc[self.keys['tool'] == other, KEY_COLUMNS].drop_duplicates(), on=KEY_COLUMNS)
+        rows = self.contradictions.index[self.contradictions['tool'] == tool]
+        return pd.Series(rows.isin(joined['row']), index=rows)
+
+    def overlap(self) -> pd.DataFrame:
+        """
+        For every two tools, their contradictions, how many match the other tool, and their shared clusters
+        """
+        rows = []
+        for a, b in combinations(self.tools, 2):
+            clusters_a, clusters_b = set(self._clusters_of(a)), set(self._clusters_of(b))
+            shared = len(clusters_a & clusters_b)
+            rows.append({'tool1': a, 'tool2': b,
+                         'pairs1': int((self.contradictions['tool'] == a).sum()),
+                         'pairs2': int((self.contradictions['tool'] == b).sum()),
+                         'matched1': int(self.matched(a, b).sum()), 'matched2': int(self.matched(b, a).sum()),
+                         'clusters1': len(clusters_a), 'clusters2': len(clusters_b), 'sharedClusters': shared,
+                         'jaccard': round(shared / len(clusters_a | clusters_b), 4) if clusters_a | clusters_b
+                         else 0.0})
+        return pd.DataFrame(rows)
+
+    def truth(self) -> pd.Series:
+        """
+        Whether every cluster with verified contradictions is true
+        """
+        labels = self.contradictions['label']
+        verified = labels >= 0
+        return (labels[verified] > 0).groupby(self.cluster[verified]).any()
+
+    def scores(self) -> pd.DataFrame:
+        """
+        For every tool, precision over its verified contradictions, and recall against the pooled ground truth: the
+        true clusters of every tool
+        """
+        truth = self.truth()
+        true_clusters = set(truth.index[truth])
+        found_by = {tool: set(self._clusters_of(tool)) & true_clusters for tool in self.tools}
+        rows = []
+        for tool in self.tools:
+            labels = self.contradictions.loc[self.contradictions['tool'] == tool, 'label']
+            verified, true = int((labels >= 0).sum()), int((labels > 0).sum())
+            others = set().union(*(found_by[t] for t in self.tools if t != tool))
+            precision = true / verified if verified else None
+            recall = len(found_by[tool]) / len(true_clusters) if true_clusters else None
+            rows.append({'tool': tool, 'pairs': len(labels), 'clusters': self._clusters_of(tool).nunique(),
+                         'verified': verified, 'true': true,
+                         'precision': round(precision, 4) if precision is not None else None,
+                         'trueClusters': len(true_clusters), 'found': len(found_by[tool]),
+                         'foundOnly': len(found_by[tool] - others),
+                         'recall': round(recall, 4) if recall is not None else None,
+                         'f1': round(2 * precision * recall / (precision + recall), 4)
+                         if precision and recall else None})
+        return pd.DataFrame(rows)
+
+    def by_app(self) -> pd.DataFrame:
+        """
+        Contradictions of every tool per app, and how many of them match each other tool
+        """
+        apps = app_keys(self.contradictions['app'].astype(str))
+        table = pd.crosstab(apps, self.contradictions['tool']).reindex(columns=self.tools, fill_value=0)
+        for a, b in combinations(self.tools, 2):
+            for tool, other in ((a, b), (b, a)):
+                matched = self.matched(tool, other)
+                table[f'{tool}In{other.capitalize()}'] = matched.groupby(apps[matched.index]).sum() \
+                    .reindex(table.index, fill_value=0).astype(int)
+        return table.rename_axis('app').reset_index()
+
+
+def load_contradictions(corpus_dir: Optional[str] = None) -> pd.DataFrame:
+    """
+    Contradictions of the three tools from the corpus (evals/corpus.py), or from their result CSVs without one
+    """
+    if corpus_dir:
+        return load_table(corpus_dir, 'contradictions')
+    return pd.concat([policond_from_csv(), poligraph_from_csv(), policylint_from_csv()], ignore_index=True)
+
+
+def compare(contradictions: pd.DataFrame, by_app: bool = False) -> dict[str, pd.DataFrame]:
+    comparison = Comparison(contradictions[CONTRADICTION_COLUMNS])
+    tables = {'overlap': comparison.overlap(), 'scores': comparison.scores()}
+    if by_app:
+        tables['apps'] = comparison.by_app()
+    return tables
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare the contradictions of PoliCond, PoliGraph and PolicyLint.")
+    parser.add_argument('--corpus', help='Corpus directory written by evals/corpus.py; the result CSVs without it')
+    parser.add_argument('--by-app', action='store_true', help='Also print the per-app table')
+    parser.add_argument('--output', help='Write every table to <output>.<table>.csv')
+    args = parser.parse_args()
+    start = time.time()
+    tables = compare(load_contradictions(args.corpus), args.by_app)
+    for name, table in tables.items():
+        print(f"== {name}")
+        print(table.to_string(index=False))
+        if args.output:
+            table.to_csv(f"{args.output}.{name}.csv", index=False)
+    print(f"Compared in {time.time() - start:.2f} seconds")
@@ -0,0 +1,320 @@
+import argparse
+import os
+import sys
+import time
+from typing import Optional
+
+import pandas as pd
+import yaml
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import PROJECT_ROOT
+from analyzer.result_store import ResultStore
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+"""
+Columnar corpus of the contradiction results of PoliCond, PoliGraph and PolicyLint.
+export_corpus reads the result files of the three tools once and writes them as Parquet datasets partitioned by tool,
+<corpus>/<table>/tool=<tool>/part-0.parquet, with a schema shared by the tools:
+- contradictions: one row per contradiction pair, the (entity, action, data, condition, sentence) of both statements
+  and the manual label when there is one
+- statements: one row per statement (PoliCond tuple and evidence sentence, PoliGraph graph edge), in the order of
+  its source, with the PoliGraph SUBSUM edges the contradiction rules read; text keeps the text of a PoliGraph edge as
+  the graph holds it, which the PoliGraph scripts write out
+The evaluation scripts then load the columns they need with load_table and work on whole frames instead of walking
+and parsing the result files row by row.
+"""
+
+TOOLS = ('policond', 'poligraph', 'policylint')
+TABLES = ('contradictions', 'statements')
+CONTRADICTION_COLUMNS = ['tool', 'app', 'pairId', 'entity1', 'action1', 'data1', 'condition1', 'sentence1',
+                         'entity2', 'action2', 'data2', 'condition2', 'sentence2', 'label']
+STATEMENT_COLUMNS = ['tool', 'app', 'position', 'entity', 'action', 'data', 'condition', 'sentence', 'text']
+
+DATASETS = os.path.join(PROJECT_ROOT, 'datasets')
+DEFAULT_CORPUS = os.path.join(DATASETS, 'corpus')
+POLICOND_PAIRS = os.path.join(DATASETS, 'apps-PoliCond-DeepSeek', 'contradiction', 'contradiction_pair.csv')
+POLICOND_CONTEXTS = os.path.join(DATASETS, 'apps-PoliCond-DeepSeek', 'contradiction', 'contradiction_context.csv')
+POLIGRAPH_RESULTS = os.path.join(DATASETS, 'apps-PoliGraph', 'contradiction-PoliGraph', 'poligraph_results.csv')
+POLICYLINT_RESULTS = os.path.join(DATASETS, 'apps-PolicyLint', 'policylint_results.csv')
+POLIGRAPH_GRAPH = 'graph-extended.full.yml'
+POLIGRAPH_ACTIONS = r'((?:NOT_)?(?:COLLECT|BE_SHARED|BE_SOLD|STORE|USE))'
+
+
+def missing_dependency() -> Optional[str]:
+    if pyarrow is None:
+        return "The corpus is written as Parquet, which requires pyarrow (pip install pyarrow)"
+    return None
+
+
+def table_path(corpus_dir: str, table: str) -> str:
+    return os.path.join(corpus_dir, table)
+
+
+def _frame(df: pd.DataFrame, tool: str, columns: list[str]) -> pd.DataFrame:
+    df = df.assign(tool=tool)
+    for column in columns:
+        if column not in df:
+            df[column] = None
+    return df[columns]
+
+
+# ---- PoliCond ----
+
+def split_tuples(tuples: pd.Series) -> pd.DataFrame:
+    """
+    entity, action, data and condition columns of PoliCond tuple strings "(entity, action, data, condition)"
+    """
+    parts = tuples.str.strip().str.strip('()').str.split(',', n=3, expand=True)
+    parts = parts.reindex(columns=range(4)).apply(lambda column: column.str.strip())
+    parts.columns = ['entity', 'action', 'data', 'condition']
+    return parts
+
+
+def policond_from_csv(pairs_path: str = POLICOND_PAIRS, contexts_path: str = POLICOND_CONTEXTS) -> pd.DataFrame:
+    """
+    Contradictions of the PoliCond result CSVs, the contexts of contradiction_context.csv joined on their ids
+    """
+    pairs = pd.read_csv(pairs_path, encoding='utf-8-sig')
+    contexts = pd.read_csv(contexts_path, encoding='utf-8-sig', usecols=['context1', 'context2', 'contextId1',
+                                                                         'contextId2'])
+    texts = pd.concat([contexts[['contextId1', 'context1']].set_axis(['contextId', 'sentence'], axis=1),
+                       contexts[['contextId2', 'context2']].set_axis(['contextId', 'sentence'], axis=1)])
+    texts = texts.drop_duplicates('contextId').set_index('contextId')['sentence']
+    df = pd.DataFrame({'app': pairs['filename'], 'pairId': pairs['id'], 'label': pairs['label']})
+    for side in ('1', '2'):
+        parts = split_tuples(pairs[f'tuple{side}'])
+        for column in parts:
+            df[column + side] = parts[column]
+        df['sentence' + side] = pairs[f'contextId{side}'].map(texts)
+    return _frame(df, 'policond', CONTRADICTION_COLUMNS)
+
+
+_REPORT_TUPLES = """
+SELECT p.name AS app, t.id AS tupleId, t.entity, t.verb AS action, t.data, t.condition, s.text AS sentence
+FROM latest_policies p JOIN tuples t ON t.policy_id = p.id
+LEFT JOIN evidence e ON e.tuple_id = t.id LEFT JOIN sentences s ON s.id = e.context_id
+ORDER BY p.name, t.id, e.evidence_id
+"""
+_REPORT_PAIRS = """
+SELECT p.name AS app, r.id AS pairId, r.left_id AS tupleId1, r.right_id AS tupleId2
+FROM latest_policies p JOIN pairs r ON r.policy_id = p.id WHERE r.kind = 'contradiction' ORDER BY p.name, r.id
+"""
+
+
+def policond_from_reports(directory: str) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    (contradictions, statements) of the PoliCond reports under directory, the post report of a policy when there is
+    one; a tuple's sentence is the context of its evidence, one statement per evidence
+    """
+    with ResultStore(':memory:') as store:
+        store.add_directory(directory)
+        statements = pd.read_sql_query(_REPORT_TUPLES, store.connection)
+        pairs = pd.read_sql_query(_REPORT_PAIRS, store.connection)
+    # the sentences of a tuple, one per line
+    tuples = statements.groupby('tupleId', sort=False).agg(
+        entity=('entity', 'first'), action=('action', 'first'), data=('data', 'first'),
+        condition=('condition', 'first'), sentence=('sentence', lambda s: '\n'.join(s.dropna())))
+    df = pairs
+    for side in ('1', '2'):
+        df = df.merge(tuples.add_suffix(side), left_on=f'tupleId{side}', right_index=True, how='left')
+    df['pairId'] = df.groupby('app').cumcount() + 1
+    statements['position'] = statements.groupby('app').cumcount()
+    return (_frame(df, 'policond', CONTRADICTION_COLUMNS),
+            _frame(statements.dropna(subset=['sentence']), 'policond', STATEMENT_COLUMNS))
+
+
+# ---- PoliGraph ----
+
+def poligraph_from_csv(path: str = POLIGRAPH_RESULTS) -> pd.DataFrame:
+    """
+    Contradictions of poligraph_results.csv: entity and data of the (entity, data) tuples, action of the graph edges
+    and their purposes (the edge's second line) as condition
+    """
+    results = pd.read_csv(path, encoding='utf-8-sig')
+    df = pd.DataFrame({'app': results['app_id'], 'pairId': range(1, len(results) + 1), 'label': results['label']})
+    for side, prefix in (('1', 'pos'), ('2', 'neg')):
+        parts = results[f'{prefix}_tuple'].str.extract(r"^\(\s*'(.*)',\s*'(.*)'\s*\)$")
+        df['entity' + side], df['data' + side] = parts[0], parts[1]
+        edge = results[f'{prefix}_edge'].str.split('\n', n=1, expand=True).reindex(columns=range(2))
+        df['action' + side] = edge[0].str.extract(POLIGRAPH_ACTIONS, expand=False)
+        purposes = edge[1].str.strip('[] ').str.replace("'", '', regex=False).str.replace(', ', ' and ', regex=False)
+        df['condition' + side] = purposes.where(purposes != '')
+        df['sentence' + side] = results[f'{prefix}_text']
+    return _frame(df, 'poligraph', CONTRADICTION_COLUMNS)
+
+
+def poligraph_graph_files(directory: str) -> list[tuple[str, str]]:
+    """
+    (app, path) of the PoliGraph graphs under directory, the app being the directory of the graph, in os.walk order
+    as the PoliGraph scripts read them
+    """
+    graphs = []
+    for root, _, files in os.walk(directory):
+        if POLIGRAPH_GRAPH in files:
+            path = os.path.join(root, POLIGRAPH_GRAPH)
+            graphs.append((path.split(os.sep)[-2], path))
+    return graphs
+
+
+def poligraph_edges(directory: str) -> pd.DataFrame:
+    """
+    Statements of the edges ('links') of the PoliGraph graphs under directory: source, key and target as entity,
+    action and data, the edge's text (sentences, one per line) as sentence and as written by the csv module as text
+    """
+    frames = []
+    for app, path in poligraph_graph_files(directory):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = yaml.load(f, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader))
+        links = pd.DataFrame(data.get('links') or [], columns=['source', 'key', 'target', 'text'])
+        frames.append(pd.DataFrame({'app': app, 'position': range(len(links)), 'entity': links['source'],
+                                    'action': links['key'], 'data': links['target'],
+                                    'sentence': links['text'].map(edge_text),
+                                    'text': links['text'].map(written_text)}))
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=STATEMENT_COLUMNS)
+    return _frame(df, 'poligraph', STATEMENT_COLUMNS)
+
+
+def edge_text(text) -> Optional[str]:
+    if isinstance(text, (list, tuple)):
+        return '\n'.join(map(str, text))
+    return text
+
+
+def written_text(text) -> Optional[str]:
+    """
+    text as csv.writer writes it: strings as they are, other values (lists of sentences) by str()
+    """
+    if text is None or isinstance(text, str):
+        return text
+    return str(text)
+
+
+# ---- PolicyLint ----
+
+def policylint_from_csv(path: str = POLICYLINT_RESULTS) -> pd.DataFrame:
+    results = pd.read_csv(path, encoding='utf-8-sig')
+    df = pd.DataFrame({
+        'app': results['packageName'], 'pairId': range(1, len(results) + 1), 'label': results['label'],
+        'entity1': results['policyEntity'], 'action1': results['policyAction'], 'data1': results['policyData'],
+        'sentence1': results['policySentences'], 'entity2': results['contradictoryEntity'],
+        'action2': results['contradictoryAction'], 'data2': results['contradictoryData'],
+        'sentence2': results['contradictionSentences'],
+    })
+    return _frame(df, 'policylint', CONTRADICTION_COLUMNS)
+
+
+# ---- corpus ----
+
+def statements_of(contradictions: pd.DataFrame) -> pd.DataFrame:
+    """
+    Distinct statements of both sides of contradictions, for the tools whose statements are not exported otherwise
+    """
+    sides = [contradictions[['tool', 'app'] + [c + side for c in ('entity', 'action', 'data', 'condition',
+                                                                  'sentence')]]
+             .set_axis(['tool', 'app', 'entity', 'action', 'data', 'condition', 'sentence'], axis=1)
+             for side in ('1', '2')]
+    df = pd.concat(sides, ignore_index=True).drop_duplicates(ignore_index=True)
+    df['position'] = df.groupby(['tool', 'app']).cumcount()
+    df['text'] = None
+    return df[STATEMENT_COLUMNS]
+
+
+def write_table(df: pd.DataFrame, corpus_dir: str, table: str):
+    """
+    Write df as the partitions of its tools of a corpus table, replacing the partitions the table had for them
+    """
+    if pyarrow is None:
+        raise ImportError(missing_dependency())
+    columns = CONTRADICTION_COLUMNS if table == 'contradictions' else STATEMENT_COLUMNS
+    for tool, part in df.groupby('tool', sort=False):
+        directory = os.path.join(table_path(corpus_dir, table), f'tool={tool}')
+        os.makedirs(directory, exist_ok=True)
+        frame = part[columns[1:]].reset_index(drop=True)
+        for column in frame:
+            if column not in ('pairId', 'position', 'label'):
+                frame[column] = frame[column].astype('object').where(frame[column].notna(), None)
+        pyarrow.parquet.write_table(pyarrow.Table.from_pandas(frame, preserve_index=False),
+                                    os.path.join(directory, 'part-0.parquet'))
+
+
+def load_table(corpus_dir: str, table: str, tool: Optional[str] = None,
+               columns: Optional[list[str]] = None) -> pd.DataFrame:
+    """
+    A corpus table, or the partition of one tool, with only the given columns
+    """
+    if pyarrow is None:
+        raise ImportError(missing_dependency())
+    path = table_path(corpus_dir, table)
+    if tool is not None:
+        df = pyarrow.parquet.read_table(os.path.join(path, f'tool={tool}', 'part-0.parquet'),
+                                        columns=[c for c in columns if c != 'tool'] if columns else None).to_pandas()
+        df.insert(0, 'tool', tool)
+        return df[columns] if columns else df
+    frames = [load_table(corpus_dir, table, t, columns) for t in TOOLS
+              if os.path.isfile(os.path.join(path, f'tool={t}', 'part-0.parquet'))]
+    return pd.concat(frames, ignore_index=True)
+
+
+def export_corpus(corpus_dir: str = DEFAULT_CORPUS, policond_reports: Optional[str] = None,
+                  poligraph_graphs: Optional[str] = None, policond_pairs: str = POLICOND_PAIRS,
+                  policond_contexts: str = POLICOND_CONTEXTS, poligraph_results: str = POLIGRAPH_RESULTS,
+                  policylint_results: str = POLICYLINT_RESULTS) -> dict[str, int]:
+    """
+    Export the results of the three tools to corpus_dir. PoliCond results are read from its reports when
+    policond_reports is given and from its result CSVs otherwise; the PoliGraph statements are the edges of its graphs
+    when poligraph_graphs is given.
+    :return: {table/tool: rows}
+    """
+    contradictions, statements = [], []
+    if policond_reports:
+        pairs, tuples = policond_from_reports(policond_reports)
+        contradictions.append(pairs)
+        statements.append(tuples)
+    else:
+        contradictions.append(policond_from_csv(policond_pairs, policond_contexts))
+    contradictions.append(poligraph_from_csv(poligraph_results))
+    if poligraph_graphs:
+        statements.append(poligraph_edges(poligraph_graphs))
+    contradictions.append(policylint_from_csv(policylint_results))
+
+    contradictions = pd.concat(contradictions, ignore_index=True)
+    exported = set(pd.concat(statements)['tool']) if statements else set()
+    statements.append(statements_of(contradictions[~contradictions['tool'].isin(exported)]))
+    statements = pd.concat(statements, ignore_index=True)
+
+    write_table(contradictions, corpus_dir, 'contradictions')
+    write_table(statements, corpus_dir, 'statements')
+    counts = {}
+    for table, df in (('contradictions', contradictions), ('statements', statements)):
+        for tool, rows in df['tool'].value_counts(sort=False).items():
+            counts[f'{table}/{tool}'] = int(rows)
+    return counts
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export the results of PoliCond, PoliGraph and PolicyLint to a "
+                                                 "Parquet corpus partitioned by tool.")
+    parser.add_argument('--output', default=DEFAULT_CORPUS, help='Corpus directory')
+    parser.add_argument('--policond-reports', help='Read the PoliCond results from the reports under this directory '
+                                                   'instead of its result CSVs')
+    parser.add_argument('--poligraph-graphs', help=f'Directory of the PoliGraph {POLIGRAPH_GRAPH} graphs')
+    parser.add_argument('--policond-pairs', default=POLICOND_PAIRS)
+    parser.add_argument('--policond-contexts', default=POLICOND_CONTEXTS)
+    parser.add_argument('--poligraph-results', default=POLIGRAPH_RESULTS)
+    parser.add_argument('--policylint-results', default=POLICYLINT_RESULTS)
+    args = parser.parse_args()
+    if missing_dependency():
+        print(f"Error: {missing_dependency()}")
+        sys.exit(1)
+    start = time.time()
+    rows = export_corpus(args.output, args.policond_reports, args.poligraph_graphs, args.policond_pairs,
+                         args.policond_contexts, args.poligraph_results, args.policylint_results)
+    for key, count in rows.items():
+        print(f"{key}: {count} rows")
+    print(f"Corpus written to {args.output} in {time.time() - start:.2f} seconds")
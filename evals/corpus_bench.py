@@ -0,0 +1,423 @@
+import argparse
+import contextlib
+import csv
+import importlib.util
+import io
+import os
+import random
+import sys
+import tempfile
+import re
+import time
+from collections import defaultdict
+from itertools import combinations
+
+import pandas as pd
+import yaml
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from evals.corpus import export_corpus, load_table, POLIGRAPH_GRAPH, POLICOND_PAIRS, POLICOND_CONTEXTS, \
+    POLICYLINT_RESULTS, TOOLS
+from evals.compare import Comparison, decode, normalize, _SENTENCE_BREAK
+
+"""
+Benchmark the evaluation steps on the Parquet corpus (evals/corpus.py) against the row-by-row implementations they
+replaced, which read the result files on every run:
+- dedup-policylint: order and deduplicate the PolicyLint sentence pairs (iterrows with per-row df.at writes, against
+  datasets/apps-PolicyLint/dedup_group_contr.py)
+- policond-contexts: join the PoliCond contradiction pairs to their contexts (per-row dictionary lookups)
+- aggregate-poligraph: the PoliGraph contradiction CSV files (the script's previous output_contradiction verbatim:
+  os.walk, yaml.safe_load and nested loops over the edges of every graph, against
+  evals/aggregate-poligraph-contradictions.py); both write their files, which are compared byte for byte
+- compare-matched: which contradictions of every tool share a sentence pair with another tool (nested loops over the
+  contradictions of both tools, splitting and normalizing sentences on every comparison, against the hash joins of
+  evals/compare.py)
+The PoliGraph graphs are not shipped with the repository; without --graphs, --synthetic N writes N random graphs with
+the edge kinds the contradiction rules look at. The script checks that both implementations give the same rows.
+"""
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_script(path: str, name: str):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+aggregate = load_script(os.path.join(ROOT, 'evals', 'aggregate-poligraph-contradictions.py'), 'aggregate_poligraph')
+dedup = load_script(os.path.join(ROOT, 'datasets', 'apps-PolicyLint', 'dedup_group_contr.py'), 'dedup_group_contr')
+
+
+# ---- the row-by-row implementations ----
+
+def rows_dedup_policylint(path: str) -> pd.DataFrame:
+    df = pd.read_csv(path, encoding='utf-8')
+    df = df[['packageName', 'policySentences', 'contradictionSentences']]
+    df['policySentences'] = df['policySentences'].astype(str)
+    df['contradictionSentences'] = df['contradictionSentences'].astype(str)
+    minMap, maxMap = {}, {}
+    for index, row in df.iterrows():
+        row = row.to_dict()
+        minMap[index] = min(row['policySentences'], row['contradictionSentences'])
+        maxMap[index] = max(row['policySentences'], row['contradictionSentences'])
+
+        if row['policySentences'] != minMap[index]:
+            print(f"row {index} exchange policySentences and contradictionSentences")
+            df.at[index, 'policySentences'] = minMap[index]
+            df.at[index, 'contradictionSentences'] = maxMap[index]
+    df = df.drop_duplicates(keep='first', ignore_index=True,
+                            subset=['packageName', 'policySentences', 'contradictionSentences'])
+    df['id'] = df.index + 1
+    return df[['id', 'packageName', 'policySentences', 'contradictionSentences']]
+
+
+def rows_policond_contexts(pairs_path: str, contexts_path: str) -> pd.DataFrame:
+    contexts = pd.read_csv(contexts_path, encoding='utf-8-sig')
+    texts = {}
+    for _, row in contexts.iterrows():
+        texts.setdefault(row['contextId1'], row['context1'])
+        texts.setdefault(row['contextId2'], row['context2'])
+    rows = []
+    for _, row in pd.read_csv(pairs_path, encoding='utf-8-sig').iterrows():
+        rows.append({'app': row['filename'], 'pairId': row['id'], 'sentence1': texts.get(row['contextId1']),
+                     'sentence2': texts.get(row['contextId2']), 'label': row['label']})
+    return pd.DataFrame(rows)
+
+
+def corpus_policond_contexts(corpus_dir: str) -> pd.DataFrame:
+    return load_table(corpus_dir, 'contradictions', 'policond', ['app', 'pairId', 'sentence1', 'sentence2', 'label'])
+
+
+def rows_output_contradiction(dir_path: str, output_file: str, output_file2: str,
+                              USE_POLIGRAPH_CONTRADICTION_RULE: bool = False):
+    # output_contradiction of evals/aggregate-poligraph-contradictions.py before the corpus, verbatim but for its
+    # module-level settings, which are arguments here
+    yamls = [POLIGRAPH_GRAPH]
+    word_map, positive, negative = aggregate.word_map, aggregate.positive, aggregate.negative
+
+    header = ['id', 'filename', 'entity1', 'verb1', 'data1', 'entity2', 'verb2', 'data2', ]
+    header2 = ['id', 'filename', 'context1', 'context2']
+    cnt = 0
+    ANONYMIZED = ['aggregate / deidentified / pseudonymized information', 'non-personal information',
+                  'aggregate information',
+                  'anonymized information', 'non-identifiable information', 'non-identifiable data',
+                  'pseudonymized data',
+                  'pseudonymized information', 'anonymized data', 'deidentified information', 'non-personal data',
+                  'aggregate statistical information'
+        , 'deidentifie information', 'demographic detail', 'demographic', 'demographic information', 'demographic data',
+                  'aggregate', 'non-identifiable', 'non-identifiable', 'non-identifiable information', 'anonymized',
+                  'data aggregate', 'cpu information'
+                                    'anonymous'
+                  ]
+
+    def find_contradiction(nodes):
+        nonlocal cnt
+        contradictions = []
+        positive_nodes = [node for node in nodes if node['key'] in positive]
+        negative_nodes = [node for node in nodes if node['key'] in negative]
+        subsumes = [node for node in nodes if node['key'] == 'SUBSUM']
+        subordinates = defaultdict(list)
+        for edge in subsumes:
+            source = edge['source']
+            target = edge['target']
+            subordinates[source].append(target)
+
+        while True:
+            old_subordinates = subordinates.copy()
+            for father in subordinates:
+                for child in subordinates[father]:
+                    if child in subordinates:
+                        subordinates[father].extend(subordinates[child])
+
+            if old_subordinates == subordinates:
+                break
+
+        visited = set()
+        for pos in positive_nodes:
+            for neg in negative_nodes:
+                entity1, verb1, data1 = pos['source'], pos['key'], pos['target']
+                entity2, verb2, data2 = neg['source'], neg['key'], neg['target']
+
+                if data1 == 'UNSPECIFIED_DATA' or data2 == 'UNSPECIFIED_DATA':
+                    continue
+                if data2 == 'personal identifier @children' or '@children' in data2:
+                    continue
+                if 'personal' in data1 and 'personal' not in data2:
+                    continue
+                if data1 != data2 and data2 in subordinates[data1]:
+                    continue
+                if any(d in ANONYMIZED for d in [data1, data2]) and any(d not in ANONYMIZED for d in [data1, data2]):
+                    continue
+                if any(anony in data1 for anony in ANONYMIZED) and any(anony not in data2 for anony in ANONYMIZED):
+                    continue
+                if any(anony in data2 for anony in ANONYMIZED) and any(anony not in data1 for anony in ANONYMIZED):
+                    continue
+                if 'location' in data1 and 'cookie' in data2:
+                    continue
+                if any(word in [data1, data2] for word in
+                       ['time', 'date', 'option', 'setting', 'choice', 'control', 'pixel'
+                           , 'encryption', 'encrypt', 'language'
+                        ]):
+                    continue
+
+                if data1 != data2 and data1 not in subordinates and data2 not in subordinates:
+                    continue
+
+                if entity1 == 'we' and entity2 != 'we' and 'we' not in subordinates:
+                    continue
+                if entity2 == 'we' and entity1 != 'we' and 'we' not in subordinates:
+                    continue
+                if entity1 != entity2 and entity1 not in subordinates and entity2 not in subordinates:
+                    continue
+
+                if USE_POLIGRAPH_CONTRADICTION_RULE:
+                    if data1 != data2 and not any(
+                            (data1 in subordinates[d] or data1 == d) and (data2 in subordinates[d] or data2 == d) for d
+                            in subordinates.keys()):
+                        continue
+
+                    if entity1 != entity2 and not any(
+                            (entity1 in subordinates[d] or entity1 == d) and (
+                                    entity2 in subordinates[d] or entity2 == d) for d in
+                            subordinates.keys()):
+                        continue
+
+                description = (entity1, data1, entity2, data2, verb1)
+                if description in visited:
+                    continue
+
+                if word_map[verb1] == verb2 or word_map[verb2] == verb1:
+                    cnt += 1
+                    visited.add(description)
+                    contradictions.append({
+                        'id': cnt,
+                        'entity1': entity1,
+                        'verb1': verb1,
+                        'data1': data1,
+                        'entity2': entity2,
+                        'verb2': verb2,
+                        'data2': data2,
+                        'context1': pos['text'],
+                        'context2': neg['text'],
+
+                    })
+        return contradictions
+
+    SEP = ';'
+
+    # with open(output_file, 'w', encoding='utf-8') as out_f:
+    #     out_f.write(SEP.join(header) + '\n')
+
+    csv_writer = csv.writer(open(output_file, 'w', encoding='utf-8', newline=''), delimiter=SEP)
+    csv_writer.writerow(header)
+    csv_writer2 = csv.writer(open(output_file2, 'w', encoding='utf-8', newline=''), delimiter=SEP)
+    csv_writer2.writerow(header2)
+
+    for root, dirs, files in os.walk(dir_path):
+        for file in files:
+            if file in yamls:
+                full_yaml_path = os.path.join(root, file)
+                filename = full_yaml_path.split(os.sep)[-2]
+                with open(full_yaml_path, 'r', encoding='utf-8') as f:
+                    data = yaml.safe_load(f)
+                    nodes = data['links']
+                    contradiction_pairs = find_contradiction(nodes)
+                    if contradiction_pairs and len(contradiction_pairs) > 0:
+                        # with open(output_file, 'a', encoding='utf-8', newline='') as out_f:
+                        #     for pair in contradiction_pairs:
+                        #         out_f.write(
+                        #             f"{pair['id']},{filename},{pair['entity1']},{pair['verb1']},{pair['data1']},"
+                        #             f"{pair['context1']},{pair['entity2']},{pair['verb2']},{pair['data2']},"
+                        #             f"{pair['context2']}\n")
+
+                        for pair in contradiction_pairs:
+                            csv_writer.writerow([
+                                pair['id'],
+                                filename,
+                                pair['entity1'],
+                                pair['verb1'],
+                                pair['data1'],
+                                pair['entity2'],
+                                pair['verb2'],
+                                pair['data2'],
+                            ])
+
+                            csv_writer2.writerow([
+                                pair['id'],
+                                filename,
+                                pair['context1'],
+                                pair['context2'],
+                            ])
+
+                        print(f"Contradictions found in {filename}: {len(contradiction_pairs)}")
+                    else:
+                        print(f"No contradictions found in {filename}")
+
+    print(f"Total contradictions found: {cnt}")
+
+
+def output_lines(*paths: str) -> pd.DataFrame:
+    """
+    Lines of the output files, line breaks included, to compare them byte for byte
+    """
+    rows = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            rows += [{'file': os.path.basename(path), 'line': line} for line in f.read().split('\n')]
+    return pd.DataFrame(rows)
+
+
+def _output_files(output_dir: str, run: str) -> list[str]:
+    os.makedirs(os.path.join(output_dir, run), exist_ok=True)
+    return [os.path.join(output_dir, run, name) for name in ('contradictions.csv', 'contradiction_context.csv')]
+
+
+def rows_aggregate_poligraph(graphs_dir: str, output_dir: str, use_poligraph_rule: bool = False) -> pd.DataFrame:
+    outputs = _output_files(output_dir, 'rows')
+    rows_output_contradiction(graphs_dir, *outputs, use_poligraph_rule)
+    return output_lines(*outputs)
+
+
+def corpus_aggregate_poligraph(corpus_dir: str, output_dir: str, use_poligraph_rule: bool = False) -> pd.DataFrame:
+    aggregate.corpus_dir = corpus_dir
+    aggregate.USE_POLIGRAPH_CONTRADICTION_RULE = use_poligraph_rule
+    aggregate.output_file, aggregate.output_file2 = _output_files(output_dir, 'corpus')
+    aggregate.output_contradiction()
+    return output_lines(aggregate.output_file, aggregate.output_file2)
+
+
+# ---- synthetic PoliGraph graphs ----
+
+ENTITIES = ['we', 'third party', 'advertiser', 'analytic provider', 'google', 'UNSPECIFIED_ACTOR', 'service provider']
+DATA = ['personal information', 'personal identifier', 'location', 'precise geolocation', 'cookie', 'email address',
+        'device identifier', 'UNSPECIFIED_DATA', 'personal identifier @children', 'aggregate information',
+        'anonymized data', 'demographic', 'time', 'ip address', 'contact information', 'phone number',
+        'geolocation @children', 'non-personal information', 'browsing history', 'age',
+        # names that are entities too, which the rules test as fathers
+        'we', 'advertiser']
+ACTIONS = aggregate.positive + aggregate.negative
+
+
+def rows_sentence_pairs(app: str, sentences1, sentences2) -> set:
+    number = re.match(r'^\s*(\d+)_', str(app))
+    app = number.group(1) if number else normalize(str(app))
+    sides = []
+    for text in (sentences1, sentences2):
+        sides.append({normalize(s) for s in _SENTENCE_BREAK.split(decode(str(text)))} - {''}
+                     if pd.notna(text) else set())
+    return {(app,) + tuple(sorted((a, b))) for a in sides[0] for b in sides[1]}
+
+
+def rows_compare_matched(corpus_dir: str) -> pd.DataFrame:
+    df = load_table(corpus_dir, 'contradictions').reset_index(drop=True)
+    rows = []
+    for a, b in combinations(TOOLS, 2):
+        for tool, other in ((a, b), (b, a)):
+            for index, left in df[df['tool'] == tool].iterrows():
+                matched = False
+                for _, right in df[df['tool'] == other].iterrows():
+                    if rows_sentence_pairs(left['app'], left['sentence1'], left['sentence2']) & \
+                            rows_sentence_pairs(right['app'], right['sentence1'], right['sentence2']):
+                        matched = True
+                        break
+                rows.append({'tool': tool, 'other': other, 'row': index, 'matched': matched})
+    return pd.DataFrame(rows)
+
+
+def corpus_compare_matched(corpus_dir: str) -> pd.DataFrame:
+    comparison = Comparison(load_table(corpus_dir, 'contradictions'))
+    frames = []
+    for a, b in combinations(TOOLS, 2):
+        for tool, other in ((a, b), (b, a)):
+            matched = comparison.matched(tool, other)
+            frames.append(pd.DataFrame({'tool': tool, 'other': other, 'row': matched.index,
+                                        'matched': matched.to_numpy()}))
+    return pd.concat(frames, ignore_index=True)
+
+
+def synthetic_graphs(directory: str, apps: int, edges: int, seed: int = 0):
+    rng = random.Random(seed)
+    for app in range(apps):
+        links = []
+        for i in range(edges):
+            if rng.random() < 0.25:
+                # a subsumption hierarchy has no cycles, the closure of the rules would not end
+                names = DATA if rng.random() < 0.7 else ENTITIES
+                source, target = sorted(rng.sample(range(len(names)), 2))
+                source, target = names[source], names[target]
+                links.append({'source': source, 'key': 'SUBSUM', 'target': target, 'text': []})
+            else:
+                links.append({'source': rng.choice(ENTITIES), 'key': rng.choice(ACTIONS), 'target': rng.choice(DATA),
+                              'text': [f"sentence {i} of app {app}"] * rng.randint(1, 2)})
+        os.makedirs(os.path.join(directory, f"{app}_app"), exist_ok=True)
+        with open(os.path.join(directory, f"{app}_app", POLIGRAPH_GRAPH), 'w', encoding='utf-8') as f:
+            yaml.safe_dump({'nodes': [], 'links': links}, f)
+
+
+def _timed(run, repeat: int):
+    times, result = [], None
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = run()
+            times.append(time.perf_counter() - start)
+    return result, round(min(times) * 1000, 3)
+
+
+def _same(a: pd.DataFrame, b: pd.DataFrame) -> bool:
+    a, b = a.reset_index(drop=True), b[list(a.columns)].reset_index(drop=True)
+    return len(a) == len(b) and bool((a.astype(str) == b.astype(str)).all().all())
+
+
+def bench(graphs_dir: str, repeat: int = 3, use_poligraph_rule: bool = False) -> pd.DataFrame:
+    rows = []
+    with tempfile.TemporaryDirectory() as corpus_dir, tempfile.TemporaryDirectory() as output_dir:
+        start = time.perf_counter()
+        export_corpus(corpus_dir, poligraph_graphs=graphs_dir)
+        export_ms = (time.perf_counter() - start) * 1000
+
+        steps = {
+            'dedup-policylint': (lambda: rows_dedup_policylint(POLICYLINT_RESULTS),
+                                 lambda: dedup.dedup_policylint_frame(
+                                     dedup.policylint_pairs(corpus_dir=corpus_dir))),
+            'policond-contexts': (lambda: rows_policond_contexts(POLICOND_PAIRS, POLICOND_CONTEXTS),
+                                  lambda: corpus_policond_contexts(corpus_dir)),
+            'aggregate-poligraph': (lambda: rows_aggregate_poligraph(graphs_dir, output_dir, use_poligraph_rule),
+                                    lambda: corpus_aggregate_poligraph(corpus_dir, output_dir, use_poligraph_rule)),
+            'compare-matched': (lambda: rows_compare_matched(corpus_dir),
+                                lambda: corpus_compare_matched(corpus_dir)),
+        }
+        for step, (before, after) in steps.items():
+            expected, before_ms = _timed(before, repeat)
+            result, after_ms = _timed(after, repeat)
+            rows.append({'step': step, 'rows': len(result), 'beforeMs': before_ms, 'afterMs': after_ms,
+                         'speedup': round(before_ms / after_ms, 1) if after_ms else None,
+                         'identical': _same(expected, result)})
+
+    df = pd.DataFrame(rows)
+    print(df.to_string(index=False))
+    print(f"corpus exported once in {export_ms:.1f} ms; {df['beforeMs'].sum():.1f} ms row by row, "
+          f"{df['afterMs'].sum():.1f} ms on the corpus; identical: {int(df['identical'].sum())}/{len(df)}")
+    return df
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the evaluation steps on the Parquet corpus.")
+    parser.add_argument('--graphs', help=f'Directory of the PoliGraph {POLIGRAPH_GRAPH} graphs')
+    parser.add_argument('--synthetic', type=int, default=100, metavar='N',
+                        help='Without --graphs, benchmark on N synthetic graphs')
+    parser.add_argument('--edges', type=int, default=200, help='Edges of every synthetic graph')
+    parser.add_argument('--poligraph-rule', action='store_true', help='Use the PoliGraph contradiction rule (config 1)')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='Write the per-step numbers to this CSV file')
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        graphs = args.graphs
+        if not graphs:
+            graphs = tmp
+            synthetic_graphs(graphs, args.synthetic, args.edges)
+        result = bench(graphs, args.repeat, args.poligraph_rule)
+    if args.output:
+        result.to_csv(args.output, index=False)
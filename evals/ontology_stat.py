@@ -0,0 +1,83 @@
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import *
+from ontology.condition.handler import ConditionHandler
+from ontology.data.handler import DataHandler
+from ontology.entity.handler import EntityHandler
+
+"""
+Compute the ontology statistics stored in datasets/ontology-stat:
+- <ontology>-ontology.csv: for every policy, the number of analyzed sentences in which each concept occurs
+- <ontology>-ontology-agg.csv: per concept, the total count and the coverage (ratio of policies where it occurs)
+Every ontology is recognized over the whole corpus in a single batch (see ontology/batch.py).
+"""
+
+HANDLERS = {
+    'entity': EntityHandler,
+    'data': DataHandler,
+    'condition': ConditionHandler,
+}
+
+
+def collect_sentences(root_dir: str) -> tuple[list[str], list[str]]:
+    """
+    Collect the analyzed sentences of every policy, i.e. the 'sentence' field of each analysis.jsonl
+    """
+    filenames, sentences = [], []
+    for root, _, files in os.walk(root_dir):
+        if 'analysis.jsonl' not in files:
+            continue
+        seen = set()
+        with open(os.path.join(root, 'analysis.jsonl'), 'r', encoding='utf-8') as f:
+            for line in f:
+                sentence = json.loads(line)['sentence']
+                if sentence not in seen:
+                    seen.add(sentence)
+                    filenames.append(os.path.basename(root))
+                    sentences.append(sentence.lower())
+    return filenames, sentences
+
+
+def ontology_stat(root_dir: str, output_dir: str, lower: bool = False):
+    EntityHandler.preload(entity_ontology_path, entity_relation_yml)
+    DataHandler.preload(data_ontology_path, data_relation_yml)
+    ConditionHandler.preload(condition_dir_path, condition_relation_yml)
+
+    filenames, sentences = collect_sentences(root_dir)
+    if not sentences:
+        print(f"No analysis.jsonl found in {root_dir}")
+        return
+    os.makedirs(output_dir, exist_ok=True)
+    files = pd.Series(filenames)
+
+    for name, handler in HANDLERS.items():
+        incidence = handler.recognize_many(sentences, lower=lower)
+        columns = [c.value for c in incidence.concepts]
+        per_file = pd.DataFrame(incidence.matrix.astype(np.int32), columns=columns).groupby(files.values).sum()
+        per_file.index.name = 'filename'
+        per_file.to_csv(os.path.join(output_dir, f"{name}-ontology.csv"))
+
+        agg = pd.DataFrame({
+            'concept': columns,
+            'count': per_file.sum(axis=0).values,
+            'coverage': (per_file > 0).mean(axis=0).round(4).values,
+        })
+        agg.to_csv(os.path.join(output_dir, f"{name}-ontology-agg.csv"), index=False)
+        print(f"{name}: {len(sentences)} sentences x {len(columns)} concepts, "
+              f"{int((agg['count'] > 0).sum())} concepts occurred")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compute per-policy ontology statistics in one batch pass.")
+    parser.add_argument('--input', required=True, help='Directory containing per-policy analysis.jsonl files')
+    parser.add_argument('--output', default=os.path.join(PROJECT_ROOT, 'datasets', 'ontology-stat'))
+    parser.add_argument('--lower', action='store_true', help='Only count the most specific concepts')
+    args = parser.parse_args()
+    ontology_stat(args.input, args.output, args.lower)
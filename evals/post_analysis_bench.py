@@ -0,0 +1,252 @@
+import argparse
+import copy
+import os
+import re
+import sys
+import time
+from itertools import product
+
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from analyzer.post_analysis import load_yaml_content, process_post_analysis_results, \
+    add_missing_tuples_from_candidates, NodeStore, third_party_alias
+from ontology.data.handler import DataHandler
+from ontology.entity.Entity import Entity
+
+"""
+Benchmark the post-analysis rules (rule1: resolve unspecified entities, rule2: add missing tuples from candidates) on
+the largest analysis reports of a directory, with the NodeStore indexes against the list scans they replaced.
+Both implementations run on copies of every report; the script checks that they produce the same nodes, rule1 and
+rule2, and reports their times. --scale k repeats the nodes of every report k times to show how each grows.
+The data recognition of the evidence contexts is warmed before timing; with --cold the recognition caches are cleared
+before every run, so the lists mode scans every evidence context and the store mode every distinct one.
+"""
+
+
+# resolve_unspecified_entities, add_missing_tuples_from_candidates and process_post_analysis_results of
+# analyzer/post_analysis.py before the NodeStore, verbatim but for their names
+def list_resolve_unspecified_entities(content: dict) -> dict:
+    """
+    Resolve unspecified entities in the content by determining whether they should be classified 
+    as 'we' or 'third parties' based on context and evidence.
+    
+    Args:
+        content (dict): The content dictionary containing nodes with entities
+        
+    Returns:
+        dict: Mapping of old nodes to new nodes with resolved entities
+    """
+    nodes = content['nodes']
+    unspecified = list(filter(lambda x: 'unspecified' in x['entity'], nodes))
+    we_collect = list(filter(lambda x: 'we' in x['entity'], nodes))
+    other_collect = list(filter(lambda x: x not in unspecified and x not in we_collect, nodes))
+    we_collect_data = set(map(lambda x: x['data'], we_collect))
+    other_collect_data = set(map(lambda x: x['data'], other_collect))
+
+    to_append = []
+    new_nodes = {}
+    for aTuple in unspecified:
+        has_third_party_flag = False
+        for anEvidence in aTuple['evidence']:
+            candidateEntity = anEvidence['candidateEntity']
+            if any([True for alias in third_party_alias if alias in candidateEntity]):
+                has_third_party_flag = True
+                break
+
+        if aTuple['data'] in we_collect_data:
+            new_tuple = aTuple.copy()
+            new_tuple['entity'] = Entity.THIRD_PARTIES.value
+            new_tuple['tuple'] = re.sub(r'unspecified.*?entity', Entity.THIRD_PARTIES.value, new_tuple['tuple'])
+            new_nodes[str(aTuple)] = new_tuple
+            to_append.append(new_tuple)
+        elif has_third_party_flag:
+            new_tuple = aTuple.copy()
+            new_tuple['entity'] = Entity.THIRD_PARTIES.value
+            new_tuple['tuple'] = re.sub(r'unspecified.*?entity', Entity.THIRD_PARTIES.value, new_tuple['tuple'])
+            new_nodes[str(aTuple)] = new_tuple
+            to_append.append(new_tuple)
+        else:
+            new_tuple = aTuple.copy()
+            new_tuple['entity'] = Entity.WE.value
+            new_tuple['tuple'] = re.sub(r'unspecified entity', Entity.WE.value, new_tuple['tuple'])
+            new_nodes[str(aTuple)] = new_tuple
+            to_append.append(new_tuple)
+
+    for node in unspecified:
+        del content['nodes'][content['nodes'].index(node)]
+    content['nodes'].extend(to_append)
+
+    return new_nodes
+
+
+def list_add_missing_tuples_from_candidates(content: dict) -> list[dict]:
+    """
+    Add missing tuples based on candidate data and entities to account for potential network 
+    failures or other reasons that may cause data types to be missing.
+    
+    Args:
+        content (dict): The content dictionary containing nodes with entities
+        
+    Returns:
+        list[dict]: List of complementary nodes that were added
+    """
+    nodes = content['nodes']
+    we_not_collect = list(filter(lambda x: 'not' in x['verb'] and 'we' in x['entity'], nodes))
+    we_not_collect_data = set(map(lambda x: x['data'], we_not_collect))
+    other_not_collect = list(filter(lambda x: x not in we_not_collect, nodes))
+    other_not_collect_data = set(map(lambda x: x['data'], other_not_collect))
+
+    collect_nodes = [node for node in nodes if 'unspecified' not in node['entity'] and 'not' not in node['verb']]
+
+    we_collect_nodes = list(filter(lambda x: 'we' in x['entity'], collect_nodes))
+    other_collect_nodes = list(filter(lambda x: x not in we_collect_nodes, collect_nodes))
+
+    covered_pair = [(node['entity'], node['data']) for node in nodes]
+    uncovered_pair = set()
+    for node in collect_nodes:
+        evidences = node['evidence']
+        candidate_data = []
+        candidate_entity = []
+        for evid in evidences:
+            parser = lambda string: string.strip('{}').split(',')
+            candidate_data.extend(list(parser(evid['candidateData'])))
+            candidate_entity.extend(list(parser(evid['candidateEntity'])))
+
+            context = ''
+            if 'context' in evid:
+                context = evid['context']
+            if 'sentence' in evid:
+                context += evid['sentence']
+            context = context.strip().lower()
+            new_candidate_data = DataHandler.recognize_as_Data(context)
+            candidate_data.extend(map(lambda x: x.value, new_candidate_data))
+
+        if not isinstance(candidate_data, list):
+            candidate_data = [candidate_data]
+        if not isinstance(candidate_entity, list):
+            candidate_entity = [candidate_entity]
+        candidate_data = list(set(candidate_data))
+        candidate_entity = list(set(candidate_entity))
+        for e, d in product(candidate_entity, candidate_data):
+            if d and (e, d) not in covered_pair:
+                if e == Entity.WE.value:
+                    if d not in we_not_collect_data:
+                        uncovered_pair.add((e, d))
+                elif e == Entity.ANDROID.value:
+                    if d not in we_not_collect_data:
+                        e = Entity.WE.value
+                        uncovered_pair.add((e, d))
+                elif e:
+                    if d not in other_not_collect_data:
+                        uncovered_pair.add((Entity.THIRD_PARTIES.value, d))
+                elif not e:
+                    e = Entity.WE.value
+                    if d not in we_not_collect_data:
+                        uncovered_pair.add((e, d))
+
+    complementary_nodes = []
+    if uncovered_pair:
+        for e, d in uncovered_pair:
+            complementary_nodes.append({
+                'entity': e,
+                'data': d,
+                'verb': 'collect',
+                'tuple': f"({e}, collect, {d}, any condition)",
+            })
+
+    content['rule2'] = list(complementary_nodes)
+    return complementary_nodes
+
+
+def list_process_post_analysis_results(content: dict) -> dict:
+    """
+    Process content by resolving unspecified entities.
+    
+    Args:
+        content (dict): The content dictionary containing nodes with entities
+        
+    Returns:
+        dict: Mapping of old nodes to new nodes with resolved entities
+    """
+    mapping_old2new: dict = list_resolve_unspecified_entities(content)
+
+    nodes = content['nodes']
+    new_tuples = [node['tuple'] for node in mapping_old2new.values()]
+    content['rule1'] = new_tuples
+
+    content['tuples'] = [node['tuple'] for node in nodes if 'unspecified' not in node['entity']]
+    return mapping_old2new
+
+
+def run_lists(content: dict) -> dict:
+    list_process_post_analysis_results(content)
+    list_add_missing_tuples_from_candidates(content)
+    return content
+
+
+def run_store(content: dict) -> dict:
+    store = NodeStore(content['nodes'])
+    process_post_analysis_results(content, store)
+    add_missing_tuples_from_candidates(content, store)
+    return content
+
+
+MODES = {'lists': run_lists, 'store': run_store}
+
+
+def find_reports(directory: str, top: int) -> list[tuple[str, dict]]:
+    """
+    (path, content) of the top analysis reports with the most nodes under directory
+    """
+    reports = []
+    for root, _, files in os.walk(directory):
+        for file in files:
+            if file.endswith('.yaml') and not file.startswith('post_'):
+                path = os.path.join(root, file)
+                content = load_yaml_content(path)
+                if isinstance(content, dict) and 'nodes' in content:
+                    reports.append((path, content))
+    reports.sort(key=lambda r: -len(r[1]['nodes']))
+    return reports[:top]
+
+
+def bench(directory: str, top: int = 10, scale: int = 1, repeat: int = 3, cold: bool = False) -> pd.DataFrame:
+    rows = []
+    for path, content in find_reports(directory, top):
+        content = dict(content, nodes=content['nodes'] * scale)
+        # warms the recognition cache both modes share
+        expected = run_lists(copy.deepcopy(content))
+        row = {'report': path, 'nodes': len(content['nodes']), 'identical': True}
+        for mode, run in MODES.items():
+            times = []
+            for _ in range(repeat):
+                c = copy.deepcopy(content)
+                if cold:
+                    DataHandler.cache_clear()
+                start = time.perf_counter()
+                result = run(c)
+                times.append(time.perf_counter() - start)
+            row[f"{mode}Ms"] = round(min(times) * 1000, 3)
+            row['identical'] &= all(result[k] == expected[k] for k in ('nodes', 'rule1', 'rule2', 'tuples'))
+        rows.append(row)
+
+    df = pd.DataFrame(rows)
+    print(df.to_string(index=False))
+    print(f"post-analysis of {len(df)} reports: {df['listsMs'].sum():.1f} ms with list scans, "
+          f"{df['storeMs'].sum():.1f} ms with NodeStore; identical output: {int(df['identical'].sum())}/{len(df)}")
+    return df
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the post-analysis rules on the largest reports.")
+    parser.add_argument('--input', required=True, help='Directory of analysis YAML reports')
+    parser.add_argument('--top', type=int, default=10, help='Number of largest reports to run')
+    parser.add_argument('--scale', type=int, default=1, help='Repeat the nodes of every report this many times')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--cold', action='store_true', help='Clear the recognition caches before every run')
+    parser.add_argument('--output', help='Write the per-report numbers to this CSV file')
+    args = parser.parse_args()
+    result = bench(args.input, args.top, args.scale, args.repeat, args.cold)
+    if args.output:
+        result.to_csv(args.output, index=False)
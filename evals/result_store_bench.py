@@ -0,0 +1,117 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+import yaml
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from analyzer.result_store import ResultStore, condition_members, report_stage, POST
+
+"""
+Benchmark corpus queries on the SQLite result store against walking the reports, as the evaluation scripts do.
+Every query asks for the contradiction pairs with either tuple matching a data item and a condition (e.g. location
+under children). The walk parses every report of the directory (the post report of a policy when there is one) and
+scans its pairs; the store answers from its indexes. The script checks that both return the same pairs and reports
+the time of the walk, of importing the reports into the store once, and of every query on the store.
+"""
+
+DEFAULT_QUERIES = [('location', 'children'), ('age', 'children'), ('location', 'third party'),
+                   ('email address', 'user consent'), ('%location%', 'region')]
+
+
+def latest_reports(directory: str) -> list[str]:
+    """
+    Report paths under directory, the post report of a policy when there is one
+    """
+    reports = {}
+    for root, _, files in os.walk(directory):
+        for file in files:
+            if file.endswith('.yaml'):
+                path = os.path.join(root, file)
+                key = os.path.join(root, file[len('post_'):] if report_stage(path) == POST else file)
+                if key not in reports or report_stage(path) == POST:
+                    reports[key] = path
+    return sorted(reports.values())
+
+
+def _matches(value: str, pattern: str) -> bool:
+    if '%' in pattern:
+        return pattern.strip('%') in value
+    return value == pattern
+
+
+def walk_pairs(paths: list[str], data: str, condition: str) -> set[tuple[str, str, str]]:
+    """
+    (policy, left, right) of the contradiction pairs matching data and condition, from the reports at paths
+    """
+    found = set()
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            content = yaml.load(f, Loader=yaml.FullLoader)
+        if not isinstance(content, dict) or 'nodes' not in content:
+            continue
+        nodes = {}
+        for node in content['nodes'] + content.get('rule2', []):
+            nodes.setdefault(node['tuple'], node)
+
+        def match(node):
+            return node is not None and _matches(node['data'], data) and any(
+                _matches(c, condition) for c in condition_members(node.get('condition', 'any condition')))
+
+        for pair in content.get('contradictionPairs', []):
+            left, _, right = pair.partition(' vs ')
+            if match(nodes.get(left)) or match(nodes.get(right)):
+                found.add((content['basicInfo']['name'], left, right))
+    return found
+
+
+def bench(directory: str, queries: list[tuple[str, str]], db_path: str = None) -> pd.DataFrame:
+    paths = latest_reports(directory)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = db_path or os.path.join(tmp, 'results.db')
+        start = time.perf_counter()
+        with ResultStore(db_path) as store:
+            store.add_directory(directory)
+        import_ms = (time.perf_counter() - start) * 1000
+
+        rows = []
+        with ResultStore(db_path) as store:
+            for data, condition in queries:
+                start = time.perf_counter()
+                expected = walk_pairs(paths, data, condition)
+                walk_ms = (time.perf_counter() - start) * 1000
+                start = time.perf_counter()
+                result = store.pairs('contradiction', data=data, condition=condition)
+                store_ms = (time.perf_counter() - start) * 1000
+                found = {(r['policy'], r['left'], r['right']) for r in result}
+                rows.append({'data': data, 'condition': condition, 'pairs': len(found),
+                             'policies': len({p for p, _, _ in found}), 'walkMs': round(walk_ms, 3),
+                             'storeMs': round(store_ms, 3), 'identical': found == expected})
+
+    df = pd.DataFrame(rows)
+    print(df.to_string(index=False))
+    print(f"{len(paths)} reports imported once in {import_ms:.1f} ms; {len(df)} queries: "
+          f"{df['walkMs'].sum():.1f} ms walking the reports, {df['storeMs'].sum():.1f} ms on the store; "
+          f"identical: {int(df['identical'].sum())}/{len(df)}")
+    return df
+
+
+def parse_query(value: str) -> tuple[str, str]:
+    data, _, condition = value.partition(':')
+    return data, condition
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark corpus queries on the result store against the reports.")
+    parser.add_argument('--input', required=True, help='Directory of analysis YAML reports')
+    parser.add_argument('--query', action='append', type=parse_query, metavar='DATA:CONDITION',
+                        help='Contradictions on DATA under CONDITION (repeatable, %% wildcards)')
+    parser.add_argument('--db', help='Keep the result store at this path')
+    parser.add_argument('--output', help='Write the per-query numbers to this CSV file')
+    args = parser.parse_args()
+    result = bench(args.input, args.query or DEFAULT_QUERIES, args.db)
+    if args.output:
+        result.to_csv(args.output, index=False)
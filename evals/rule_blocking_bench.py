@@ -0,0 +1,111 @@
+import argparse
+import contextlib
+import io
+import os
+import re
+import sys
+import time
+
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import *
+from contradiction.blocking import BlockingIndex
+from contradiction.rule import apply_rule
+from node import CollectionNode
+from ontology.condition.handler import ConditionHandler
+from ontology.data.handler import DataHandler
+from ontology.entity.handler import EntityHandler
+
+"""
+Benchmark apply_rule with and without the blocking index (contradiction/blocking.py), and in vectorized mode
+(contradiction/vectorized.py).
+The collect / not-collect tuples of every app in a contradiction_pair.csv are replayed through apply_rule in every
+mode; the script reports the number of evaluated pairs and the time, and checks that all modes emit the same pairs
+and print the same counters. --merge replays all apps as a single large policy.
+"""
+
+TUPLE = re.compile(TUPLE_PATTERN)
+
+
+def load_tuples(csv_path: str) -> dict[str, tuple[list[CollectionNode], list[CollectionNode]]]:
+    """
+    {app: (pos nodes, neg nodes)} from the tuple1/tuple2 columns of a contradiction_pair.csv
+    """
+    df = pd.read_csv(csv_path, encoding='utf-8-sig')
+    apps = {}
+    for filename, group in df.groupby('filename', sort=True):
+        nodes = {}
+        for t in pd.concat([group['tuple1'], group['tuple2']]).drop_duplicates():
+            m = TUPLE.match(t)
+            if m:
+                nodes[t] = CollectionNode(*[x.strip() for x in m.groups()])
+        pos = [n for n in nodes.values() if 'not' not in n.verb]
+        neg = [n for n in nodes.values() if 'not' in n.verb]
+        apps[filename] = (pos, neg)
+    return apps
+
+
+MODES = {
+    'full': {'blocking': False},
+    'blocking': {'blocking': True},
+    'vectorized': {'vectorized': True},
+}
+
+
+def run(pos, neg, mode: str):
+    contradictions, narrowings = [], []
+    out = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(out):
+        ret = apply_rule(pos, neg, contradictions, narrowings, **MODES[mode])
+    return time.perf_counter() - start, (contradictions, narrowings, ret, out.getvalue())
+
+
+def bench(csv_path: str, repeat: int = 3, merge: bool = False):
+    EntityHandler.preload(entity_ontology_path, entity_relation_yml)
+    DataHandler.preload(data_ontology_path, data_relation_yml)
+    ConditionHandler.preload(condition_dir_path, condition_relation_yml)
+    apps = load_tuples(csv_path)
+    if merge:
+        apps = {'<all>': ([n for pos, _ in apps.values() for n in pos], [n for _, neg in apps.values() for n in neg])}
+
+    rows = []
+    for app, (pos, neg) in apps.items():
+        candidates = sum(len(BlockingIndex(neg).candidates(n)) for n in pos)
+        # the first run warms the recognition caches, which all modes share
+        expected = run(pos, neg, 'full')[1]
+        row = {
+            'app': app,
+            'pos': len(pos),
+            'neg': len(neg),
+            'productPairs': len(pos) * len(neg),
+            'blockedPairs': candidates,
+            'identical': True,
+        }
+        for mode in MODES:
+            row[f"{mode}Ms"] = round(min(run(pos, neg, mode)[0] for _ in range(repeat)) * 1000, 3)
+            row['identical'] &= run(pos, neg, mode)[1] == expected
+        rows.append(row)
+
+    df = pd.DataFrame(rows)
+    total = df[['productPairs', 'blockedPairs', 'fullMs', 'blockingMs', 'vectorizedMs']].sum()
+    print(f"{len(df)} apps, {int(total['productPairs'])} product pairs -> {int(total['blockedPairs'])} candidate pairs "
+          f"({total['blockedPairs'] / max(total['productPairs'], 1):.1%})")
+    print(f"apply_rule: {total['fullMs']:.1f} ms full product, {total['blockingMs']:.1f} ms with blocking, "
+          f"{total['vectorizedMs']:.1f} ms vectorized")
+    print(f"identical output: {int(df['identical'].sum())}/{len(df)} apps")
+    return df
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the evaluation modes of apply_rule.")
+    parser.add_argument('--input', default=os.path.join(PROJECT_ROOT, 'datasets', 'apps-PoliCond-DeepSeek',
+                                                        'contradiction', 'contradiction_pair.csv'))
+    parser.add_argument('--output', help='Write the per-app numbers to this CSV file')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--merge', action='store_true', help='Replay all apps as a single policy')
+    args = parser.parse_args()
+    result = bench(args.input, args.repeat, args.merge)
+    if args.output:
+        result.to_csv(args.output, index=False)
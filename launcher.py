@@ -3,6 +3,7 @@ import asyncio
 import time
 
 from config import *
+from pipeline.abstract_pipeline import RUN_MODE
 from pipeline.async_prompt_pipeline import AsyncPromptPipeline
 from pipeline.prompt_pipeline import PromptPipeline
 
@@ -15,7 +16,8 @@ async def main_async(
         filter_function=None,
         save_dir: str = None,
         api_key: str = None,
-        api_base_url: str = None
+        api_base_url: str = None,
+        run_mode: RUN_MODE = RUN_MODE.PROMPT_ONLY
 ):
     """
     Main function to execute the pipeline in batch or single mode asynchronously.
@@ -27,6 +29,7 @@ async def main_async(
         file_path (str, optional): Path to a single policy file. Required for single mode.
         filter_function (callable, optional): Function to filter files in batch mode.
         save_dir: The path to save the LLM's outputs.
+        run_mode: RUN_MODE.DEFAULT also analyzes the LLM's outputs as they arrive and writes analysis.yaml per policy.
     """
     if mode not in {InputMode.BATCH, InputMode.SINGLE,'single','batch'}:
         raise ValueError("Mode must be either 'batch' (InputMode.BATCH) or 'single'(InputMode.SINGLE) .")
@@ -60,6 +63,7 @@ async def main_async(
         mode=mode,
         api_key=api_key,
         api_base_url=api_base_url,
+        run_mode=run_mode,
     )
 
     start_time = time.time()
@@ -222,6 +226,13 @@ def parse_args():
         "--save-dir",
         help="Directory to save results (default: same as input directory)"
     )
+    parser.add_argument(
+        "--run-mode",
+        choices=[m.name.lower() for m in RUN_MODE],
+        default=RUN_MODE.PROMPT_ONLY.name.lower(),
+        help="default: also analyze the responses as they arrive and write analysis.yaml per policy; "
+             "analyze_only: analyze the analysis.jsonl of earlier runs (asynchronous mode only, default: %(default)s)"
+    )
 
     return parser.parse_args()
 
@@ -250,6 +261,9 @@ def run_from_args():
 
     # Determine execution type
     exec_type = ExecutionType.SYNC if args.sync else ExecutionType.ASYNC
+    run_mode = RUN_MODE[args.run_mode.upper()]
+    if exec_type == ExecutionType.SYNC and run_mode != RUN_MODE.PROMPT_ONLY:
+        print("--run-mode only applies to the asynchronous mode, running the prompts only.")
 
     # Determine input mode
     input_mode = determine_input_mode(args.inputs)
@@ -273,7 +287,8 @@ def run_from_args():
                     file_path=file_path,
                     save_dir=save_dir,
                     api_key=api_key,
-                    api_base_url=api_base_url
+                    api_base_url=api_base_url,
+                    run_mode=run_mode
                 )
             )
         else:
@@ -307,7 +322,8 @@ def run_from_args():
                     policy_dir=policy_dir,
                     save_dir=save_dir,
                     api_key=api_key,
-                    api_base_url=api_base_url
+                    api_base_url=api_base_url,
+                    run_mode=run_mode
                 )
             )
         else:
@@ -1,17 +1,123 @@
-from typing import Union
+import sys
+from types import MappingProxyType
+from typing import Optional, Union
 
 from ontology.condition.condition import Condition
+from ontology.condition.condition_set import ConditionSet
+from ontology.data.Data import Data
+from ontology.entity.Entity import Entity
+from ontology.terms import entity_concept, data_concept, condition_set
+
+_UNRESOLVED = object()
+_RESOLVED_SLOTS = ('_entity_concept', '_data_concept', '_condition_set')
+# extra of the nodes created without keyword arguments, read-only
+_NO_EXTRA = MappingProxyType({})
+
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+class SentenceTable:
+    """
+    Sentences and contexts of one policy, each stored once and referenced by its integer id
+    """
+    __slots__ = ('texts', 'ids')
+
+    def __init__(self):
+        self.texts: list[str] = []
+        self.ids: dict[str, int] = {}
+
+    def add(self, text: str) -> int:
+        idx = self.ids.get(text)
+        if idx is None:
+            idx = self.ids[text] = len(self.texts)
+            self.texts.append(text)
+        return idx
+
+    def __getitem__(self, idx: int) -> str:
+        return self.texts[idx]
+
+    def __len__(self) -> int:
+        return len(self.texts)
 
 
 class CollectionNode:
+    __slots__ = ('_entity', 'verb', '_data', '_condition', 'text', '_extra',
+                 '_entity_concept', '_data_concept', '_condition_set')
+
     def __init__(self, entity: str, verb: str, data: str, condition: Union[Condition,str], text: str = None, **kwargs):
         self.entity = entity
-        self.verb = verb
+        self.verb = _intern(verb)
         self.data = data
         self.condition = condition
         # The text.txt attribute is optional and can be used to store explanation information.
         self.text = text
-        self.extra = kwargs
+        self._extra = kwargs or None
+
+    @property
+    def extra(self) -> dict:
+        return self._extra if self._extra is not None else _NO_EXTRA
+
+    def __getstate__(self):
+        # the ontology resolutions are not pickled, the unpickled node resolves its terms again on first use
+        return {name: getattr(self, name) for cls in type(self).__mro__ for name in getattr(cls, '__slots__', ())
+                if name not in _RESOLVED_SLOTS and hasattr(self, name)}
+
+    def __setstate__(self, state: dict):
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
+        for name in _RESOLVED_SLOTS:
+            object.__setattr__(self, name, _UNRESOLVED)
+
+    # entity, data and condition carry their ontology resolution, computed on first use and reset on assignment
+    @property
+    def entity(self) -> str:
+        return self._entity
+
+    @entity.setter
+    def entity(self, value: str):
+        self._entity = _intern(value)
+        self._entity_concept = _UNRESOLVED
+
+    @property
+    def data(self) -> str:
+        return self._data
+
+    @data.setter
+    def data(self, value: str):
+        self._data = _intern(value)
+        self._data_concept = _UNRESOLVED
+
+    @property
+    def condition(self) -> Union[Condition, str]:
+        return self._condition
+
+    @condition.setter
+    def condition(self, value: Union[Condition, str]):
+        self._condition = value
+        self._condition_set = _UNRESOLVED
+
+    @property
+    def entity_concept(self) -> Optional[Entity]:
+        if self._entity_concept is _UNRESOLVED:
+            self._entity_concept = entity_concept(self._entity)
+        return self._entity_concept
+
+    @property
+    def data_concept(self) -> Optional[Data]:
+        """
+        Data concept with negation folded in, see ontology.terms.data_concept
+        """
+        if self._data_concept is _UNRESOLVED:
+            self._data_concept = data_concept(self._data)
+        return self._data_concept
+
+    @property
+    def condition_set(self) -> ConditionSet:
+        if self._condition_set is _UNRESOLVED:
+            self._condition_set = condition_set(self._condition)
+        return self._condition_set
 
     def __str__(self):
         """Return a string representation of the node."""
@@ -84,18 +190,41 @@ class CollectionNode:
 
 
 class CollectionNodeWithContext(CollectionNode):
+    """
+    The sentence and context are kept in the SentenceTable of the policy, shared by all its nodes
+    """
+    __slots__ = ('candidateEntity', 'candidateVerb', 'candidateData', 'candidateCondition',
+                 'sentences', 'sentence_id', 'context_id')
+
     def __init__(self, entity: str, verb: str, data: str, condition: Union[Condition,str],
                  candidateEntity: str,  candidateVerb: str,candidateData: str, candidateCondition: str,
                  sentence:str, context:str,
-                 text: str = None, **kwargs):
+                 text: str = None, sentences: Optional[SentenceTable] = None, **kwargs):
         super().__init__(entity, verb, data, condition, text, **kwargs)
         self.candidateEntity = candidateEntity
         self.candidateVerb = candidateVerb
         self.candidateData = candidateData
         self.candidateCondition = candidateCondition
+        self.sentences = sentences if sentences is not None else SentenceTable()
         self.sentence = sentence
         self.context = context
 
+    @property
+    def sentence(self) -> str:
+        return self.sentences[self.sentence_id]
+
+    @sentence.setter
+    def sentence(self, value: str):
+        self.sentence_id = self.sentences.add(value)
+
+    @property
+    def context(self) -> str:
+        return self.sentences[self.context_id]
+
+    @context.setter
+    def context(self, value: str):
+        self.context_id = self.sentences.add(value)
+
     def __str__(self):
         """Return a string representation of the node."""
         condition_str =  self.condition.name if isinstance(self.condition, Condition) else self.condition
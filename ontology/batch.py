@@ -0,0 +1,102 @@
+from typing import Callable, Iterable, NamedTuple, Optional
+
+import numpy as np
+
+try:
+    from scipy import sparse
+except ImportError:
+    sparse = None
+
+"""
+Batch recognition helpers shared by the ontology handlers.
+A batch of N strings is recognized into an N x K boolean incidence matrix, K being the number of concepts
+of the ontology, so that corpus-level statistics become column/row reductions instead of per-string calls.
+"""
+
+
+class Incidence(NamedTuple):
+    """
+    matrix[i, j] is True iff concepts[j] occurs in the i-th input string
+    """
+    matrix: object  # np.ndarray of bool, or scipy.sparse.csr_matrix when requested
+    concepts: list
+
+    def index_of(self, concept) -> int:
+        return self.concepts.index(concept)
+
+    def row(self, i: int) -> set:
+        """
+        The recognized concepts of the i-th string, same as the per-string API
+        """
+        values = self.matrix[i].toarray()[0] if sparse is not None and sparse.issparse(self.matrix) else self.matrix[i]
+        return {self.concepts[j] for j in np.flatnonzero(values)}
+
+    def counts(self) -> dict:
+        """
+        Number of strings in which every concept occurs (the coverage statistics of the ontology)
+        """
+        col_sums = np.asarray(self.matrix.sum(axis=0)).ravel()
+        return {concept: int(n) for concept, n in zip(self.concepts, col_sums)}
+
+
+def relation_matrix(concepts: list, is_lower: Callable) -> np.ndarray:
+    """
+    lower[i, j] is True iff concepts[i] is a subordinate of concepts[j]
+    """
+    k = len(concepts)
+    lower = np.zeros((k, k), dtype=bool)
+    for i, a in enumerate(concepts):
+        for j, b in enumerate(concepts):
+            if i != j and is_lower(a, b):
+                lower[i, j] = True
+    return lower
+
+
+def reduce_to_lower(matrix: np.ndarray, lower: np.ndarray) -> np.ndarray:
+    """
+    Bulk version of the recognize_as_lower_* reduction: drop every concept for which a subordinate
+    concept has been recognized in the same string.
+    """
+    dominated = (matrix.astype(np.int32) @ lower.astype(np.int32)) > 0
+    return matrix & ~dominated
+
+
+def build_incidence(strings: Iterable[str], recognize: Callable[[str], set], concepts: list,
+                    lower: Optional[np.ndarray] = None,
+                    overrides: Optional[Callable[[str], Optional[set]]] = None,
+                    as_sparse: bool = False) -> Incidence:
+    """
+    Recognize every distinct string once and scatter the results into an incidence matrix.
+    :param recognize: per-string recognizer, e.g. DataHandler.recognize_as_Data
+    :param lower: relation matrix from relation_matrix(), applies the lower-only reduction when given
+    :param overrides: per-string hook returning a final concept set that bypasses recognition and reduction
+    :param as_sparse: return a scipy CSR matrix instead of a dense NumPy array
+    """
+    strings = list(strings)
+    column = {concept: j for j, concept in enumerate(concepts)}
+    unique: dict[str, int] = {}
+    row_of = np.empty(len(strings), dtype=np.int64)
+    for i, s in enumerate(strings):
+        row_of[i] = unique.setdefault(s, len(unique))
+
+    recognized = np.zeros((len(unique), len(concepts)), dtype=bool)
+    fixed = np.zeros(len(unique), dtype=bool)
+    for s, u in unique.items():
+        found = overrides(s) if overrides else None
+        if found is not None:
+            fixed[u] = True
+        else:
+            found = recognize(s)
+        for concept in found:
+            recognized[u, column[concept]] = True
+
+    if lower is not None:
+        reduced = reduce_to_lower(recognized, lower)
+        recognized = np.where(fixed[:, None], recognized, reduced)
+
+    matrix = recognized[row_of]
+    if as_sparse:
+        if sparse is None:
+            raise ImportError("scipy is required for sparse incidence matrices")
+        matrix = sparse.csr_matrix(matrix)
+    return Incidence(matrix, list(concepts))
@@ -0,0 +1,192 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Callable, Optional
+
+from config import RECOGNITION_CACHE_SIZE, RECOGNITION_CACHE_TTL
+
+_MISSING = object()
+
+
+class RecognitionCache:
+    """
+    Bounded LRU cache with an optional TTL, used to memoize the recognition entry points of the ontology handlers.
+    It counts hits, misses, evictions (LRU capacity) and expirations (TTL) so that cache sizes can be tuned from data.
+    """
+
+    def __init__(self, name: str, maxsize: Optional[int] = RECOGNITION_CACHE_SIZE,
+                 ttl: Optional[float] = RECOGNITION_CACHE_TTL):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """
+        Return the cached value of key, or _MISSING if it is absent or expired
+        """
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return _MISSING
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return _MISSING
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value) -> None:
+        if self.maxsize is not None and self.maxsize <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            if self.maxsize is not None:
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+                    self.evictions += 1
+
+    def clear(self) -> None:
+        """
+        Drop all entries, the counters are kept
+        """
+        with self._lock:
+            self._data.clear()
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def configure(self, maxsize: Optional[int] = _MISSING, ttl: Optional[float] = _MISSING) -> None:
+        with self._lock:
+            if maxsize is not _MISSING:
+                self.maxsize = maxsize
+            if ttl is not _MISSING:
+                self.ttl = ttl
+            if self.maxsize is not None:
+                while len(self._data) > max(self.maxsize, 0):
+                    self._data.popitem(last=False)
+                    self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hitRate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def recognition_cache(func: Callable) -> Callable:
+    """
+    Memoize a handler classmethod in the handler's own RecognitionCache, keyed on the positional arguments.
+    Set results are copied on the way out, so that callers mutating them cannot corrupt the cache.
+    Usage:
+        @classmethod
+        @recognition_cache
+        def recognize_first(cls, input: str): ...
+    """
+    name = func.__name__
+
+    @wraps(func)
+    def wrapper(cls, *args):
+        cache = cls.get_cache(name)
+        value = cache.get(args)
+        if value is _MISSING:
+            value = func(cls, *args)
+            cache.put(args, value)
+        if isinstance(value, set):
+            return set(value)
+        return value
+
+    wrapper.cache_name = name
+    return wrapper
+
+
+class RecognitionCacheMixin:
+    """
+    Cache management API shared by DataHandler, EntityHandler and ConditionHandler.
+    Every handler class owns its caches, one per recognition entry point.
+    """
+
+    @classmethod
+    def _caches(cls) -> dict[str, RecognitionCache]:
+        # stored in the class __dict__ so that handlers never share caches through inheritance
+        if '_recognition_caches' not in cls.__dict__:
+            cls._recognition_caches = {}
+        return cls.__dict__['_recognition_caches']
+
+    @classmethod
+    def get_cache(cls, name: str) -> RecognitionCache:
+        caches = cls._caches()
+        cache = caches.get(name)
+        if cache is None:
+            cache = caches.setdefault(name, RecognitionCache(f"{cls.__name__}.{name}"))
+        return cache
+
+    @classmethod
+    def configure_cache(cls, maxsize: Optional[int] = _MISSING, ttl: Optional[float] = _MISSING,
+                        name: Optional[str] = None) -> None:
+        """
+        Change the size and/or TTL (in seconds) of one cache, or of all caches of this handler if name is None
+        """
+        names = [name] if name else [attr.cache_name for attr in cls._cached_entry_points()]
+        for n in names:
+            cls.get_cache(n).configure(maxsize=maxsize, ttl=ttl)
+
+    @classmethod
+    def cache_clear(cls) -> None:
+        """
+        Invalidate all recognition results and derived tables, called whenever the ontology is (re)loaded
+        """
+        for cache in cls._caches().values():
+            cache.clear()
+        if '_derived_tables' in cls.__dict__:
+            cls.__dict__['_derived_tables'].clear()
+
+    @classmethod
+    def derived(cls, name: str, factory: Callable):
+        """
+        Return a table computed from the loaded ontology (e.g. a relation matrix), building it on first use.
+        Derived tables are dropped together with the recognition caches when the ontology reloads.
+        """
+        if '_derived_tables' not in cls.__dict__:
+            cls._derived_tables = {}
+        tables = cls.__dict__['_derived_tables']
+        if name not in tables:
+            tables[name] = factory()
+        return tables[name]
+
+    @classmethod
+    def cache_stats(cls) -> dict[str, dict]:
+        """
+        Hit, miss and eviction counts of every recognition cache of this handler
+        """
+        return {attr.cache_name: cls.get_cache(attr.cache_name).stats() for attr in cls._cached_entry_points()}
+
+    @classmethod
+    def _cached_entry_points(cls) -> list:
+        ret = []
+        for attr in vars(cls).values():
+            func = getattr(attr, '__func__', attr)
+            if hasattr(func, 'cache_name'):
+                ret.append(func)
+        return ret
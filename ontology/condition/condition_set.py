@@ -0,0 +1,233 @@
+import threading
+from typing import Iterator, Optional, Union
+
+from ontology.condition.condition import Condition
+from ontology.condition.handler import ConditionHandler
+
+"""
+Canonical form of a (possibly composite) condition.
+A condition string such as "children and consent" is parsed once into a ConditionSet, an interned bitmask over the
+Condition members, with one extra bit for a part that matches no condition. The related/lower/higher relations of two
+condition sets are decided with bit operations on per-member tables precomputed from the condition lattice of the
+loaded ontology, and memoized per pair of masks, so comparing conditions never parses or matches strings.
+"""
+
+MEMBERS: tuple[Condition, ...] = tuple(Condition)
+BIT: dict[Condition, int] = {c: 1 << i for i, c in enumerate(MEMBERS)}
+# a part of a composite condition that matches no Condition, never related to anything
+UNKNOWN_BIT = 1 << len(MEMBERS)
+NO_COND_BIT = BIT[Condition.NO_COND]
+
+
+def _bits(mask: int) -> Iterator[int]:
+    while mask:
+        low = mask & -mask
+        yield low
+        mask ^= low
+
+
+class _Lattice:
+    """
+    Per-member masks of the condition hierarchy: below[b] is the mask of the members lower than the member of bit b,
+    above[b] of those higher, related[b] of those equal, lower or higher
+    """
+
+    def __init__(self):
+        self.below: dict[int, int] = {UNKNOWN_BIT: 0}
+        self.above: dict[int, int] = {UNKNOWN_BIT: 0}
+        self.related: dict[int, int] = {UNKNOWN_BIT: 0}
+        for c1 in MEMBERS:
+            below = above = 0
+            for c2 in MEMBERS:
+                if ConditionHandler.is_lower(c2, c1):
+                    below |= BIT[c2]
+                if ConditionHandler.is_higher(c2, c1):
+                    above |= BIT[c2]
+            self.below[BIT[c1]] = below
+            self.above[BIT[c1]] = above
+            self.related[BIT[c1]] = BIT[c1] | below | above
+        self.memo: dict[tuple[str, int, int], bool] = {}
+
+
+def _lattice() -> _Lattice:
+    return ConditionHandler.derived('condition_lattice', _Lattice)
+
+
+class ConditionSet:
+    """
+    Usage:
+        cs = ConditionSet.parse("children and consent")
+        cs.lower(ConditionSet.parse("children"))  # True, the composite is more strict
+    Instances are interned: equal sets are the same object.
+    """
+    __slots__ = ('mask', 'size', '__weakref__')
+    _interned: dict[int, 'ConditionSet'] = {}
+    _intern_lock = threading.Lock()
+
+    def __new__(cls, mask: int = 0):
+        cs = cls._interned.get(mask)
+        if cs is None:
+            with cls._intern_lock:
+                cs = cls._interned.get(mask)
+                if cs is None:
+                    cs = object.__new__(cls)
+                    object.__setattr__(cs, 'mask', mask)
+                    object.__setattr__(cs, 'size', bin(mask).count('1'))
+                    cls._interned[mask] = cs
+        return cs
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ConditionSet is immutable")
+
+    def __reduce__(self):
+        return ConditionSet, (self.mask,)
+
+    @classmethod
+    def of(cls, conditions) -> 'ConditionSet':
+        """
+        ConditionSet of an iterable of Condition members, None standing for an unrecognized part
+        """
+        mask = 0
+        for c in conditions:
+            mask |= BIT[c] if c is not None else UNKNOWN_BIT
+        return cls(mask)
+
+    @classmethod
+    def parse(cls, condition: Union[str, Condition, 'ConditionSet']) -> 'ConditionSet':
+        """
+        Split a condition string on "and" and recognize the first condition of every part; NO_COND is dropped from
+        composites. The result is memoized per string for the loaded ontology.
+        """
+        if isinstance(condition, ConditionSet):
+            return condition
+        if isinstance(condition, Condition):
+            return cls(BIT[condition])
+        parsed = ConditionHandler.derived('condition_sets', dict)
+        cs = parsed.get(condition)
+        if cs is None:
+            parts = condition.split("and") if "and" in condition else [condition]
+            mask = 0
+            for part in parts:
+                c = ConditionHandler.recognize_first(part)
+                mask |= BIT[c] if c is not None else UNKNOWN_BIT
+            # NO_COND cannot coexist with other conditions
+            if mask & NO_COND_BIT and mask != NO_COND_BIT:
+                mask ^= NO_COND_BIT
+            cs = parsed[condition] = cls(mask)
+        return cs
+
+    @classmethod
+    def recognize(cls, text: str) -> 'ConditionSet':
+        """
+        The most specific conditions found anywhere in text, see ConditionHandler.recognize_as_lower_Condition.
+        Memoized per text for the loaded ontology.
+        """
+        recognized = ConditionHandler.derived('recognized_condition_sets', dict)
+        cs = recognized.get(text)
+        if cs is None:
+            cs = recognized[text] = cls.of(ConditionHandler.recognize_as_lower_Condition(text))
+        return cs
+
+    def join(self) -> str:
+        """
+        Condition string of the set, "a and b" with the members in canonical (Condition declaration) order
+        """
+        return ' and '.join(c.value for c in self if c is not None)
+
+    def __iter__(self) -> Iterator[Optional[Condition]]:
+        for b in _bits(self.mask):
+            yield None if b == UNKNOWN_BIT else MEMBERS[b.bit_length() - 1]
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __contains__(self, condition: Optional[Condition]) -> bool:
+        return bool(self.mask & (BIT[condition] if condition is not None else UNKNOWN_BIT))
+
+    def __eq__(self, other):
+        if isinstance(other, ConditionSet):
+            return self.mask == other.mask
+        if isinstance(other, (set, frozenset)):
+            return set(self) == other
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.mask)
+
+    def __le__(self, other: 'ConditionSet') -> bool:
+        return self.mask & ~other.mask == 0
+
+    def __or__(self, other: 'ConditionSet') -> 'ConditionSet':
+        return ConditionSet(self.mask | other.mask)
+
+    def __and__(self, other: 'ConditionSet') -> 'ConditionSet':
+        return ConditionSet(self.mask & other.mask)
+
+    def __sub__(self, other: 'ConditionSet') -> 'ConditionSet':
+        return ConditionSet(self.mask & ~other.mask)
+
+    def __repr__(self):
+        return f"ConditionSet({', '.join(map(str, self))})"
+
+    def issubset(self, other: 'ConditionSet') -> bool:
+        return self <= other
+
+    def related(self, other: 'ConditionSet') -> bool:
+        """
+        Every condition of the smaller set is related to some condition of the larger one
+        """
+        lattice = _lattice()
+        key = ('related', self.mask, other.mask)
+        found = lattice.memo.get(key)
+        if found is None:
+            more, less = (self, other) if self.size >= other.size else (other, self)
+            found = lattice.memo[key] = all(lattice.related[b] & more.mask for b in _bits(less.mask))
+        return found
+
+    def lower(self, other: 'ConditionSet') -> bool:
+        """
+        self is more strict than other: composite(children, consent) < consent
+        """
+        lattice = _lattice()
+        key = ('lower', self.mask, other.mask)
+        found = lattice.memo.get(key)
+        if found is None:
+            if self.size == other.size == 1:
+                found = bool(lattice.below[other.mask] & self.mask)
+            elif other <= self and self is not other:
+                found = True
+            elif self.size >= other.size:
+                # number of (c1, c2) pairs with c1 lower than c2
+                pairs = sum(bin(lattice.below[b] & self.mask).count('1') for b in _bits(other.mask))
+                found = pairs == other.size
+            else:
+                found = False
+            lattice.memo[key] = found
+        return found
+
+    def higher(self, other: 'ConditionSet') -> bool:
+        """
+        self is less strict than other
+        """
+        lattice = _lattice()
+        key = ('higher', self.mask, other.mask)
+        found = lattice.memo.get(key)
+        if found is None:
+            if self.size == other.size == 1:
+                found = bool(lattice.above[other.mask] & self.mask)
+            elif self <= other and self is not other:
+                found = True
+            elif self.size <= other.size:
+                # number of (c1, c2) pairs with c1 higher than c2
+                pairs = sum(bin(lattice.below[b] & other.mask).count('1') for b in _bits(self.mask))
+                found = pairs == self.size
+            else:
+                found = False
+            lattice.memo[key] = found
+        return found
+
+    def lower_than(self, condition: Condition) -> 'ConditionSet':
+        """
+        The conditions of the set that are lower than condition
+        """
+        return ConditionSet(_lattice().below[BIT[condition]] & self.mask)
@@ -1,11 +1,14 @@
 import re
-from collections import deque
-from functools import lru_cache
 from itertools import combinations
-from typing import Union, Optional
+from typing import Union, Optional, Iterable
 import os
 import yaml
 
+from ontology.batch import Incidence, build_incidence, relation_matrix
+from ontology.cache import RecognitionCacheMixin, recognition_cache
+from ontology.profiler import compile_pattern
+from ontology.snapshot import OntologySnapshot, SnapshotMixin, transitive_closure
+
 try:
     from .condition import Condition
     from .dto import ConditionDTO
@@ -20,7 +23,7 @@ except ImportError:
     
 
 
-class ConditionHandler:
+class ConditionHandler(SnapshotMixin, RecognitionCacheMixin):
     expressions: dict[Condition, list] = {}
     reversed_expr: dict[str, Condition] = {}
     synonyms: dict[Condition, list[str]] = {}
@@ -35,15 +38,15 @@ class ConditionHandler:
         """
         Preload condition definitions and relations
         """
-        cls.load_definitions(dir_path)
-        cls.load_relations(relation)
-        return cls
+        return cls.install(OntologySnapshot(**cls.load_definitions(dir_path), **cls.load_relations(relation)))
 
     @classmethod
-    def load_definitions(cls, dir_path: str) -> None:
+    def load_definitions(cls, dir_path: str) -> dict:
         """
-        Load YAML definition files from directory
+        Load YAML definition files from directory, returns the pattern and synonym tables of a snapshot
         """
+        expressions, reversed_expr, compiled_expr = {}, {}, {}
+        synonyms, reversed_syns, compiled_syns = {}, {}, {}
         files = os.listdir(dir_path)
         yaml_files = [f for f in files if f.endswith('.yaml') or f.endswith('.yml')]
         
@@ -63,79 +66,60 @@ class ConditionHandler:
                 
                 # Load patterns
                 if 'patterns' in item and item['patterns']:
-                    cls.expressions[condition] = [pattern.lower() for pattern in item['patterns']]
-                    for pattern in cls.expressions[condition]:
-                        cls.reversed_expr[pattern] = condition
+                    expressions[condition] = [pattern.lower() for pattern in item['patterns']]
+                    for pattern in expressions[condition]:
+                        reversed_expr[pattern] = condition
                         try:
-                            cls.compiled_expr[pattern] = re.compile(pattern, re.IGNORECASE)
+                            compiled_expr[pattern] = compile_pattern(cls, pattern, re.IGNORECASE)
                         except re.error as e:
                             print(f"Warning: Invalid regex pattern '{pattern}' in {file}: {e}")
                 
                 # Load synonyms
                 if 'synonym' in item and item['synonym']:
-                    cls.synonyms[condition] = [syn.lower() for syn in item['synonym']]
-                    for synonym in cls.synonyms[condition]:
-                        cls.reversed_syns[synonym] = condition
+                    synonyms[condition] = [syn.lower() for syn in item['synonym']]
+                    for synonym in synonyms[condition]:
+                        reversed_syns[synonym] = condition
                         try:
                             # Escape special characters for exact matching
                             escaped_syn = re.escape(synonym)
-                            cls.compiled_syns[synonym] = re.compile(f"\\b{escaped_syn}\\b", re.IGNORECASE)
+                            compiled_syns[synonym] = compile_pattern(cls, f"\\b{escaped_syn}\\b", re.IGNORECASE,
+                                                                   key=synonym, kind='compiled_syns')
                         except re.error as e:
                             print(f"Warning: Invalid synonym pattern '{synonym}' in {file}: {e}")
                             
             except Exception as e:
                 print(f"Error loading {file}: {e}")
+        return {'expressions': expressions, 'reversed_expr': reversed_expr, 'compiled_expr': compiled_expr,
+                'synonyms': synonyms, 'reversed_syns': reversed_syns, 'compiled_syns': compiled_syns}
 
     @classmethod
-    def load_relations(cls, relation_yaml_path: str) -> None:
+    def load_relations(cls, relation_yaml_path: str) -> dict:
         """
-        Load relation.yml for condition hierarchy
+        Load relation.yml for condition hierarchy, returns the transitively closed sub_mapping table of a snapshot
         """
+        sub_mapping = {}
         try:
             with open(relation_yaml_path, 'r', encoding='utf-8') as file:
                 content = yaml.safe_load(file)
                 
                 if not content:
                     print(f"Warning: Empty relation file {relation_yaml_path}")
-                    return
+                    return {'sub_mapping': sub_mapping}
                 
                 for edge in content:
                     try:
                         src, tgt = edge['source'].lower(), edge['target'].lower()
                         src_, tgt_ = Condition(src), Condition(tgt)
                         if src_ and tgt_:
-                            if src_ not in cls.sub_mapping:
-                                cls.sub_mapping[src_] = []
-                            cls.sub_mapping[src_].append(tgt_)
+                            if src_ not in sub_mapping:
+                                sub_mapping[src_] = []
+                            sub_mapping[src_].append(tgt_)
                     except Exception as e:
                         print(f"Error parsing edge {edge}: {e}")
 
-            # Compute transitive closure
-            cls.closure()
-            
         except Exception as e:
             print(f"Error loading condition relation map from {relation_yaml_path}: {e}")
-
-    @classmethod
-    def closure(cls):
-        """
-        Compute transitive closure of the relation
-        """
-        for src in list(cls.sub_mapping.keys()):
-            visited = set()
-            queue = deque(cls.sub_mapping[src][:])  # Copy the list
-            
-            while queue:
-                tgt = queue.popleft()
-                if tgt not in visited:
-                    visited.add(tgt)
-                    if tgt not in cls.sub_mapping[src]:
-                        cls.sub_mapping[src].append(tgt)
-                    if tgt in cls.sub_mapping:
-                        queue.extend(cls.sub_mapping[tgt])
-
-            # Remove duplicates
-            cls.sub_mapping[src] = list(set(cls.sub_mapping[src]))
+        return {'sub_mapping': transitive_closure(sub_mapping)}
 
     @classmethod
     def is_lower(cls, data1: Union[Condition, str], data2: Union[Condition, str]) -> bool:
@@ -175,64 +159,70 @@ class ConditionHandler:
         return data1 == data2 or cls.is_lower(data1, data2) or cls.is_higher(data1, data2)
 
     @classmethod
+    @recognition_cache
     def recognize_first(cls, input_text: str) -> Optional[Condition]:
         """
         Recognize the first matching condition from input text
         """
+        snapshot = cls.snapshot()
         input_text = input_text.lower()
         
         # Check patterns first
-        for pattern, condition in cls.reversed_expr.items():
-            if cls.compiled_expr[pattern].search(input_text):
+        for pattern, condition in snapshot.reversed_expr.items():
+            if snapshot.compiled_expr[pattern].search(input_text):
                 return condition
         
         # Check synonyms
-        for synonym, condition in cls.reversed_syns.items():
-            if cls.compiled_syns[synonym].search(input_text):
+        for synonym, condition in snapshot.reversed_syns.items():
+            if snapshot.compiled_syns[synonym].search(input_text):
                 return condition
                 
         return None
 
     @classmethod
+    @recognition_cache
     def recognize_origin(cls, input_text: str) -> set[str]:
         """
         Recognize the original expression of the condition
         """
+        snapshot = cls.snapshot()
         input_text = input_text.lower()
         ret = set()
         
-        for pattern in cls.compiled_expr:
-            match = cls.compiled_expr[pattern].search(input_text)
+        for pattern in snapshot.compiled_expr:
+            match = snapshot.compiled_expr[pattern].search(input_text)
             if match:
                 ret.add(match.group())
         
-        for synonym in cls.compiled_syns:
-            match = cls.compiled_syns[synonym].search(input_text)
+        for synonym in snapshot.compiled_syns:
+            match = snapshot.compiled_syns[synonym].search(input_text)
             if match:
                 ret.add(match.group())
                 
         return ret
 
     @classmethod
+    @recognition_cache
     def recognize_as_Condition(cls, input_text: str) -> set[Condition]:
         """
         Recognize all matching conditions from input text
         """
+        snapshot = cls.snapshot()
         ret = set()
         input_text = input_text.lower()
         
-        for pattern, condition in cls.reversed_expr.items():
-            if cls.compiled_expr[pattern].search(input_text):
+        for pattern, condition in snapshot.reversed_expr.items():
+            if snapshot.compiled_expr[pattern].search(input_text):
                 ret.add(condition)
         
-        for synonym, condition in cls.reversed_syns.items():
-            if cls.compiled_syns[synonym].search(input_text):
+        for synonym, condition in snapshot.reversed_syns.items():
+            if snapshot.compiled_syns[synonym].search(input_text):
                 ret.add(condition)
                 
         return ret
 
     @classmethod
-    @lru_cache(maxsize=300)
+    @recognition_cache
     def recognize_as_lower_Condition(cls, input_text: str) -> set[Condition]:
         """
         Recognize conditions and return only the most specific ones (lower in hierarchy)
@@ -249,21 +239,22 @@ class ConditionHandler:
         return candidates - to_remove
 
     @classmethod
-    @lru_cache(maxsize=300)
+    @recognition_cache
     def recognize_as_lower_ConditionDTO(cls, input_text: str) -> set[ConditionDTO]:
         """
         Recognize conditions as DTOs and return only the most specific ones
         """
+        snapshot = cls.snapshot()
         ret = set()
         input_text_lower = input_text.lower()
         
-        for pattern, condition in cls.reversed_expr.items():
-            match = cls.compiled_expr[pattern].search(input_text_lower)
+        for pattern, condition in snapshot.reversed_expr.items():
+            match = snapshot.compiled_expr[pattern].search(input_text_lower)
             if match:
                 ret.add(ConditionDTO(condition, match.group()))
 
-        for synonym, condition in cls.reversed_syns.items():
-            match = cls.compiled_syns[synonym].search(input_text_lower)
+        for synonym, condition in snapshot.reversed_syns.items():
+            match = snapshot.compiled_syns[synonym].search(input_text_lower)
             if match:
                 ret.add(ConditionDTO(condition, match.group()))
 
@@ -277,24 +268,37 @@ class ConditionHandler:
 
         return ret - to_remove
 
+    @classmethod
+    def recognize_many(cls, inputs: Iterable[str], lower: bool = False, as_sparse: bool = False) -> Incidence:
+        """
+        Batch version of recognize_as_Condition (or recognize_as_lower_Condition if lower=True):
+        returns a len(inputs) x len(Condition) boolean incidence matrix and its concept index
+        """
+        concepts = list(Condition)
+        lower_matrix = None
+        if lower:
+            lower_matrix = cls.derived('lower_matrix', lambda: relation_matrix(concepts, cls.is_lower))
+        return build_incidence(inputs, cls.recognize_as_Condition, concepts, lower_matrix, as_sparse=as_sparse)
+
     @classmethod
     def is_which_condition(cls, input_text: str, which_cond: Condition) -> bool:
         """
         Check if input text matches a specific condition
         """
+        snapshot = cls.snapshot()
         try:
             input_text = input_text.lower()
             
             # Check patterns
-            if which_cond in cls.expressions:
-                for pattern in cls.expressions[which_cond]:
-                    if cls.compiled_expr[pattern].search(input_text):
+            if which_cond in snapshot.expressions:
+                for pattern in snapshot.expressions[which_cond]:
+                    if snapshot.compiled_expr[pattern].search(input_text):
                         return True
             
             # Check synonyms
-            if which_cond in cls.synonyms:
-                for synonym in cls.synonyms[which_cond]:
-                    if cls.compiled_syns[synonym].search(input_text):
+            if which_cond in snapshot.synonyms:
+                for synonym in snapshot.synonyms[which_cond]:
+                    if snapshot.compiled_syns[synonym].search(input_text):
                         return True
                         
             return False
@@ -307,21 +311,22 @@ class ConditionHandler:
         """
         Find all expressions of a specific condition in input text
         """
+        snapshot = cls.snapshot()
         ret = set()
         try:
             input_text = input_text.lower()
             
             # Check patterns
-            if which_cond in cls.expressions:
-                for pattern in cls.expressions[which_cond]:
-                    matches = cls.compiled_expr[pattern].findall(input_text)
+            if which_cond in snapshot.expressions:
+                for pattern in snapshot.expressions[which_cond]:
+                    matches = snapshot.compiled_expr[pattern].findall(input_text)
                     for match in matches:
                         ret.add(ConditionDTO(which_cond, match))
 
             # Check synonyms
-            if which_cond in cls.synonyms:
-                for synonym in cls.synonyms[which_cond]:
-                    if cls.compiled_syns[synonym].search(input_text):
+            if which_cond in snapshot.synonyms:
+                for synonym in snapshot.synonyms[which_cond]:
+                    if snapshot.compiled_syns[synonym].search(input_text):
                         ret.add(ConditionDTO(which_cond, synonym))
                         
         except Exception as e:
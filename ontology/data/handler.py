@@ -1,9 +1,12 @@
 import re
-from collections import deque
-from functools import lru_cache
 from itertools import combinations
-from typing import Union, Optional
+from typing import Union, Optional, Iterable
 
+from ontology.batch import Incidence, build_incidence, relation_matrix
+from ontology.cache import RecognitionCacheMixin, recognition_cache
+from ontology.fuzzy import resolve_fuzzy
+from ontology.profiler import compile_pattern
+from ontology.snapshot import OntologySnapshot, SnapshotMixin, transitive_closure
 from ontology.data.Data import Data
 import yaml
 
@@ -11,7 +14,63 @@ path1 = r'.\data_ontology.yml'
 path2 = r'.\relation.yml'
 NON_PERSONAL=[Data.PSEUDONYMOUS.value,Data.AGGRAGATE.value,Data.ANONYMOUS.value,
             Data.NON_PERSONAL_INFO.value]
-class DataHandler:
+# exact terms (mostly truncated LLM outputs) that recognize_as_Data resolves directly, without regex matching
+DATA_ALIASES: dict[str, set[Data]] = {
+    'advertising identifier': {Data.ADVERTISING_ID},
+    'cookie': {Data.COOKIE},
+    'cookies': {Data.COOKIE},
+    'email address': {Data.EMAIL},
+    'email_addre': {Data.EMAIL},
+    'ip addre': {Data.IP_ADDRESS},
+    'ip address': {Data.IP_ADDRESS},
+    'ip_addre': {Data.IP_ADDRESS},
+    'mac address': {Data.MAC_ADDRESS},
+    'mac_addre': {Data.MAC_ADDRESS},
+    'sim serial number': {Data.SIM_SERIAL_NUMBER},
+    'account': {Data.ACCOUNT},
+    'account_name': {Data.ACCOUNT},
+    'device': {Data.DEVICE},
+    'device information': {Data.DEVICE},
+    'addre': {Data.ADDRESS},
+    'application': {Data.APPLICATION},
+    'ensitive_info': {Data.SENSITIVE_INFO},
+    'oftware_identifier': {Data.SOFTWARE_IDENTIFIER},
+    'anonymou': {Data.ANONYMOUS},
+    'gender': {Data.GENDER},
+    'wifi': {Data.WIFI},
+    'operating system': {Data.OS},
+    'race': {Data.RACE},
+    'id_card': {Data.ID_CARD},
+    'passport': {Data.PASSPORT},
+    'pseudonymou': {Data.PSEUDONYMOUS},
+    'demographic_data': {Data.AGGRAGATE},
+    'demographic data': {Data.AGGRAGATE},
+    'demographic information': {Data.AGGRAGATE},
+    **{term: {Data.PROTECTED_INFORMATION} for term in [
+        'card detail', 'payment data', 'payment_card_info', 'payment_info', 'credit_card_number',
+        'debit_card_number', 'education_information', 'employment_information', 'financial_information',
+        'health_information', 'health_insurance_information', 'health_medical_information',
+        'insurance_policy_number', 'purchase_history', 'credit_card_info', 'credit_card_information',
+        'debit_card_info', 'payment_data']},
+}
+# short terms that recognize_as_lower_Data resolves directly, without regex matching and reduction
+LOWER_DATA_ALIASES: dict[str, Data] = {
+    'os': Data.OS,
+    'anonymous': Data.ANONYMOUS,
+    'security': Data.SECURITY,
+    'sex': Data.GENDER,
+    'fraud_data': Data.NON_PERSONAL_INFO,
+    'disability': Data.PROTECTED_INFORMATION,
+    'physical_description': Data.PROTECTED_INFORMATION,
+    'marital_status': Data.PROTECTED_INFORMATION,
+    'medical_condition': Data.PROTECTED_INFORMATION,
+    'medical_history': Data.PROTECTED_INFORMATION,
+    'navigation': Data.INTERNET_ACTIVITY,
+    'browsing': Data.INTERNET_ACTIVITY,
+    'interaction': Data.INTERNET_ACTIVITY,
+    'engagement': Data.INTERNET_ACTIVITY,
+}
+class DataHandler(SnapshotMixin, RecognitionCacheMixin):
     expressions: dict[Data, list[str]] = {}
     reversed_expr: dict[str, Data] = {}
     sub_mapping: dict[str, list[str]] = {}
@@ -19,28 +78,30 @@ class DataHandler:
 
     @classmethod
     def preload(cls, ontology:str,relation: str):
-        cls.load_data_ontology(ontology)
-        cls.load_relations(relation)
+        cls.install(OntologySnapshot(**cls.load_data_ontology(ontology), **cls.load_relations(relation)))
 
     @classmethod
-    def load_data_ontology(cls, filepath: str) -> None:
+    def load_data_ontology(cls, filepath: str) -> dict:
         """
-        load data_ontology.yml 
+        load data_ontology.yml, returns the pattern tables of a snapshot
         """
+        expressions, reversed_expr, compiled_expr = {}, {}, {}
         with open(filepath, 'r', encoding='utf-8') as file:
             data = yaml.safe_load(file)
         for item in data:
             dataItem = Data(item['name'].lower())
-            cls.expressions[dataItem] = list(map(lambda x: x.lower(), item['patterns']))
-            for pattern in cls.expressions[dataItem]:
-                cls.reversed_expr[pattern] = dataItem
-                cls.compiled_expr[pattern] = re.compile(pattern)
+            expressions[dataItem] = list(map(lambda x: x.lower(), item['patterns']))
+            for pattern in expressions[dataItem]:
+                reversed_expr[pattern] = dataItem
+                compiled_expr[pattern] = compile_pattern(cls, pattern)
+        return {'expressions': expressions, 'reversed_expr': reversed_expr, 'compiled_expr': compiled_expr}
 
     @classmethod
-    def load_relations(cls, relation_yaml_path: str) -> None:
+    def load_relations(cls, relation_yaml_path: str) -> dict:
         """
-        load relation.yml 
+        load relation.yml, returns the transitively closed sub_mapping table of a snapshot
         """
+        sub_mapping = {}
         try:
             with open(relation_yaml_path, 'r', encoding='utf-8') as file:
                 content = yaml.safe_load(file)
@@ -49,35 +110,13 @@ class DataHandler:
                         src, tgt = edge['source'].lower(), edge['target'].lower()
                         src_, tgt_ = Data(src), Data(tgt)
                         if src_ and tgt_:
-                            cls.sub_mapping[src] = cls.sub_mapping.get(src, []) + [tgt]
+                            sub_mapping[src] = sub_mapping.get(src, []) + [tgt]
                     except Exception as e:
                         print(
                             f"Error parsing ({src},{tgt}) loading condition relation map from {relation_yaml_path}: {e}")
-
-            # transitive closure
-            cls.closure()
         except Exception as e:
             print(f"Error loading condition relation map from {relation_yaml_path}: {e}")
-
-    @classmethod
-    def closure(cls):
-        """
-        transitive closure
-        """
-        for src in list(cls.sub_mapping.keys()):
-            visited = set()
-            queue = deque(cls.sub_mapping[src])
-            while queue:
-                tgt = queue.popleft()
-                if tgt not in visited:
-                    visited.add(tgt)
-                    if tgt not in cls.sub_mapping[src]:
-                        cls.sub_mapping[src].append(tgt)
-                    if tgt in cls.sub_mapping:
-                        queue.extend(cls.sub_mapping[tgt])
-
-            # deduplicate
-            cls.sub_mapping[src] = list(set(cls.sub_mapping[src]))
+        return {'sub_mapping': transitive_closure(sub_mapping)}
 
     @classmethod
     def is_lower(cls, data1: Union[Data, str], data2: Union[Data, str]) -> bool:
@@ -141,100 +180,57 @@ class DataHandler:
         return DataHandler.is_related(data1, data2)
 
     @classmethod
+    @recognition_cache
     def recognize_first(cls, input: str) -> Optional[Data]:
-        for expr in cls.compiled_expr:
-            if cls.compiled_expr[expr].search(input):
-                return cls.reversed_expr[expr]
-        return None
+        snapshot = cls.snapshot()
+        for expr, compiled in snapshot.compiled_expr.items():
+            if compiled.search(input):
+                return snapshot.reversed_expr[expr]
+        return cls.resolve_fuzzy(input)
 
     @classmethod
+    @recognition_cache
+    def resolve_fuzzy(cls, input: str) -> Optional[Data]:
+        """
+        approximate lookup of a term no regex matches, e.g. the truncated LLM output 'oftware_identifier'
+        """
+        return resolve_fuzzy(cls, Data, DATA_ALIASES, input)
+
+    @classmethod
+    @recognition_cache
     def recognize_origin(cls, input: str) -> set[str]:
         """
         recognize the original string of data
         """
         ret = set()
-        for expr in cls.compiled_expr:
-            matcher = cls.compiled_expr[expr].search(input)
+        for compiled in cls.snapshot().compiled_expr.values():
+            matcher = compiled.search(input)
             if matcher:
                 ret.add(matcher.group())
         return ret
 
     @classmethod
-    @lru_cache(maxsize=300)
+    @recognition_cache
     def recognize_as_Data(cls, input: str) -> set[Data]:
-        if input == 'advertising identifier':
-            return {Data.ADVERTISING_ID}
-        elif input == 'cookie' or input == 'cookies':
-            return {Data.COOKIE}
-        elif input in ['email address', 'email_addre']:
-            return {Data.EMAIL}
-        elif input in ["ip addre", "ip address", 'ip_addre']:
-            return {Data.IP_ADDRESS}
-        elif input in ["mac address","mac_addre"]:
-            return {Data.MAC_ADDRESS}
-        elif input == "sim serial number":
-            return {Data.SIM_SERIAL_NUMBER}
-        elif input in ["account",'account_name']:
-            return {Data.ACCOUNT}
-        elif input in ["device","device information"]:
-            return {Data.DEVICE}
-        elif input == "addre":
-            return {Data.ADDRESS}
-        elif input == "application":
-            return {Data.APPLICATION}
-        elif input == 'ensitive_info':
-            return {Data.SENSITIVE_INFO}
-        elif input == 'oftware_identifier':
-            return {Data.SOFTWARE_IDENTIFIER}
-        elif input == 'anonymou':
-            return {Data.ANONYMOUS}
-        elif input == 'gender':
-            return {Data.GENDER}
-        elif input == 'wifi':
-            return {Data.WIFI}
-        elif input == 'operating system':
-            return {Data.OS}
-        elif input == 'race':
-            return {Data.RACE}
-        elif input == 'id_card':
-            return {Data.ID_CARD}
-        elif input == 'passport':
-            return {Data.PASSPORT}
-        elif input == 'pseudonymou':
-            return {Data.PSEUDONYMOUS}
-        elif input in ['demographic_data', 'demographic data','demographic information']:
-            return {Data.AGGRAGATE}
-        elif input in ['card detail','payment data','payment_card_info','payment_info','credit_card_number',
-                'debit_card_number','education_information','employment_information','financial_information',
-            'health_information','health_insurance_information','health_medical_information','insurance_policy_number',
-                       'purchase_history','credit_card_info','credit_card_information','debit_card_info','payment_data']:
-            return {Data.PROTECTED_INFORMATION}
-
+        if input in DATA_ALIASES:
+            return set(DATA_ALIASES[input])
 
         ret = set()
-        for expr in cls.compiled_expr:
-            if cls.compiled_expr[expr].search(input):
-                ret.add(cls.reversed_expr[expr])
-
+        snapshot = cls.snapshot()
+        for expr, compiled in snapshot.compiled_expr.items():
+            if compiled.search(input):
+                ret.add(snapshot.reversed_expr[expr])
+        if not ret:
+            fuzzy = cls.resolve_fuzzy(input)
+            if fuzzy is not None:
+                ret.add(fuzzy)
         return ret
 
     @classmethod
+    @recognition_cache
     def recognize_as_lower_Data(cls, input: str) -> set[Data]:
-        if input in ['os']:
-            return {Data.OS}
-        elif input in ['anonymous']:
-            return {Data.ANONYMOUS}
-        elif input in ['security']:
-            return {Data.SECURITY}
-        elif input in ['sex']:
-            return {Data.GENDER}
-        elif input in ['fraud_data']:
-            return {Data.NON_PERSONAL_INFO}
-        elif input in ['disability','physical_description','marital_status','medical_condition','medical_history',]:
-            return {Data.PROTECTED_INFORMATION}
-        elif input in ['navigation','browsing','interaction','engagement']:
-            return {Data.INTERNET_ACTIVITY}
-
+        if input in LOWER_DATA_ALIASES:
+            return {LOWER_DATA_ALIASES[input]}
 
         candidates = cls.recognize_as_Data(input)
         to_remove = set()
@@ -245,6 +241,20 @@ class DataHandler:
                 to_remove.add(a)
         return candidates - to_remove
 
+    @classmethod
+    def recognize_many(cls, inputs: Iterable[str], lower: bool = False, as_sparse: bool = False) -> Incidence:
+        """
+        Batch version of recognize_as_Data (or recognize_as_lower_Data if lower=True):
+        returns a len(inputs) x len(Data) boolean incidence matrix and its concept index
+        """
+        concepts = list(Data)
+        if not lower:
+            return build_incidence(inputs, cls.recognize_as_Data, concepts, as_sparse=as_sparse)
+        lower_matrix = cls.derived('lower_matrix', lambda: relation_matrix(concepts, cls.is_lower))
+        return build_incidence(inputs, cls.recognize_as_Data, concepts, lower_matrix,
+                               overrides=lambda s: {LOWER_DATA_ALIASES[s]} if s in LOWER_DATA_ALIASES else None,
+                               as_sparse=as_sparse)
+
 
 if __name__ == '__main__':
     handler = DataHandler.preload(path1, path2)
@@ -255,3 +265,6 @@ if __name__ == '__main__':
     d2=DataHandler.recognize_first(str2)
     print(d2)
     print(DataHandler.is_related(d1,d2))
+    # the fuzzy fallback resolves mangled terms, not other phrasings of a term: the last three give None
+    for term in ('email_addre', 'oftware_identifier', 'payment information', 'device data', 'health data'):
+        print(term, DataHandler.resolve_fuzzy(term))
@@ -1,14 +1,41 @@
 import re
-from collections import deque
-from functools import lru_cache
 from itertools import combinations
-from typing import Union, Optional
+from typing import Union, Optional, Iterable
 from spacy import Language
+from ontology.batch import Incidence, build_incidence, relation_matrix
+from ontology.cache import RecognitionCacheMixin, recognition_cache
+from ontology.fuzzy import resolve_fuzzy
+from ontology.profiler import compile_pattern
+from ontology.snapshot import OntologySnapshot, SnapshotMixin, transitive_closure
 from ontology.entity.Entity import Entity
 import yaml
 
 path1 = r'.\entity_ontology.yml'
 path2 = r'.\relation.yml'
+# exact terms (mostly truncated LLM outputs) that recognize_as_Entity resolves directly, without regex matching
+ENTITY_ALIASES: dict[str, set[Entity]] = {
+    'analytic': {Entity.ANALYTICS},
+    'analytics': {Entity.ANALYTICS},
+    'google_analytic': {Entity.GOOGLE_ANALYTICS},
+    'ocial_media': {Entity.SOCIAL_MEDIA},
+    'social_media': {Entity.SOCIAL_MEDIA},
+    'haystack': {Entity.HEYSTACK},
+    'itune': {Entity.ITUNES},
+    'google_map': {Entity.GOOGLE_MAPS},
+    'regulatory': {Entity.REGULATORY},
+    'Subsplash': {Entity.SUBSPLASH},
+    'unity_ad': {Entity.UNITY_ADS},
+    'crashlytic': {Entity.CRASHLYTICS},
+    '3rd-party': {Entity.THIRD_PARTIES},
+    'we': {Entity.WE},
+    'the application': {Entity.WE},
+    'our company': {Entity.WE},
+    'advertisers': {Entity.ADVERTISER},
+    'advertiser': {Entity.ADVERTISER},
+    'Advertisers': {Entity.ADVERTISER},
+    'wireless carrier': {Entity.WIRELESS_CARRIER},
+    'wireless_carrier': {Entity.WIRELESS_CARRIER},
+}
 ENTITY_SUB_MAPPING = {
     Entity.GOOGLE_ADS: Entity.GOOGLE,
     Entity.GOOGLE_ANALYTICS: Entity.GOOGLE,
@@ -67,7 +94,7 @@ ENTITY_SUB_MAPPING = {
 }
 
 
-class EntityHandler:
+class EntityHandler(SnapshotMixin, RecognitionCacheMixin):
     expressions: [Entity, list] = {}
     reversed_expr: [str, Entity] = {}
     sub_mapping: [str, str] = {}
@@ -76,31 +103,33 @@ class EntityHandler:
 
     @classmethod
     def preload(cls, ontology: str, relation: str):
-        cls.load_entity_ontology(ontology)
-        cls.load_relations(relation)
+        cls.install(OntologySnapshot(**cls.load_entity_ontology(ontology), **cls.load_relations(relation)))
 
     @classmethod
-    def load_entity_ontology(cls, filepath: str) -> None:
+    def load_entity_ontology(cls, filepath: str) -> dict:
         """
-        load entity_ontology.yml
+        load entity_ontology.yml, returns the pattern tables of a snapshot
         """
+        expressions, reversed_expr, compiled_expr = {}, {}, {}
         with open(filepath, 'r', encoding='utf-8') as file:
             data = yaml.safe_load(file)
         for item in data:
             try:
                 dataItem = Entity(item['name'].lower())
-                cls.expressions[dataItem] = list(map(lambda x: x.lower(), item['patterns']))
-                for pattern in cls.expressions[dataItem]:
-                    cls.reversed_expr[pattern] = dataItem
-                    cls.compiled_expr[pattern] = re.compile(pattern)  
+                expressions[dataItem] = list(map(lambda x: x.lower(), item['patterns']))
+                for pattern in expressions[dataItem]:
+                    reversed_expr[pattern] = dataItem
+                    compiled_expr[pattern] = compile_pattern(cls, pattern)
             except Exception as e:
                 print(f"Error parsing {item} loading entity ontology from {filepath}: {e}")
+        return {'expressions': expressions, 'reversed_expr': reversed_expr, 'compiled_expr': compiled_expr}
 
     @classmethod
-    def load_relations(cls, relation_yaml_path: str) -> None:
+    def load_relations(cls, relation_yaml_path: str) -> dict:
         """
-        load relation.yml 
+        load relation.yml, returns the transitively closed sub_mapping table of a snapshot
         """
+        sub_mapping = {}
         try:
             with open(relation_yaml_path, 'r', encoding='utf-8') as file:
                 content = yaml.safe_load(file)
@@ -109,35 +138,13 @@ class EntityHandler:
                         src, tgt = edge['source'].lower(), edge['target'].lower()
                         src_, tgt_ = Entity(src), Entity(tgt)
                         if src_ and tgt_:
-                            cls.sub_mapping[src] = cls.sub_mapping.get(src, []) + [tgt]
+                            sub_mapping[src] = sub_mapping.get(src, []) + [tgt]
                     except Exception as e:
                         print(
                             f"Error parsing ({src},{tgt}) loading condition relation map from {relation_yaml_path}: {e}")
-
-            # transitive closure
-            cls.closure()
         except Exception as e:
             print(f"Error loading condition relation map from {relation_yaml_path}: {e}")
-
-    @classmethod
-    def closure(cls):
-        """
-        transitive closure
-        """
-        for src in list(cls.sub_mapping.keys()):
-            visited = set()
-            queue = deque(cls.sub_mapping[src])
-            while queue:
-                tgt = queue.popleft()
-                if tgt not in visited:
-                    visited.add(tgt)
-                    if tgt not in cls.sub_mapping[src]:
-                        cls.sub_mapping[src].append(tgt)
-                    if tgt in cls.sub_mapping:
-                        queue.extend(cls.sub_mapping[tgt])
-
-            # deduplicate
-            cls.sub_mapping[src] = list(set(cls.sub_mapping[src]))
+        return {'sub_mapping': transitive_closure(sub_mapping)}
 
     @classmethod
     def is_lower(cls, entity1: Union[Entity, str], entity2: Union[Entity, str]) -> bool:
@@ -175,68 +182,57 @@ class EntityHandler:
         return entity1 == entity2 or cls.is_lower(entity1, entity2) or cls.is_higher(entity1, entity2)
 
     @classmethod
+    @recognition_cache
     def recognize_first(cls, input: str) -> Optional[Entity]:
         input = input.lower()
-        for expr in cls.compiled_expr:
-            if cls.compiled_expr[expr].search(input):
-                return cls.reversed_expr[expr]
-        return None
+        snapshot = cls.snapshot()
+        for expr, compiled in snapshot.compiled_expr.items():
+            if compiled.search(input):
+                return snapshot.reversed_expr[expr]
+        return cls.resolve_fuzzy(input)
 
     @classmethod
+    @recognition_cache
+    def resolve_fuzzy(cls, input: str) -> Optional[Entity]:
+        """
+        approximate lookup of an entity no regex matches, e.g. the truncated LLM output 'ocial_media'
+        """
+        return resolve_fuzzy(cls, Entity, ENTITY_ALIASES, input.lower())
+
+    @classmethod
+    @recognition_cache
     def recognize_origin(cls, input: str) -> set[str]:
         """
         recognize the original entity name from the input
         """
         input = input.lower()
         ret = set()
-        for expr in cls.compiled_expr:
-            matcher = cls.compiled_expr[expr].search(input)
+        for compiled in cls.snapshot().compiled_expr.values():
+            matcher = compiled.search(input)
             if matcher:
                 ret.add(matcher.group())
         return ret
 
     @classmethod
-    @lru_cache(maxsize=300)
+    @recognition_cache
     def recognize_as_Entity(cls, input: str) -> set[Entity]:
-        if input == 'analytic' or input == 'analytics':
-            return {Entity.ANALYTICS}
-        elif input == 'google_analytic':
-            return {Entity.GOOGLE_ANALYTICS}
-        elif input == 'ocial_media' or input == 'social_media':
-            return {Entity.SOCIAL_MEDIA}
-        elif input == 'haystack':
-            return {Entity.HEYSTACK}
-        elif input == 'itune':
-            return {Entity.ITUNES}
-        elif input == 'google_map':
-            return {Entity.GOOGLE_MAPS}
-        elif input == 'regulatory':
-            return {Entity.REGULATORY}
-        elif input == 'Subsplash':
-            return {Entity.SUBSPLASH}
-        elif input == 'unity_ad':
-            return {Entity.UNITY_ADS}
-        elif input == 'crashlytic':
-            return {Entity.CRASHLYTICS}
-        elif input == '3rd-party':
-            return {Entity.THIRD_PARTIES}
-        elif input in ['we','the application','our company']:
-            return {Entity.WE}
-        elif input in ['advertisers','advertiser','Advertisers']:
-            return {Entity.ADVERTISER}
-        elif input in ['wireless carrier', 'wireless_carrier']:
-            return {Entity.WIRELESS_CARRIER}
-        elif input in []:
-            return {Entity.THIRD_PARTIES}
+        if input in ENTITY_ALIASES:
+            return set(ENTITY_ALIASES[input])
 
         input = input.lower()
         ret = set()
-        for expr in cls.compiled_expr:
-            if cls.compiled_expr[expr].search(input):
-                ret.add(cls.reversed_expr[expr])
+        snapshot = cls.snapshot()
+        for expr, compiled in snapshot.compiled_expr.items():
+            if compiled.search(input):
+                ret.add(snapshot.reversed_expr[expr])
+        if not ret:
+            fuzzy = cls.resolve_fuzzy(input)
+            if fuzzy is not None:
+                ret.add(fuzzy)
         return ret
 
     @classmethod
+    @recognition_cache
     def recognize_as_lower_Entity(cls, input: str) -> set[Entity]:
         input = input.lower()
         candidates = cls.recognize_as_Entity(input)
@@ -265,6 +261,19 @@ class EntityHandler:
                 to_remove.add(a)
         return candidates - to_remove
 
+    @classmethod
+    def recognize_many(cls, inputs: Iterable[str], lower: bool = False, as_sparse: bool = False) -> Incidence:
+        """
+        Batch version of recognize_as_Entity (or recognize_as_lower_Entity if lower=True):
+        returns a len(inputs) x len(Entity) boolean incidence matrix and its concept index
+        """
+        concepts = list(Entity)
+        if not lower:
+            return build_incidence(inputs, cls.recognize_as_Entity, concepts, as_sparse=as_sparse)
+        lower_matrix = cls.derived('lower_matrix', lambda: relation_matrix(concepts, cls.is_lower))
+        return build_incidence(map(str.lower, inputs), cls.recognize_as_Entity, concepts, lower_matrix,
+                               as_sparse=as_sparse)
+
 
 if __name__ == '__main__':
     handler = EntityHandler.preload(path1, path2)
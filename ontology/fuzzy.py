@@ -0,0 +1,246 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from enum import Enum
+from typing import Optional, Iterable
+
+from config import FUZZY_MATCH_THRESHOLD, FUZZY_MAX_TERM_WORDS, FUZZY_MEMO_DIR, logger
+from ontology.profiler import literal_sample
+from util.code_hash import code_version
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+"""
+Approximate term resolution for the data and entity ontologies.
+LLM outputs often carry truncated or mangled terms ("email_addre", "oftware_identifier", "ocial_media") that no
+ontology regex matches. FuzzyIndex is a character n-gram index over the concept names, the literal patterns and
+the alias tables of a handler; a lookup scores the candidate terms sharing n-grams with the query by their Dice
+coefficient and accepts the best one above FUZZY_MATCH_THRESHOLD. Only the distinguishing words are scored: the
+generic words ("information", "data", "info") of a term must be those of the query, and the other words must share a
+word with the query, possibly truncated at either end. So "payment information" resolves neither through
+"employment information" nor through "payment data". Resolutions are memoized per version of the ontology and of
+this module, on disk when FUZZY_MEMO_DIR is set, see FuzzyMemo.
+"""
+
+NGRAM = 3
+# a term much longer or shorter than the query is a different, more or less specific concept ("service provider"
+# vs "online service provider"), not a mangled spelling of it
+MIN_LENGTH_RATIO = 0.75
+SEPARATORS = re.compile(r'[\s_\-]+')
+# words most data terms share, which say nothing about which data it is
+GENERIC_WORDS = frozenset({'information', 'data', 'info'})
+# a truncated word ("addre", "oftware") still matches the word it was cut from when it keeps this many characters
+MIN_WORD_OVERLAP = 3
+
+
+def normalize_term(term: str) -> str:
+    return SEPARATORS.sub(' ', term.lower()).strip()
+
+
+def split_generic(term: str) -> tuple[str, frozenset[str]]:
+    """
+    (distinguishing words, generic words) of a normalized term; the distinguishing words are '' when only generic
+    words are left
+    """
+    words = term.split(' ')
+    return ' '.join(w for w in words if w not in GENERIC_WORDS), frozenset(w for w in words if w in GENERIC_WORDS)
+
+
+def words_match(query: str, term: str) -> bool:
+    """
+    Whether a word of query equals a word of term, or is the start or the end of it (or the reverse)
+    """
+    for q in query.split(' '):
+        for t in term.split(' '):
+            short, long = (q, t) if len(q) <= len(t) else (t, q)
+            if short == long or (len(short) >= MIN_WORD_OVERLAP and (long.startswith(short) or long.endswith(short))):
+                return True
+    return False
+
+
+def ngrams(term: str, n: int = NGRAM) -> set[str]:
+    padded = f" {term} "
+    if len(padded) <= n:
+        return {padded}
+    return {padded[i:i + n] for i in range(len(padded) - n + 1)}
+
+
+class FuzzyMemo:
+    """
+    Append-only JSONL memo of past resolutions: {"input": ..., "concept": <concept value or null>} per line.
+    The file name carries the fingerprint of the index, so that a modified ontology or matching code starts a fresh
+    memo. Each line is a single append write, under an exclusive file lock where fcntl exists, so that the worker
+    processes of a batch can share the file.
+    """
+
+    def __init__(self, path: Optional[str], concept_type: type[Enum]):
+        self.path = path
+        self.concept_type = concept_type
+        self.entries: dict[str, Optional[Enum]] = {}
+        self._lock = threading.Lock()
+        self._fd: Optional[int] = None
+        if path and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                        concept = record['concept']
+                        self.entries[record['input']] = concept_type(concept) if concept is not None else None
+                    except (ValueError, KeyError):
+                        # a stale concept value or a truncated last line, ignore it
+                        continue
+
+    def get(self, key: str, default=None):
+        return self.entries.get(key, default)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.entries
+
+    def put(self, key: str, concept: Optional[Enum]):
+        with self._lock:
+            self.entries[key] = concept
+            if not self.path:
+                return
+            line = json.dumps({'input': key, 'concept': concept.value if concept else None}) + '\n'
+            try:
+                if self._fd is None:
+                    os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                    self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                if fcntl is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_EX)
+                try:
+                    os.write(self._fd, line.encode('utf-8'))
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(self._fd, fcntl.LOCK_UN)
+            except OSError as e:
+                logger.warning(f"Cannot write fuzzy memo {self.path}: {e}")
+                self.path = None
+
+
+class FuzzyIndex:
+    """
+    Usage:
+        index = FuzzyIndex({'email address': Data.EMAIL, ...})
+        index.lookup('email_addre')  # -> (Data.EMAIL, 'email address', 0.87)
+        index.lookup('payment information')  # -> None, 'payment data' differs in its generic word
+    """
+
+    def __init__(self, terms: dict[str, Enum], threshold: float = FUZZY_MATCH_THRESHOLD, n: int = NGRAM):
+        self.threshold = threshold
+        self.n = n
+        self.terms: list[str] = []
+        self.keys: list[str] = []
+        self.generic: list[frozenset[str]] = []
+        self.concepts: list[Enum] = []
+        self.sizes: list[int] = []
+        self.postings: dict[str, list[int]] = {}
+        seen = set()
+        for term, concept in terms.items():
+            term = normalize_term(term)
+            if not term or term in seen:
+                continue
+            seen.add(term)
+            key, generic = split_generic(term)
+            if not key:
+                continue
+            grams = ngrams(key, n)
+            tid = len(self.terms)
+            self.terms.append(term)
+            self.keys.append(key)
+            self.generic.append(generic)
+            self.concepts.append(concept)
+            self.sizes.append(len(grams))
+            for g in grams:
+                self.postings.setdefault(g, []).append(tid)
+
+    def fingerprint(self) -> str:
+        h = hashlib.sha1(f"{self.n}:{self.threshold}:{','.join(sorted(GENERIC_WORDS))}".encode('utf-8'))
+        # the scoring and filtering rules of lookup change resolutions as much as the terms do
+        h.update(code_version(['ontology/fuzzy.py']).encode('ascii'))
+        for term, concept in sorted(zip(self.terms, (c.value for c in self.concepts))):
+            h.update(f"\0{term}\1{concept}".encode('utf-8'))
+        return h.hexdigest()[:12]
+
+    def lookup(self, query: str) -> Optional[tuple[Enum, str, float]]:
+        """
+        Best (concept, term, score) whose Dice similarity with query reaches the threshold, whose length is
+        comparable to the query's, which has the generic words of the query and shares another word with it, or None.
+        Score and length are those of the terms without their generic words.
+        Ties are broken by the closest term length, then by ontology order.
+        """
+        query, generic = split_generic(normalize_term(query))
+        if not query:
+            return None
+        grams = ngrams(query, self.n)
+        shared: dict[int, int] = {}
+        for g in grams:
+            for tid in self.postings.get(g, ()):
+                shared[tid] = shared.get(tid, 0) + 1
+        best, best_key = None, None
+        for tid, count in shared.items():
+            score = 2 * count / (len(grams) + self.sizes[tid])
+            if score < self.threshold or self.generic[tid] != generic:
+                continue
+            term_len = len(self.keys[tid])
+            if min(term_len, len(query)) < MIN_LENGTH_RATIO * max(term_len, len(query)):
+                continue
+            if not words_match(query, self.keys[tid]):
+                continue
+            key = (-score, abs(term_len - len(query)), tid)
+            if best_key is None or key < best_key:
+                best, best_key = tid, key
+        if best is None:
+            return None
+        return self.concepts[best], self.terms[best], -best_key[0]
+
+
+def is_term_like(input: str) -> bool:
+    """
+    Only short, term-like strings go through the fuzzy fallback, never whole sentences
+    """
+    return 0 < len(input.split()) <= FUZZY_MAX_TERM_WORDS
+
+
+def ontology_terms(handler: type, concepts: Iterable[Enum], aliases: dict) -> dict[str, Enum]:
+    """
+    Vocabulary of the fuzzy index: concept names, literal patterns of the loaded ontology and alias keys
+    """
+    terms: dict[str, Enum] = {}
+    for concept in concepts:
+        terms.setdefault(concept.value, concept)
+    for pattern, concept in handler.reversed_expr.items():
+        literal = literal_sample(pattern)
+        if literal:
+            terms.setdefault(literal, concept)
+    for alias, concepts in aliases.items():
+        if len(concepts) == 1:
+            terms.setdefault(alias, next(iter(concepts)))
+    return terms
+
+
+def build_fuzzy_resolver(handler: type, concept_type: type[Enum], aliases: dict) -> tuple[FuzzyIndex, FuzzyMemo]:
+    index = FuzzyIndex(ontology_terms(handler, concept_type, aliases))
+    path = os.path.join(FUZZY_MEMO_DIR, f"{handler.__name__}-{index.fingerprint()}.jsonl") if FUZZY_MEMO_DIR else None
+    return index, FuzzyMemo(path, concept_type)
+
+
+def resolve_fuzzy(handler: type, concept_type: type[Enum], aliases: dict, input: str) -> Optional[Enum]:
+    """
+    Fallback of the recognition entry points when no alias and no regex matched input
+    """
+    if not is_term_like(input):
+        return None
+    index, memo = handler.derived('fuzzy', lambda: build_fuzzy_resolver(handler, concept_type, aliases))
+    key = normalize_term(input)
+    if key in memo:
+        return memo.get(key)
+    found = index.lookup(key)
+    concept = found[0] if found else None
+    memo.put(key, concept)
+    return concept
@@ -0,0 +1,338 @@
+import argparse
+import csv
+import os
+import re
+import sys
+import threading
+import time
+from typing import Optional
+
+"""
+Per-pattern cost profiling of the ontology regexes.
+- Runtime: PatternProfiler wraps every compiled pattern of the profiled handlers and records call counts,
+  cumulative match time and hits while a real corpus runs.
+- Offline: audit_patterns() inspects the loaded patterns and flags pathological ones (wildcards, nested
+  quantifiers, huge alternations) and redundant ones (duplicates, patterns shadowed by earlier patterns).
+Run `python -m ontology.profiler` for the offline report.
+"""
+
+# handler class -> active PatternProfiler, consulted by compile_pattern() when an ontology is (re)loaded
+_active: dict = {}
+
+PATTERN_ATTRS = ('compiled_expr', 'compiled_syns')
+
+
+def compile_pattern(owner: type, regex: str, flags: int = 0, key: Optional[str] = None, kind: str = 'compiled_expr'):
+    """
+    re.compile() used by the handlers; returns a ProfiledPattern while a profiler is installed on owner
+    """
+    compiled = re.compile(regex, flags)
+    profiler = _active.get(owner)
+    if profiler is not None:
+        return profiler.wrap(owner, kind, key if key is not None else regex, compiled)
+    return compiled
+
+
+class PatternStats:
+    __slots__ = ['handler', 'kind', 'key', 'regex', 'calls', 'hits', 'total_time']
+
+    def __init__(self, handler: str, kind: str, key: str, regex: str):
+        self.handler = handler
+        self.kind = kind
+        self.key = key
+        self.regex = regex
+        self.calls = 0
+        self.hits = 0
+        self.total_time = 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            'handler': self.handler,
+            'kind': self.kind,
+            'pattern': self.key,
+            'calls': self.calls,
+            'hits': self.hits,
+            'hitRate': round(self.hits / self.calls, 4) if self.calls else 0.0,
+            'totalTimeMs': round(self.total_time * 1000, 3),
+            'meanTimeUs': round(self.total_time * 1e6 / self.calls, 3) if self.calls else 0.0,
+        }
+
+
+class ProfiledPattern:
+    """
+    Drop-in replacement of re.Pattern that times search/match/findall/finditer
+    """
+    __slots__ = ['pattern', 'stats', '_lock']
+
+    def __init__(self, pattern: re.Pattern, stats: PatternStats, lock: threading.Lock):
+        self.pattern = pattern
+        self.stats = stats
+        self._lock = lock
+
+    def _record(self, start: float, hit: bool):
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.stats.calls += 1
+            self.stats.total_time += elapsed
+            if hit:
+                self.stats.hits += 1
+
+    def search(self, *args, **kwargs):
+        start = time.perf_counter()
+        m = self.pattern.search(*args, **kwargs)
+        self._record(start, m is not None)
+        return m
+
+    def match(self, *args, **kwargs):
+        start = time.perf_counter()
+        m = self.pattern.match(*args, **kwargs)
+        self._record(start, m is not None)
+        return m
+
+    def findall(self, *args, **kwargs):
+        start = time.perf_counter()
+        ret = self.pattern.findall(*args, **kwargs)
+        self._record(start, bool(ret))
+        return ret
+
+    def finditer(self, *args, **kwargs):
+        start = time.perf_counter()
+        ret = list(self.pattern.finditer(*args, **kwargs))
+        self._record(start, bool(ret))
+        return iter(ret)
+
+    def __getattr__(self, name):
+        return getattr(self.pattern, name)
+
+
+class PatternProfiler:
+    """
+    Usage:
+        with PatternProfiler(DataHandler, EntityHandler, ConditionHandler) as profiler:
+            process_batch(...)
+        print(profiler.report())
+    The profiled patterns are installed as a new ontology snapshot, which clears the recognition caches,
+    so that every distinct input reaches the regexes once;
+    cache hits are not attributed to any pattern.
+    """
+
+    def __init__(self, *handlers: type):
+        self.handlers = handlers
+        self.stats: dict[tuple, PatternStats] = {}
+        self._lock = threading.Lock()
+
+    def wrap(self, owner: type, kind: str, key: str, compiled) -> ProfiledPattern:
+        if isinstance(compiled, ProfiledPattern):
+            compiled = compiled.pattern
+        stat_key = (owner.__name__, kind, key)
+        stats = self.stats.get(stat_key)
+        if stats is None:
+            stats = self.stats.setdefault(stat_key, PatternStats(owner.__name__, kind, key, compiled.pattern))
+        return ProfiledPattern(compiled, stats, self._lock)
+
+    def install(self):
+        for handler in self.handlers:
+            _active[handler] = self
+            snapshot = handler.snapshot()
+            handler.install(snapshot.replace(**{
+                attr: {key: self.wrap(handler, attr, key, p) for key, p in getattr(snapshot, attr).items()}
+                for attr in PATTERN_ATTRS}))
+        return self
+
+    def uninstall(self):
+        for handler in self.handlers:
+            if _active.get(handler) is self:
+                del _active[handler]
+            snapshot = handler.snapshot()
+            handler.install(snapshot.replace(**{
+                attr: {key: p.pattern if isinstance(p, ProfiledPattern) else p
+                       for key, p in getattr(snapshot, attr).items()}
+                for attr in PATTERN_ATTRS}))
+
+    def __enter__(self):
+        return self.install()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.uninstall()
+
+    def rows(self) -> list[dict]:
+        """
+        Per-pattern statistics sorted by cumulative match time
+        """
+        with self._lock:
+            rows = [s.to_dict() for s in self.stats.values()]
+        return sorted(rows, key=lambda r: -r['totalTimeMs'])
+
+    def report(self, top: int = 20) -> str:
+        rows = self.rows()
+        total = sum(r['totalTimeMs'] for r in rows)
+        lines = [f"{len(rows)} patterns, {total:.1f} ms spent in regex matching"]
+        for r in rows[:top]:
+            share = r['totalTimeMs'] / total * 100 if total else 0.0
+            lines.append(f"{r['totalTimeMs']:10.2f} ms {share:5.1f}%  calls={r['calls']:<8} "
+                         f"hitRate={r['hitRate']:<6} {r['handler']}.{r['kind']}: {r['pattern']}")
+        dead = [r for r in rows if r['calls'] and not r['hits']]
+        lines.append(f"{len(dead)} patterns never matched")
+        return '\n'.join(lines)
+
+    def to_csv(self, path: str):
+        rows = self.rows()
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(PatternStats('', '', '', '').to_dict().keys()))
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+# ---------------------------------------------------------------------------------------------------------------
+# offline audit
+# ---------------------------------------------------------------------------------------------------------------
+NESTED_QUANTIFIER = re.compile(r'\((?:[^()\\]|\\.)*[*+](?:[^()\\]|\\.)*\)[*+{]')
+WILDCARD = re.compile(r'(?<!\\)\.[*+]')
+CONTEXT_DEPENDENT = re.compile(r'\\b|\\B|\^|\$|\[\^|\(\?[=!<]')
+# whitespace/underscore classes are rendered as a single space when deriving a literal sample
+SEPARATORS = re.compile(r'\[(?:_\\s|\\s_|\\s|_)\][*+?]?|\\s[*+?]?')
+META = set('.^$*+?{}[]|()\\')
+CONTEXTS = ('{}', ' {} ', 'x{}x', '_{}_')
+
+
+def literal_sample(regex: str) -> Optional[str]:
+    """
+    A literal string matched by regex if regex is a plain literal (modulo \\b and separators), else None
+    """
+    text = SEPARATORS.sub(' ', regex.replace('\\b', ''))
+    chars, i = [], 0
+    while i < len(text):
+        c = text[i]
+        if c == '\\':
+            if i + 1 >= len(text) or text[i + 1].isalnum():
+                return None
+            chars.append(text[i + 1])
+            i += 2
+            continue
+        if c in META:
+            return None
+        chars.append(c)
+        i += 1
+    text = ''.join(chars)
+    return text.strip() or None
+
+
+def _flags(regex: str) -> list[str]:
+    flags = []
+    if regex.startswith(('.*', '.+')):
+        flags.append('leading-wildcard')
+    elif WILDCARD.search(regex):
+        flags.append('wildcard')
+    if NESTED_QUANTIFIER.search(regex):
+        flags.append('nested-quantifier')
+    if regex.count('|') >= 10:
+        flags.append('large-alternation')
+    return flags
+
+
+def _always_matches(compiled: re.Pattern, literal: str) -> bool:
+    if not CONTEXT_DEPENDENT.search(compiled.pattern):
+        return compiled.search(literal) is not None
+    return all(compiled.search(ctx.format(literal)) for ctx in CONTEXTS)
+
+
+def audit_patterns(handler: type) -> list[dict]:
+    """
+    Flag pathological and redundant patterns of a loaded handler, in matching order:
+    - duplicate / conflict: the same pattern is listed twice, for the same / a different concept
+    - shadowed: every string matched by this pattern is also matched by an earlier pattern of the same concept,
+      so the pattern never changes any recognition result
+    - shadowed-first: same, but by an earlier pattern of another concept; it only loses in recognize_first
+    - leading-wildcard / wildcard / nested-quantifier / large-alternation: potentially expensive regexes
+    """
+    entries = []  # (kind, key, concept, compiled)
+    for kind, reversed_attr, compiled_attr in (('pattern', 'reversed_expr', 'compiled_expr'),
+                                               ('synonym', 'reversed_syns', 'compiled_syns')):
+        reversed_map = getattr(handler, reversed_attr, {})
+        compiled_map = getattr(handler, compiled_attr, {})
+        for key, concept in reversed_map.items():
+            compiled = compiled_map.get(key)
+            if compiled is None:
+                continue
+            if not isinstance(compiled, re.Pattern):
+                compiled = compiled.pattern
+            entries.append((kind, key, concept, compiled))
+
+    listed: dict[str, list] = {}
+    for concept, patterns in getattr(handler, 'expressions', {}).items():
+        for p in patterns:
+            listed.setdefault(p, []).append(concept)
+
+    findings = []
+    earlier: list[tuple] = []
+    for kind, key, concept, compiled in entries:
+        flags = _flags(compiled.pattern) if kind == 'pattern' else []
+        reasons = []
+        owners = listed.get(key, [])
+        if len(owners) > 1:
+            flags.append('conflict' if len(set(owners)) > 1 else 'duplicate')
+            reasons.append(f"listed for {', '.join(str(o) for o in owners)}")
+
+        literal = key if kind == 'synonym' else literal_sample(key)
+        if literal:
+            for e_kind, e_key, e_concept, e_compiled in earlier:
+                if _always_matches(e_compiled, literal):
+                    if e_concept == concept:
+                        flags.append('shadowed')
+                    elif 'shadowed-first' not in flags:
+                        flags.append('shadowed-first')
+                    else:
+                        continue
+                    reasons.append(f"by {e_kind} '{e_key}' ({e_concept})")
+                    if e_concept == concept:
+                        break
+        if flags:
+            findings.append({
+                'handler': handler.__name__,
+                'kind': kind,
+                'concept': str(concept),
+                'pattern': key,
+                'flags': ','.join(flags),
+                'detail': '; '.join(reasons),
+            })
+        earlier.append((kind, key, concept, compiled))
+    return findings
+
+
+def main():
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.append(project_root)
+    from config import entity_ontology_path, entity_relation_yml, data_ontology_path, data_relation_yml, \
+        condition_dir_path, condition_relation_yml
+    from ontology.condition.handler import ConditionHandler
+    from ontology.data.handler import DataHandler
+    from ontology.entity.handler import EntityHandler
+
+    parser = argparse.ArgumentParser(description="Flag pathological or redundant ontology patterns.")
+    parser.add_argument('--output', help='Write all findings to this CSV file')
+    args = parser.parse_args()
+
+    EntityHandler.preload(entity_ontology_path, entity_relation_yml)
+    DataHandler.preload(data_ontology_path, data_relation_yml)
+    ConditionHandler.preload(condition_dir_path, condition_relation_yml)
+
+    findings = []
+    for handler in (DataHandler, EntityHandler, ConditionHandler):
+        found = audit_patterns(handler)
+        counts: dict[str, int] = {}
+        for f in found:
+            for flag in f['flags'].split(','):
+                counts[flag] = counts.get(flag, 0) + 1
+        print(f"{handler.__name__}: {counts}")
+        findings.extend(found)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=['handler', 'kind', 'concept', 'pattern', 'flags', 'detail'])
+            writer.writeheader()
+            writer.writerows(findings)
+        print(f"{len(findings)} findings written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
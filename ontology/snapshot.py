@@ -0,0 +1,161 @@
+import hashlib
+import re
+import threading
+from collections import deque
+from types import MappingProxyType
+from typing import Optional
+
+"""
+Immutable ontology state of the handlers.
+A handler never mutates its tables: loading builds plain dicts, freezes them into an OntologySnapshot and installs
+it in one step. Readers take a reference to the current snapshot and keep a consistent view even if another thread
+reloads the ontology meanwhile. Snapshots pickle to plain dicts (patterns are recompiled on unpickling), so a parent
+process can hand its loaded ontologies to worker processes instead of re-parsing the YAML files in every worker.
+"""
+
+TABLES = ('expressions', 'reversed_expr', 'compiled_expr', 'sub_mapping', 'synonyms', 'reversed_syns', 'compiled_syns')
+
+
+def _freeze(table: dict) -> MappingProxyType:
+    frozen = {}
+    for key, value in table.items():
+        if isinstance(value, list):
+            value = tuple(value)
+        elif isinstance(value, set):
+            value = frozenset(value)
+        frozen[key] = value
+    return MappingProxyType(frozen)
+
+
+def transitive_closure(sub_mapping: dict) -> dict:
+    """
+    Transitive closure of a relation given as {source: [targets]}; returns a new mapping to deduplicated lists
+    """
+    closed = {}
+    for src in list(sub_mapping.keys()):
+        targets = list(sub_mapping[src])
+        visited = set()
+        queue = deque(sub_mapping[src])
+        while queue:
+            tgt = queue.popleft()
+            if tgt not in visited:
+                visited.add(tgt)
+                if tgt not in targets:
+                    targets.append(tgt)
+                if tgt in sub_mapping:
+                    queue.extend(sub_mapping[tgt])
+        closed[src] = list(set(targets))
+    return closed
+
+
+class OntologySnapshot:
+    """
+    Read-only tables of a loaded ontology. Lists become tuples, dicts become mappingproxies, and attributes cannot be
+    reassigned; use replace() to derive a modified snapshot.
+    """
+    __slots__ = TABLES + ('_fingerprint',)
+
+    def __init__(self, **tables):
+        unknown = set(tables) - set(TABLES)
+        if unknown:
+            raise TypeError(f"Unknown ontology tables: {', '.join(sorted(unknown))}")
+        for name in TABLES:
+            object.__setattr__(self, name, _freeze(tables.get(name) or {}))
+        object.__setattr__(self, '_fingerprint', None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def replace(self, **tables) -> 'OntologySnapshot':
+        """
+        A new snapshot with the given tables replaced and the others shared
+        """
+        current = {name: getattr(self, name) for name in TABLES}
+        current.update(tables)
+        return OntologySnapshot(**current)
+
+    def fingerprint(self) -> str:
+        """
+        Content hash of the patterns, synonyms and relations, identifies an ontology version
+        """
+        if self._fingerprint is None:
+            h = hashlib.sha1()
+            for name in ('reversed_expr', 'reversed_syns'):
+                for key, concept in getattr(self, name).items():
+                    h.update(f"{name}\0{key}\0{concept}\n".encode('utf-8'))
+            for src in sorted(self.sub_mapping, key=str):
+                targets = sorted(map(str, self.sub_mapping[src]))
+                h.update(f"sub\0{src}\0{','.join(targets)}\n".encode('utf-8'))
+            object.__setattr__(self, '_fingerprint', h.hexdigest())
+        return self._fingerprint
+
+    def __reduce__(self):
+        tables = {}
+        for name in TABLES:
+            table = dict(getattr(self, name))
+            if name.startswith('compiled_'):
+                # profiled patterns hold a lock; ship the plain regex and flags only
+                table = {key: (p.pattern, p.flags) if isinstance(p, re.Pattern) else (p.pattern.pattern, p.pattern.flags)
+                         for key, p in table.items()}
+            tables[name] = table
+        return _restore_snapshot, (tables,)
+
+
+def _restore_snapshot(tables: dict) -> OntologySnapshot:
+    for name in ('compiled_expr', 'compiled_syns'):
+        tables[name] = {key: re.compile(regex, flags) for key, (regex, flags) in tables[name].items()}
+    return OntologySnapshot(**tables)
+
+
+class SnapshotMixin:
+    """
+    Gives a handler class an installable OntologySnapshot. The class attributes expressions, reversed_expr, ...
+    mirror the tables of the installed snapshot; code that needs a consistent view of several tables across a
+    concurrent reload should read them from a single cls.snapshot() instead.
+    """
+    _snapshot: Optional[OntologySnapshot] = None
+    _install_lock = threading.Lock()
+
+    @classmethod
+    def snapshot(cls) -> OntologySnapshot:
+        snapshot = cls.__dict__.get('_snapshot')
+        if snapshot is None:
+            with cls._install_lock:
+                snapshot = cls.__dict__.get('_snapshot')
+                if snapshot is None:
+                    snapshot = OntologySnapshot()
+                    cls._publish(snapshot)
+        return snapshot
+
+    @classmethod
+    def install(cls, snapshot: OntologySnapshot):
+        """
+        Atomically switch the handler to snapshot, e.g. one received from a parent process
+        """
+        with cls._install_lock:
+            cls._publish(snapshot)
+        cls.cache_clear()
+        return cls
+
+    @classmethod
+    def _publish(cls, snapshot: OntologySnapshot):
+        cls._snapshot = snapshot
+        for name in TABLES:
+            if name in cls.__dict__ or name in getattr(cls, '__annotations__', {}):
+                setattr(cls, name, getattr(snapshot, name))
+
+
+def export_snapshots(*handlers: type) -> dict[str, OntologySnapshot]:
+    """
+    {handler name: snapshot} of loaded handlers, picklable, to initialize worker processes with install_snapshots()
+    """
+    return {handler.__name__: handler.snapshot() for handler in handlers}
+
+
+def install_snapshots(snapshots: dict[str, OntologySnapshot], *handlers: type):
+    for handler in handlers:
+        if handler.__name__ in snapshots:
+            handler.install(snapshots[handler.__name__])
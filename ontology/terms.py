@@ -0,0 +1,35 @@
+from typing import Optional, Union
+
+from ontology.condition.condition import Condition
+from ontology.condition.condition_set import ConditionSet
+from ontology.data.Data import Data
+from ontology.data.handler import DataHandler
+from ontology.entity.Entity import Entity
+from ontology.entity.handler import EntityHandler
+from util.structured.judge_negation import has_negation
+
+"""
+Resolution of the (entity, data, condition) terms of a tuple to ontology concepts, as the contradiction rules see
+them. CollectionNode resolves its own terms once through these functions.
+"""
+
+
+def entity_concept(entity: str) -> Optional[Entity]:
+    return EntityHandler.recognize_first(entity)
+
+
+def data_concept(data: str) -> Optional[Data]:
+    """
+    Concept of a data string, a negated personal_info ("no personal information") folds into non_personal_info
+    """
+    concept = DataHandler.recognize_first(data)
+    if concept == Data.PERSONAL_INFO and has_negation(data):
+        concept = Data.NON_PERSONAL_INFO
+    return concept
+
+
+def condition_set(condition: Union[str, Condition]) -> ConditionSet:
+    """
+    Canonical ConditionSet of a (possibly composite, "a and b") condition, see ConditionSet.parse
+    """
+    return ConditionSet.parse(condition)
@@ -2,14 +2,16 @@ import asyncio
 import json
 import os
 import re
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Callable
+from typing import Callable, Optional
 
 from bs4 import BeautifulSoup
 from openai import AsyncOpenAI
 from openai.types.chat import ChatCompletion
 from spacy import Language
 
+from analyzer.analyzer import PolicyStream, process_single_file, process_stream
 from config import *
 from ontology.condition.condition import Condition
 from ontology.condition.handler import ConditionHandler
@@ -17,7 +19,7 @@ from ontology.data.Data import Data
 from ontology.data.handler import DataHandler
 from ontology.entity.Entity import Entity
 from ontology.entity.handler import EntityHandler
-from pipeline.abstract_pipeline import AbstractPipeline
+from pipeline.abstract_pipeline import AbstractPipeline, RUN_MODE
 from pipeline.prompt_pipeline import search_before
 from pipeline.prompt_template import (
     prompt_template,
@@ -69,9 +71,11 @@ async def generate_and_save_prompt_async(
         context: str,
         model_id: str,
         output_dir: str,
-        chat_model: AsyncOpenAI = AsyncOpenAI(api_key=gpt_key, base_url=gpt_base)
+        chat_model: AsyncOpenAI = AsyncOpenAI(api_key=gpt_key, base_url=gpt_base),
+        on_response: Optional[Callable[[dict], None]] = None,
 ):
-    """Generate a prompt and save the results to JSONL files asynchronously."""
+    """Generate a prompt and save the results to JSONL files asynchronously.
+    on_response is called with every record appended to analysis.jsonl, e.g. PolicyStream.add_record."""
     record_path = os.path.join(output_dir, "record.jsonl")
     analysis_path = os.path.join(output_dir, "analysis.jsonl")
     os.makedirs(output_dir, exist_ok=True)
@@ -112,6 +116,11 @@ async def generate_and_save_prompt_async(
     }
     with open(analysis_path, "a", encoding="utf-8") as f:
         f.write(json.dumps(analysis_obj) + "\n")
+    if on_response:
+        try:
+            on_response(analysis_obj)
+        except Exception as e:
+            logger.error(f"Error analyzing the response to {sentence}: {e}", exc_info=True)
 
 
 class AsyncPromptPipeline(AbstractPipeline):
@@ -136,7 +145,13 @@ class AsyncPromptPipeline(AbstractPipeline):
         self.use_nlp_for_candidate_entity: bool = kwargs.get(
             "use_nlp_for_candidate_entity", False
         )
+        # DEFAULT analyzes the responses as they arrive and writes analysis.yaml once the last one is in,
+        # ANALYZE_ONLY analyzes the analysis.jsonl of earlier runs without prompting
+        self.run_mode: RUN_MODE = kwargs.get("run_mode", RUN_MODE.PROMPT_ONLY)
         self.chat_model = AsyncOpenAI(api_key=api_key, base_url=api_base_url)
+        # the final analysis of a policy runs here, off the event loop, while the next policy is prompted;
+        # one worker, so the analyses do not compete with each other for the GIL
+        self.analysis_executor = ThreadPoolExecutor(max_workers=1)
 
     def load_data(self, policy_full_path: str) -> list[str]:
         """
@@ -183,10 +198,24 @@ class AsyncPromptPipeline(AbstractPipeline):
             return processed_sentences
 
     async def process_single_async(
-            self, policy_full_path: str, model_id: str, output_dir: str
+            self, policy_full_path: str, model_id: str, output_dir: str, analyses: Optional[list] = None
     ) -> None:
-        """Process a single policy file asynchronously."""
+        """Process a single policy file asynchronously.
+        In RUN_MODE.DEFAULT the final analysis runs in the analysis executor; with analyses, its future is appended
+        to analyses instead of being awaited, so that the next policy can be prompted meanwhile."""
         logger.info(f"start processing {policy_full_path}")
+        policy_name = os.path.basename(output_dir)
+        jsonl_path = os.path.join(output_dir, "analysis.jsonl")
+        yaml_path = os.path.join(output_dir, "analysis.yaml")
+        if self.run_mode == RUN_MODE.ANALYZE_ONLY:
+            if not os.path.isfile(jsonl_path):
+                logger.warning(f"No analysis.jsonl to analyze in {output_dir}")
+                return
+            stats = process_single_file(jsonl_path, yaml_path, policy_full_path, policy_name)
+            logger.info(f"Rule stats of {policy_name}:\n{stats.report()}")
+            return
+
+        stream = PolicyStream() if self.run_mode == RUN_MODE.DEFAULT else None
         sentences = self.load_data(policy_full_path)
         tasks = []
         for idx, sentence in enumerate(sentences):
@@ -216,10 +245,27 @@ class AsyncPromptPipeline(AbstractPipeline):
                         self.chat_model if self.chat_model else AsyncOpenAI(
                             api_key=gpt_key, base_url=gpt_base
                         ),
+                        stream.add_record if stream else None,
                     )
                     tasks.append(task)
 
         await asyncio.gather(*tasks)
+        if stream:
+            # only the responses of this run, analysis.jsonl may also hold those of earlier runs
+            logger.info(f"{stream.records} responses with {stream.tuples} tuples of {policy_name} analyzed while prompting")
+            analysis = asyncio.get_running_loop().run_in_executor(
+                self.analysis_executor, self.finish_stream, stream, yaml_path, policy_full_path, policy_name
+            )
+            if analyses is None:
+                await analysis
+            else:
+                analyses.append((policy_full_path, analysis))
+
+    @staticmethod
+    def finish_stream(stream: PolicyStream, yaml_path: str, policy_full_path: str, policy_name: str):
+        """Apply the rules to the responses of a policy and write its report, see process_stream."""
+        stats = process_stream(stream, yaml_path, policy_full_path, policy_name)
+        logger.info(f"Rule stats of {policy_name}:\n{stats.report()}")
 
     def extract_candidates(
             self, context: str, sentence: str, nlp: Language = None
@@ -254,7 +300,9 @@ class AsyncPromptPipeline(AbstractPipeline):
         return candidate_entity, candidate_data, candidate_conditions
 
     async def process_batch_async(self, paths: list, filter: Callable = None):
-        """Process multiple policy files asynchronously."""
+        """Process multiple policy files asynchronously.
+        The final analyses of the policies are awaited once the last policy is prompted."""
+        analyses = []
         for policy_full_path in paths:
             name_piece = os.path.basename(os.path.dirname(policy_full_path))
             if filter and filter(name_piece):
@@ -265,7 +313,11 @@ class AsyncPromptPipeline(AbstractPipeline):
             logger.info(f"Processing: {policy_full_path} to {output_dir}")
             try:
                 await self.process_single_async(
-                    policy_full_path, self.model, output_dir
+                    policy_full_path, self.model, output_dir, analyses
                 )
             except Exception as e:
                 logger.error(f"Error processing {policy_full_path}: {e}", exc_info=True)
+        results = await asyncio.gather(*(analysis for _, analysis in analyses), return_exceptions=True)
+        for (policy_full_path, _), result in zip(analyses, results):
+            if isinstance(result, Exception):
+                logger.error(f"Error analyzing {policy_full_path}: {result}", exc_info=result)
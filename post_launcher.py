@@ -1,50 +1,74 @@
 import argparse
 import os
 import time
-import yaml
 from analyzer.post_analysis import (
     load_yaml_content,
     add_missing_tuples_from_candidates,
     process_post_analysis_results,
+    NodeStore,
+    load_pair_store,
+    update_contradiction_pairs,
+    POST_PREFIX,
+    post_report_path,
 )
+from analyzer.report import dump_yaml, read_sidecar, report_of_sidecar, sidecar_path, write_sidecar
+from contradiction.incremental import pair_store_path
 from config import *
 
-POST_PREFIX = "post_"
 # WE_PRONOUNS = ['we', 'our', 'us', 'ourselves', 'ours', 'myself', 'my']
 # third_party_alias = [entity.value for entity in Entity if entity != Entity.UNSPECIFIED and entity != Entity.WE]
 
 
-def process_single_yaml(filepath: str):
+def has_sidecar(filepath: str) -> bool:
+    return any(os.path.isfile(sidecar_path(filepath, codec)) for codec in ('msgpack', 'pickle'))
+
+
+def process_single_yaml(filepath: str, export_yaml: bool = True):
     """
     Process a single YAML file to resolve unspecified entities and add missing tuples from candidates.
+    The report is read from its binary sidecar when the analyzer wrote one; the result then gets a sidecar too, and
+    without export_yaml the post_*.yaml export is skipped.
     :param filepath: Path to the input YAML file
+    :param export_yaml: Write the post-processed report as YAML even when it is also written as a sidecar
     :return: tuple (num_unspecified_resolved, num_tuples_inferred)
     """
-    if not os.path.isfile(filepath):
+    if not os.path.isfile(filepath) and not has_sidecar(filepath):
         logger.warning(f"File not found: {filepath}")
         return 0, 0
 
-    post_yaml = os.path.join(
-        os.path.dirname(filepath), POST_PREFIX + os.path.basename(filepath)
-    )
+    post_yaml = post_report_path(filepath)
 
     try:
-        content = load_yaml_content(filepath)
+        content = read_sidecar(filepath)
+        from_sidecar = content is not None
+        if content is None:
+            content = load_yaml_content(filepath)
     except Exception as e:
         logger.error(f"Failed to load YAML {filepath}: {e}")
         return 0, 0
 
+    store = load_pair_store(filepath, content)
+
     # Resolve unspecified entities
-    new_nodes_from_unspecified_entity = process_post_analysis_results(content)
+    nodes = NodeStore(content['nodes'])
+    new_nodes_from_unspecified_entity = process_post_analysis_results(content, nodes)
     num_unspecified = len(new_nodes_from_unspecified_entity)
 
     # Add missing tuples from candidates
-    new_nodes_from_candidate_combination = add_missing_tuples_from_candidates(content)
+    new_nodes_from_candidate_combination = add_missing_tuples_from_candidates(content, nodes)
     num_tuples_inferred = len(new_nodes_from_candidate_combination)
 
+    # Re-evaluate the contradiction pairs of the resolved and inferred tuples only
+    update_contradiction_pairs(content, store)
+
     try:
-        with open(post_yaml, "w", encoding="utf-8") as f:
-            yaml.dump(content, f, allow_unicode=True, default_flow_style=False, width=1024)
+        # the YAML goes first: a sidecar older than its YAML is taken as stale
+        if export_yaml or not from_sidecar:
+            with open(post_yaml, "w", encoding="utf-8") as f:
+                dump_yaml(content, f)
+        if from_sidecar:
+            write_sidecar(content, post_yaml)
+        store.save(pair_store_path(post_yaml))
     except Exception as e:
         logger.error(f"Failed to write post-processed YAML {post_yaml}: {e}")
         return num_unspecified, num_tuples_inferred
@@ -56,7 +80,7 @@ def process_single_yaml(filepath: str):
     return num_unspecified, num_tuples_inferred
 
 
-def process_directory(directory_path: str):
+def process_directory(directory_path: str, export_yaml: bool = True):
     """
     Process all YAML files in the given directory, resolving unspecified entities and
     inferring tuples from candidates and other existing tuples.
@@ -79,8 +103,14 @@ def process_directory(directory_path: str):
     yaml_files = []
     for root, _, files in os.walk(directory_path):
         for file in files:
-            if file.endswith(".yaml") and not file.startswith(POST_PREFIX):
+            if file.startswith(POST_PREFIX):
+                continue
+            if file.endswith(".yaml"):
                 yaml_files.append(os.path.join(root, file))
+            elif report_of_sidecar(file) and report_of_sidecar(file) not in files:
+                # a report written as a sidecar only
+                yaml_files.append(os.path.join(root, report_of_sidecar(file)))
+    yaml_files = sorted(set(yaml_files))
 
     if not yaml_files:
         logger.warning(f"No YAML files found in {directory_path}")
@@ -94,7 +124,7 @@ def process_directory(directory_path: str):
 
     for filepath in yaml_files:
         try:
-            u, c = process_single_yaml(filepath)
+            u, c = process_single_yaml(filepath, export_yaml)
             total_unspecified += u
             total_candidates += c
             success_count += 1
@@ -126,6 +156,8 @@ def parse_args():
         required=True,
         help='Input YAML file path (for --single) or directory path (for --batch)'
     )
+    parser.add_argument('--no-yaml', action='store_true',
+                        help='For reports read from a binary sidecar, only write the post-processed sidecar')
     return parser.parse_args()
 
 
@@ -134,18 +166,18 @@ def main():
     start_time = time.time()
 
     if args.single:
-        if not os.path.isfile(args.input):
+        if not os.path.isfile(args.input) and not has_sidecar(args.input):
             logger.error(f"Input file does not exist: {args.input}")
             return
         logger.info(f"Running in SINGLE mode on file: {args.input}")
-        process_single_yaml(args.input)
+        process_single_yaml(args.input, export_yaml=not args.no_yaml)
 
     elif args.batch:
         if not os.path.isdir(args.input):
             logger.error(f"Input directory does not exist: {args.input}")
             return
         logger.info(f"Running in BATCH mode on directory: {args.input}")
-        process_directory(args.input)
+        process_directory(args.input, export_yaml=not args.no_yaml)
 
     else:
         logger.error("Invalid mode specified.")
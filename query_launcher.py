@@ -0,0 +1,102 @@
+import argparse
+import os
+import sqlite3
+import time
+
+import pandas as pd
+
+from analyzer.result_store import ResultStore, STAGES
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Fill and query the SQLite result store of the analyzer.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="Examples:\n"
+               "  python query_launcher.py --db results.db import ./datasets/policies\n"
+               "  python query_launcher.py --db results.db pairs --data location --condition children\n"
+               "  python query_launcher.py --db results.db tuples --entity 'third part%' --data 'precise location'\n"
+               "  python query_launcher.py --db results.db evidence --policy Bluesky --tuple '(we, collect, email address, user input)'\n"
+               "  python query_launcher.py --db results.db sql \"SELECT data, COUNT(*) FROM tuples GROUP BY data\""
+    )
+    parser.add_argument('--db', required=True, help='Path to the SQLite result store')
+    parser.add_argument('--csv', help='Write the result rows to this CSV file instead of printing them')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    add = commands.add_parser('import', help='Add every YAML report (and post_* report) under the directories')
+    add.add_argument('directories', nargs='+')
+
+    def add_filters(command, kind: bool = False):
+        command.add_argument('--policy', help='Policy name')
+        command.add_argument('--stage', choices=STAGES,
+                             help='Report stage; by default the post report of a policy when there is one')
+        command.add_argument('--entity')
+        command.add_argument('--data')
+        command.add_argument('--condition', help='Matches any member of a composite condition')
+        if kind:
+            command.add_argument('--kind', choices=('contradiction', 'narrowing', 'all'), default='contradiction')
+
+    add_filters(commands.add_parser('pairs', help='Pairs with either tuple matching the filters (%% wildcards)'),
+                kind=True)
+    tuples = commands.add_parser('tuples', help='Tuples matching the filters (%% wildcards)')
+    add_filters(tuples)
+    tuples.add_argument('--verb')
+    policies = commands.add_parser('policies', help='Policies with their tuple and pair counts')
+    policies.add_argument('--stage', choices=STAGES)
+    evidence = commands.add_parser('evidence', help='Evidence sentences of a tuple of a policy')
+    evidence.add_argument('--policy', required=True)
+    evidence.add_argument('--tuple', required=True)
+    evidence.add_argument('--stage', choices=STAGES)
+    sql = commands.add_parser('sql', help='Run a read-only SQL query')
+    sql.add_argument('query')
+    return parser.parse_args()
+
+
+def run(args, store: ResultStore) -> list[dict]:
+    if args.command == 'pairs':
+        return store.pairs(None if args.kind == 'all' else args.kind, args.entity, args.data, args.condition,
+                           args.policy, args.stage)
+    if args.command == 'tuples':
+        return store.tuples(args.entity, args.data, args.condition, args.verb, args.policy, args.stage)
+    if args.command == 'policies':
+        return store.policies(args.stage)
+    if args.command == 'evidence':
+        return store.evidence(args.tuple, args.policy, args.stage)
+    store.connection.execute("PRAGMA query_only = ON")
+    return store.query(args.query)
+
+
+def main():
+    args = parse_args()
+    if args.command != 'import' and not os.path.isfile(args.db):
+        print(f"Error: The result store '{args.db}' does not exist.")
+        return
+    start_time = time.time()
+    with ResultStore(args.db) as store:
+        if args.command == 'import':
+            for directory in args.directories:
+                if not os.path.isdir(directory):
+                    print(f"Error: The directory '{directory}' does not exist.")
+                    continue
+                print(f"Added {store.add_directory(directory)} reports from {directory}")
+            return
+        try:
+            rows = run(args, store)
+        except sqlite3.Error as e:
+            print(f"Error: {e}")
+            return
+    elapsed = (time.time() - start_time) * 1000
+    df = pd.DataFrame(rows)
+    if args.csv:
+        df.to_csv(args.csv, index=False)
+    elif rows:
+        with pd.option_context('display.max_rows', None, 'display.max_colwidth', 120, 'display.width', 250):
+            print(df.to_string(index=False))
+    if args.command == 'pairs' and rows:
+        print(f"{len(rows)} rows from {df['policy'].nunique()} policies in {elapsed:.1f} ms")
+    else:
+        print(f"{len(rows)} rows in {elapsed:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+import hashlib
+import os
+from typing import Optional
+
+from config import PROJECT_ROOT
+
+"""
+Content hashes of files and of the Python sources of a part of the project, used to tell whether outputs were
+computed by the current code.
+"""
+
+
+def file_hash(path: str) -> Optional[str]:
+    if not os.path.isfile(path):
+        return None
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def code_version(paths: list[str]) -> str:
+    """
+    Content hash of the Python sources under paths, relative to the project root
+    """
+    files = []
+    for path in paths:
+        full = os.path.join(PROJECT_ROOT, path)
+        if os.path.isdir(full):
+            for root, dirs, names in os.walk(full):
+                dirs[:] = sorted(d for d in dirs if not d.startswith(('.', '__pycache__')))
+                files += [os.path.join(root, name) for name in names if name.endswith('.py')]
+        elif os.path.isfile(full):
+            files.append(full)
+    h = hashlib.sha1()
+    for file in sorted(files):
+        h.update(os.path.relpath(file, PROJECT_ROOT).replace(os.sep, '/').encode('utf-8') + b'\0')
+        h.update(file_hash(file).encode('ascii') + b'\n')
+    return h.hexdigest()